@@ -46,19 +46,21 @@ verificar_espaco() {
 limpar_arquivos_incompletos() {
     local pasta="$1"
     
-    # Encontrar arquivos muito pequenos (provavelmente incompletos)
-    pequenos_arquivos=$(find "$pasta" -name "*.mp4*" -size -10M)
-    
-    if [ -n "$pequenos_arquivos" ]; then
-        echo "🧹 Encontrados arquivos pequenos/incompletos em $pasta:"
-        echo "$pequenos_arquivos"
+    # Arquivos do manifesto da pasta (.panda_manifesto.json) são confiáveis se o
+    # tamanho conferir; os demais seguem a regra antiga (menores que 10MB).
+    # Downloads em andamento (.part) ficam de fora para poderem ser retomados
+    incompletos=$(python3 panda_manifesto.py incompletos "$pasta")
+    
+    if [ -n "$incompletos" ]; then
+        echo "🧹 Encontrados arquivos incompletos em $pasta:"
+        echo "$incompletos"
         echo "Removendo arquivos incompletos..."
         
-        # Remove os arquivos pequenos
-        for arquivo in $pequenos_arquivos; do
+        # Remove os arquivos incompletos
+        while IFS= read -r arquivo; do
             rm -f "$arquivo"
             echo "  ✓ Removido: $(basename "$arquivo")"
-        done
+        done <<< "$incompletos"
     fi
 }
 
@@ -82,7 +84,8 @@ for pasta in "${pastas[@]}"; do
     limpar_arquivos_incompletos "downloads/Acelerador_Cripto/$NOME"
     
     # Executa o comando para baixar os vídeos
-    python3 panda_cli.py todos-id "$ID" --pasta-destino "downloads/Acelerador_Cripto/$NOME"
+    # O ritmo é controlado pelo próprio CLI (--adaptativo), sem pausas fixas entre pastas
+    python3 panda_cli.py todos-id "$ID" --pasta-destino "downloads/Acelerador_Cripto/$NOME" --jobs 8 --adaptativo
     
     # Verifica se o download foi bem-sucedido
     if [ $? -ne 0 ]; then
@@ -101,11 +104,6 @@ for pasta in "${pastas[@]}"; do
         # Gera o README para a pasta atual
         criar_readme "downloads/Acelerador_Cripto/$NOME"
     fi
-    
-    # Aguarda 3 segundos entre cada pasta para evitar sobrecarga na API
-    echo ""
-    echo "Aguardando 3 segundos antes da próxima pasta..."
-    sleep 3
 done
 
 echo ""
@@ -122,7 +120,7 @@ criar_readme() {
     echo "Gerando índice para: $nome_formatado"
     
     # Lista de arquivos de vídeo na pasta
-    arquivos=($(find "$pasta_completa" -name "*.mp4*" | sort))
+    arquivos=($(find "$pasta_completa" -name "*.mp4*" ! -name "*.part*" | sort))
     
     if [ ${#arquivos[@]} -eq 0 ]; then
         echo "Nenhum vídeo encontrado em $pasta_completa. Pulando..."
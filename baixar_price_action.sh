@@ -19,7 +19,7 @@ echo "Verificando vídeos disponíveis..."
 python3 -u panda_cli.py todos-id "$PASTA_ID" --pasta-destino "$PASTA_DESTINO"
 
 # Verifica se algum vídeo foi baixado
-NUM_VIDEOS=$(find "$PASTA_DESTINO" -name "*.mp4*" | wc -l)
+NUM_VIDEOS=$(find "$PASTA_DESTINO" -name "*.mp4*" ! -name "*.part*" | wc -l)
 
 if [ $NUM_VIDEOS -gt 0 ]; then
     echo ""
@@ -38,7 +38,7 @@ EOL
     # Adicionar cada vídeo ao README
     numero=1
     
-    for arquivo in $(find "$PASTA_DESTINO" -name "*.mp4*" | sort); do
+    for arquivo in $(find "$PASTA_DESTINO" -name "*.mp4*" ! -name "*.part*" | sort); do
         nome_arquivo=$(basename "$arquivo")
         
         # Formatar o nome do arquivo para um título limpo
@@ -8,10 +8,16 @@ Autor: Claude | Data: 2023
 """
 
 import os
-import time
 import requests
 import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dotenv import load_dotenv
+from panda_transferencia import obter_info_remota, baixar_arquivo, CONEXOES_POR_DOWNLOAD
+from panda_http import obter_sessao, configurar_sessao
+from panda_concorrencia import ControladorConcorrencia
+from panda_estado import registrar_download, registrar_falha, obter_concluidos
+from panda_manifesto import obter_checksum
+from panda_cache import cache_listagens
 
 # Carrega variáveis de ambiente do arquivo .env
 load_dotenv()
@@ -25,6 +31,10 @@ OUTPUT_DIR = os.path.join(os.getcwd(), "downloads")
 FOCO_SUBPASTA = "Acelerador Cripto"  
 # Nível máximo de subpastas para evitar recursão infinita
 MAX_NIVEL_RECURSAO = 10  
+# Listagens de pastas feitas ao mesmo tempo durante a descoberta da árvore
+MAX_LISTAGENS_SIMULTANEAS = int(os.getenv('PANDA_MAX_LISTAGENS', '8'))
+# Limite superior de downloads simultâneos (o controlador adaptativo ajusta abaixo disso)
+MAX_DOWNLOADS_SIMULTANEOS = int(os.getenv('PANDA_JOBS', '8'))
 
 # Verifica se a chave API existe
 if not API_KEY:
@@ -33,6 +43,10 @@ if not API_KEY:
 # Cria o diretório de saída se não existir
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# Controla quantos vídeos são baixados ao mesmo tempo, no lugar de pausas fixas
+# (só passa a receber os sinais de rede em main)
+controlador = ControladorConcorrencia(maximo=MAX_DOWNLOADS_SIMULTANEOS)
+
 # Cabeçalhos para requisições
 headers = {
     "Authorization": API_KEY,
@@ -47,11 +61,7 @@ def listar_subpastas(folder_id):
     url = f"https://api.pandavideo.com.br/v2/folders/{folder_id}/folders"
     
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        
-        subpastas = response.json()
-        return subpastas
+        return cache_listagens.obter_json(url, headers)
     except requests.exceptions.RequestException as e:
         print(f"Erro ao listar subpastas: {e}")
         return []
@@ -64,10 +74,7 @@ def listar_videos_na_pasta(folder_id):
     url = f"https://api.pandavideo.com.br/v2/folders/{folder_id}/videos"
     
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        
-        videos = response.json()
+        videos = cache_listagens.obter_json(url, headers)
         print(f"Encontrados {len(videos)} vídeos na pasta.")
         return videos
     except requests.exceptions.RequestException as e:
@@ -94,17 +101,13 @@ def baixar_video(video_id, titulo, caminho_pasta=None):
         print(f"Iniciando download de: {titulo}")
         
         # Inicia o download
-        response = requests.post(download_url, headers=headers)
+        response = obter_sessao().post(download_url, headers=headers)
         response.raise_for_status()
         
         # Verifica se há um URL de download na resposta
         download_data = response.json()
         
         if "url" in download_data:
-            # Download direto do arquivo
-            video_response = requests.get(download_data["url"], stream=True)
-            video_response.raise_for_status()
-            
             # Sanitiza o nome do arquivo
             safe_titulo = "".join(
                 c for c in titulo if c.isalnum() or c in (' ', '.', '_', '-')
@@ -112,21 +115,23 @@ def baixar_video(video_id, titulo, caminho_pasta=None):
             filename = f"{safe_titulo}_{video_id}.mp4"
             filepath = os.path.join(saida, filename)
             
-            # Verifica se o arquivo já existe
+            # Verifica se o arquivo já existe (só recebe o nome final quando completo)
             if os.path.exists(filepath):
                 print(f"\nO arquivo já existe: {filename}")
+                registrar_download(
+                    video_id, saida, filepath, os.path.getsize(filepath),
+                    'existente', titulo, obter_checksum(filepath)
+                )
                 return True
-                
-            # Download com progresso
-            total_size = int(video_response.headers.get('content-length', 0))
-            block_size = 1024  # 1 Kibibyte
             
-            with open(filepath, 'wb') as f:
-                downloaded = 0
-                for data in video_response.iter_content(block_size):
-                    f.write(data)
-                    downloaded += len(data)
-                    # Mostra progresso
+            # Download retomável em <arquivo>.part, com progresso
+            url, total_size, aceita_ranges, etag = obter_info_remota(download_data["url"])
+            downloaded = 0
+            
+            def mostrar_progresso(n):
+                nonlocal downloaded
+                downloaded += n
+                if total_size:
                     done = int(50 * downloaded / total_size)
                     print(
                         f"\r[{'=' * done}{' ' * (50-done)}] "
@@ -134,6 +139,14 @@ def baixar_video(video_id, titulo, caminho_pasta=None):
                         end=''
                     )
             
+            tamanho = baixar_arquivo(
+                url, filepath, total_size, aceita_ranges, etag, mostrar_progresso
+            )
+            registrar_download(
+                video_id, saida, filepath, tamanho, 'oficial', titulo,
+                obter_checksum(filepath)
+            )
+            
             print(f"\nVídeo baixado com sucesso: {filename}")
             print(f"Salvo em: {saida}")
             return True
@@ -144,115 +157,133 @@ def baixar_video(video_id, titulo, caminho_pasta=None):
             )
             return False
             
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, IOError) as e:
         print(f"Erro ao baixar vídeo {video_id}: {e}")
         return False
 
 
-def processar_pasta_recursivamente(folder_id, caminho_atual="", nivel=0):
+def _listar_pasta(pasta):
     """
-    Processa uma pasta e suas subpastas de forma recursiva
+    Lista os vídeos e as subpastas de uma pasta da árvore
     """
-    # Evita recursão infinita
-    if nivel > MAX_NIVEL_RECURSAO:
-        print(f"Atingido nível máximo de recursão ({MAX_NIVEL_RECURSAO})")
-        return 0, 0, 0
-    
-    # Obtém informações da pasta atual (para obter o nome)
-    pasta_info = None
-    if nivel > 0:  # Não precisamos fazer isso para a pasta raiz
-        url = f"https://api.pandavideo.com.br/v2/folders/{folder_id}"
+    if pasta["nome"] is None:
+        # Subpasta sem nome na listagem: consulta a própria pasta, ou usa o ID
+        url = f"https://api.pandavideo.com.br/v2/folders/{pasta['id']}"
         try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            pasta_info = response.json()
+            pasta_info = cache_listagens.obter_json(url, headers)
         except Exception:
-            # Se falhar em obter o nome, usamos o ID
-            pasta_info = {"name": folder_id}
-    
-    # Define o nome da pasta atual
-    nome_pasta = pasta_info.get("name", folder_id) if pasta_info else "raiz"
-    
-    # Define o caminho completo
-    if caminho_atual:
-        caminho_completo = os.path.join(caminho_atual, nome_pasta)
-    else:
-        caminho_completo = nome_pasta
-    
-    # Exibe informação sobre a pasta sendo processada
-    identacao = "  " * nivel
-    print(f"\n{identacao}=== Processando pasta: {nome_pasta} ===")
-    print(f"{identacao}Caminho: {caminho_completo}")
-    
-    # Primeiro processa os vídeos nesta pasta
-    baixados_pasta = 0
-    falhas_pasta = 0
-    total_pasta = 0
-    
-    videos = listar_videos_na_pasta(folder_id)
-    total_videos = len(videos)
-    
-    for i, video in enumerate(videos, 1):
-        video_titulo = video.get('name', 'Sem título')
-        print(
-            f"{identacao}[{i}/{total_videos}] Processando vídeo: {video_titulo}"
-        )
-        
-        sucesso = baixar_video(
-            video.get('id'), 
-            video_titulo,
-            caminho_completo
-        )
-        
-        if sucesso:
-            baixados_pasta += 1
-        else:
-            falhas_pasta += 1
-        
-        # Aguarda um pouco entre os downloads
-        if i < total_videos:
-            print(f"{identacao}Aguardando 2 segundos antes do próximo vídeo...")
-            time.sleep(2)
-    
-    total_pasta = total_videos
-    
-    # Agora processa as subpastas
-    subpastas = listar_subpastas(folder_id)
+            pasta_info = {}
+        pasta["nome"] = pasta_info.get("name", pasta["id"])
+        pasta["caminho"] = os.path.join(pasta["caminho"], pasta["nome"])
+    return listar_videos_na_pasta(pasta["id"]), listar_subpastas(pasta["id"])
+
+
+def descobrir_arvore(folder_id, caminho_atual=""):
+    """
+    Percorre a árvore de pastas em largura, com até MAX_LISTAGENS_SIMULTANEAS
+    listagens ao mesmo tempo.
+
+    Gera um dicionário por pasta (id, nome, caminho, nivel, videos) assim que
+    ela é listada, para que os downloads comecem durante a descoberta. Pastas
+    já visitadas (ciclos) e pastas além de MAX_NIVEL_RECURSAO são ignoradas.
+    """
+    raiz = {
+        "id": folder_id,
+        "nome": "raiz",
+        "caminho": os.path.join(caminho_atual, "raiz"),
+        "nivel": 0,
+    }
+    visitadas = {folder_id}
+    pendentes = {}
     
-    baixados_subpastas = 0
-    falhas_subpastas = 0
-    total_subpastas = 0
+    with ThreadPoolExecutor(max_workers=MAX_LISTAGENS_SIMULTANEAS) as executor:
+        pendentes[executor.submit(_listar_pasta, raiz)] = raiz
+        while pendentes:
+            prontos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+            for futuro in prontos:
+                pasta = pendentes.pop(futuro)
+                pasta["videos"], subpastas = futuro.result()
+                
+                if subpastas and pasta["nivel"] >= MAX_NIVEL_RECURSAO:
+                    print(f"Atingido nível máximo de recursão ({MAX_NIVEL_RECURSAO}) em {pasta['caminho']}")
+                    subpastas = []
+                
+                for subpasta in subpastas:
+                    subpasta_id = subpasta.get("id")
+                    if subpasta_id in visitadas:
+                        print(f"Ciclo detectado: pasta {subpasta_id} já visitada, ignorando")
+                        continue
+                    visitadas.add(subpasta_id)
+                    nome = subpasta.get("name")
+                    filha = {
+                        "id": subpasta_id,
+                        "nome": nome,
+                        "caminho": os.path.join(pasta["caminho"], nome) if nome else pasta["caminho"],
+                        "nivel": pasta["nivel"] + 1,
+                    }
+                    pendentes[executor.submit(_listar_pasta, filha)] = filha
+                
+                yield pasta
+
+
+def processar_pasta_recursivamente(folder_id, caminho_atual=""):
+    """
+    Processa uma pasta e todas as suas subpastas.
+
+    As pastas são descobertas em largura e em paralelo (descobrir_arvore); os
+    vídeos de cada pasta entram na fila de downloads assim que ela é listada.
+    """
+    pastas = []
     
-    for subpasta in subpastas:
-        subpasta_id = subpasta.get('id')
-        
-        # Chamada recursiva para processar subpasta
-        baixados_sub, falhas_sub, total_sub = processar_pasta_recursivamente(
-            subpasta_id, 
-            caminho_completo,
-            nivel + 1
-        )
-        
-        baixados_subpastas += baixados_sub
-        falhas_subpastas += falhas_sub
-        total_subpastas += total_sub
-        
-        # Pausa entre subpastas
-        print(f"{identacao}Aguardando 3 segundos antes da próxima subpasta...")
-        time.sleep(3)
+    with ThreadPoolExecutor(max_workers=controlador.maximo) as executor:
+        for pasta in descobrir_arvore(folder_id, caminho_atual):
+            identacao = "  " * pasta["nivel"]
+            videos = pasta["videos"]
+            print(f"\n{identacao}=== Pasta descoberta: {pasta['nome']} ===")
+            print(f"{identacao}Caminho: {pasta['caminho']}")
+            print(f"{identacao}Vídeos: {len(videos)}")
+            
+            # Uma consulta ao banco de estado para todos os vídeos da pasta
+            saida = os.path.join(OUTPUT_DIR, pasta["caminho"])
+            concluidos = obter_concluidos([video.get('id') for video in videos], saida)
+            
+            def processar_video(video, caminho=pasta["caminho"], concluidos=concluidos):
+                video_titulo = video.get('name', 'Sem título')
+                if str(video.get('id')) in concluidos:
+                    print(f"Já baixado: {concluidos[str(video.get('id'))]['caminho']}")
+                    return True
+                print(f"Processando vídeo: {video_titulo} ({caminho})")
+                # O controlador decide quantos downloads rodam ao mesmo tempo
+                with controlador:
+                    return baixar_video(video.get('id'), video_titulo, caminho)
+            
+            pasta["saida"] = saida
+            pasta["futuros"] = [executor.submit(processar_video, video) for video in videos]
+            pastas.append(pasta)
     
-    # Soma os resultados desta pasta e suas subpastas
-    total_baixados = baixados_pasta + baixados_subpastas
-    total_falhas = falhas_pasta + falhas_subpastas
-    total_geral = total_pasta + total_subpastas
+    # Relatório por pasta, na ordem em que foram descobertas
+    total_baixados = 0
+    total_falhas = 0
+    total_geral = 0
+    print("\n=== Resumo por pasta ===")
+    for pasta in pastas:
+        resultados = [futuro.result() for futuro in pasta["futuros"]]
+        for video, sucesso in zip(pasta["videos"], resultados):
+            if not sucesso:
+                registrar_falha(video.get('id'), pasta["saida"], video.get('name'))
+        baixados = sum(1 for sucesso in resultados if sucesso)
+        falhas = len(resultados) - baixados
+        identacao = "  " * pasta["nivel"]
+        print(f"{identacao}{pasta['nome']}: {len(resultados)} vídeos, "
+              f"{baixados} baixados, {falhas} falhas")
+        total_baixados += baixados
+        total_falhas += falhas
+        total_geral += len(resultados)
     
-    # Exibe relatório para esta pasta
-    print(f"\n{identacao}=== Resumo da pasta {nome_pasta} ===")
-    print(f"{identacao}Vídeos nesta pasta: {total_pasta}")
-    print(f"{identacao}Vídeos em subpastas: {total_subpastas}")
-    print(f"{identacao}Total de vídeos: {total_geral}")
-    print(f"{identacao}Baixados com sucesso: {total_baixados}")
-    print(f"{identacao}Falhas: {total_falhas}")
+    print(f"\nPastas: {len(pastas)}")
+    print(f"Total de vídeos: {total_geral}")
+    print(f"Baixados com sucesso: {total_baixados}")
+    print(f"Falhas: {total_falhas}")
     
     return total_baixados, total_falhas, total_geral
 
@@ -283,6 +314,9 @@ def main():
     print(f"=== Download de Vídeos do Panda Video para {OUTPUT_DIR} ===")
     print("Os vídeos serão organizados mantendo a estrutura de pastas original")
     
+    controlador.conectar()
+    configurar_sessao(MAX_DOWNLOADS_SIMULTANEOS * CONEXOES_POR_DOWNLOAD)
+    
     # Primeiro processa a pasta de foco
     baixados_foco, falhas_foco, total_foco = focar_pasta_acelerador_cripto()
     
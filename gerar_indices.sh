@@ -13,7 +13,7 @@ criar_readme() {
     echo "Gerando índice para: $nome_formatado"
     
     # Lista de arquivos de vídeo na pasta
-    arquivos=($(find "$pasta" -name "*.mp4*" | sort))
+    arquivos=($(find "$pasta" -name "*.mp4*" ! -name "*.part*" | sort))
     
     if [ ${#arquivos[@]} -eq 0 ]; then
         echo "Nenhum vídeo encontrado em $pasta. Pulando..."
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Agendador central das requisições HTTP, guiado pelos limites informados pela API.
+
+Substitui as pausas fixas entre requisições. Enquanto o servidor não indica
+limite, as requisições saem sem espera. Quando as respostas trazem
+`X-RateLimit-Remaining` / `X-RateLimit-Reset` (ou `RateLimit-Remaining` /
+`RateLimit-Reset`), as próximas requisições ao mesmo host são espaçadas para
+distribuir o saldo restante até a renovação, ficando logo abaixo do limite.
+
+Um HTTP 429 (ou 503 com `Retry-After`) bloqueia o host pelo tempo pedido em
+`Retry-After`; sem esse cabeçalho, a espera é um backoff exponencial com jitter.
+A requisição é então repetida, até MAX_TENTATIVAS_LIMITE vezes.
+"""
+
+import os
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional
+from urllib.parse import urlsplit
+
+# Novas tentativas após respostas de limite (429 / 503 com Retry-After)
+MAX_TENTATIVAS_LIMITE = int(os.getenv('PANDA_TENTATIVAS_LIMITE', '5'))
+# Backoff exponencial: base * 2^tentativa, limitado a BACKOFF_MAXIMO
+BACKOFF_BASE = 1.0  # segundos
+BACKOFF_MAXIMO = 60.0  # segundos
+# Valores de reset acima disso são timestamps Unix, e não segundos restantes
+_LIMIAR_TIMESTAMP = 10 ** 9
+
+
+def _cabecalho(headers: Mapping[str, str], *nomes: str) -> Optional[str]:
+    for nome in nomes:
+        valor = headers.get(nome)
+        if valor is not None:
+            return valor
+    return None
+
+
+def interpretar_retry_after(valor: Optional[str]) -> Optional[float]:
+    """Converte `Retry-After` (segundos ou data HTTP) em segundos de espera."""
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def espera_backoff(tentativa: int) -> float:
+    """Espera da `tentativa` (0, 1, 2...) no backoff exponencial com jitter completo."""
+    return random.uniform(0, min(BACKOFF_MAXIMO, BACKOFF_BASE * 2 ** tentativa))
+
+
+class AgendadorRequisicoes:
+    """Define quando cada requisição pode sair, por host."""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        # host -> instante (monotônico) a partir do qual a próxima requisição pode sair
+        self._proximo: Dict[str, float] = {}
+        # host -> espaçamento mínimo entre requisições, derivado dos cabeçalhos de limite
+        self._intervalo: Dict[str, float] = {}
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return urlsplit(url).netloc
+
+    def reservar(self, url: str) -> float:
+        """Reserva a vez da próxima requisição a `url` e retorna quantos segundos esperar."""
+        host = self._host(url)
+        with self._trava:
+            agora = time.monotonic()
+            inicio = max(agora, self._proximo.get(host, 0.0))
+            self._proximo[host] = inicio + self._intervalo.get(host, 0.0)
+            return inicio - agora
+
+    def aguardar(self, url: str) -> None:
+        """Bloqueia a thread até a vez da próxima requisição a `url`."""
+        espera = self.reservar(url)
+        if espera > 0:
+            time.sleep(espera)
+
+    def registrar_resposta(self, url: str, status: int, headers: Mapping[str, str],
+                           tentativa: int = 0) -> Optional[float]:
+        """
+        Atualiza o ritmo do host com os cabeçalhos da resposta.
+
+        Returns:
+            Segundos a esperar antes de repetir a requisição, se ela foi limitada
+            (429, ou 503 com Retry-After); None se a resposta deve ser usada.
+        """
+        host = self._host(url)
+        retry_after = interpretar_retry_after(_cabecalho(headers, 'Retry-After'))
+        restantes = _cabecalho(headers, 'X-RateLimit-Remaining', 'RateLimit-Remaining')
+        reset = _cabecalho(headers, 'X-RateLimit-Reset', 'RateLimit-Reset')
+
+        limitada = status == 429 or (status == 503 and retry_after is not None)
+        with self._trava:
+            agora = time.monotonic()
+            if restantes is not None and reset is not None:
+                try:
+                    restantes_n = max(0, int(float(restantes)))
+                    segundos = float(reset)
+                    if segundos > _LIMIAR_TIMESTAMP:
+                        segundos -= time.time()
+                    segundos = max(0.0, segundos)
+                except ValueError:
+                    pass
+                else:
+                    if restantes_n == 0:
+                        self._proximo[host] = max(self._proximo.get(host, 0.0), agora + segundos)
+                    # Distribui o saldo restante até a renovação da janela
+                    self._intervalo[host] = segundos / max(1, restantes_n)
+            if not limitada:
+                return None
+            espera = retry_after if retry_after is not None else espera_backoff(tentativa)
+            self._proximo[host] = max(self._proximo.get(host, 0.0), agora + espera)
+            return espera
+
+
+# Agendador compartilhado pelo processo
+agendador = AgendadorRequisicoes()
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Motor assíncrono (asyncio + aiohttp) para baixar muitos vídeos do Panda Videos.
+
+Roda, em uma única thread, centenas de requisições de metadados e dezenas de
+transferências ao mesmo tempo: GET /videos/{id}, POST /videos/{id}/download,
+resolução da URL (redirecionamento ou JSON) e o corpo do arquivo. Segue as
+mesmas regras de `panda_downloader.baixar_todos_videos`: pula vídeos já
+baixados, tenta novamente os que falharam (até 3 tentativas) e recorre aos
+métodos alternativos quando o download oficial não funciona.
+"""
+
+import os
+import json
+import time
+import asyncio
+import aiohttp
+from typing import Any, Dict, List, Optional
+
+from panda_downloader import (
+    BASE_URL,
+    DOWNLOAD_URL,
+    headers,
+    formatar_tamanho,
+    verificar_video_ja_baixado,
+    baixar_video_alternativo,
+)
+from panda_agendador import MAX_TENTATIVAS_LIMITE, agendador
+from panda_cache import cache_metadados
+from panda_estado import registrar_download, registrar_falha, obter_concluidos, obter_download
+from panda_manifesto import HashIncremental, obter_checksum
+from panda_transferencia import (
+    CONEXOES_POR_DOWNLOAD,
+    SUFIXO_PARCIAL,
+    EstadoParcial,
+    RangeNaoSuportado,
+    concluir_download,
+    dividir_intervalos,
+    limitador_banda,
+)
+
+# Requisições de metadados simultâneas (GET info + POST download)
+MAX_REQUISICOES_METADADOS = int(os.getenv('PANDA_MAX_METADADOS', '100'))
+
+TIMEOUT = aiohttp.ClientTimeout(total=None, connect=10, sock_read=60)
+
+
+async def _ler_com_limite(response: aiohttp.ClientResponse):
+    """Lê o corpo em blocos, aguardando no limitador global de banda antes de cada leitura."""
+    bloco = limitador_banda.tamanho_bloco()
+    while True:
+        espera = limitador_banda.reservar(bloco)
+        if espera > 0:
+            await asyncio.sleep(espera)
+        chunk = await response.content.read(bloco)
+        limitador_banda.devolver(bloco - len(chunk))
+        if not chunk:
+            return
+        yield chunk
+
+
+async def _requisitar(sessao: aiohttp.ClientSession, metodo: str, url: str, **kwargs) -> aiohttp.ClientResponse:
+    """Faz uma requisição no ritmo do agendador, repetindo-a quando a API responde com limite."""
+    tentativa = 0
+    while True:
+        espera = agendador.reservar(url)
+        if espera > 0:
+            await asyncio.sleep(espera)
+        response = await sessao.request(metodo, url, **kwargs)
+        espera = agendador.registrar_resposta(url, response.status, response.headers, tentativa)
+        if espera is None or tentativa >= MAX_TENTATIVAS_LIMITE:
+            return response
+        print(f"⏳ Limite da API atingido ({response.status}). Nova tentativa em {espera:.1f}s...")
+        response.release()
+        tentativa += 1
+
+
+async def _obter_info_video(sessao: aiohttp.ClientSession, video_id: str) -> Dict[str, Any]:
+    video_info = cache_metadados.obter(video_id)
+    if video_info is None:
+        async with await _requisitar(sessao, 'GET', f'{BASE_URL}/videos/{video_id}', headers=headers) as response:
+            response.raise_for_status()
+            video_info = await response.json(content_type=None)
+        cache_metadados.guardar(video_id, video_info)
+    return video_info
+
+
+async def _resolver_url_download(sessao: aiohttp.ClientSession, video_id: str) -> Optional[str]:
+    """Chama POST /videos/{id}/download e extrai a URL do arquivo (redirecionamento ou JSON)."""
+    endpoint = f'{DOWNLOAD_URL}/videos/{video_id}/download'
+    async with await _requisitar(sessao, 'POST', endpoint, headers=headers, allow_redirects=False) as response:
+        if response.status in (301, 302, 303, 307, 308):
+            return response.headers.get('Location')
+        if response.status != 200:
+            print(f"Erro ao iniciar o download oficial de {video_id}: {response.status}")
+            return None
+        if 'application/json' in response.headers.get('Content-Type', ''):
+            try:
+                dados = await response.json(content_type=None)
+            except json.JSONDecodeError as e:
+                print(f"❌ Erro ao decodificar JSON da resposta: {e}")
+                return None
+            return dados.get('url')
+        # A própria resposta contém o arquivo
+        return str(response.url)
+
+
+async def _baixar_intervalo(sessao: aiohttp.ClientSession, url: str, caminho_parcial: str,
+                            estado: EstadoParcial, indice: int, hash_incremental: HashIncremental) -> None:
+    inicio, fim, concluido = estado.dados['intervalos'][indice]
+    posicao = inicio + concluido
+    if posicao > fim:
+        return
+    async with await _requisitar(sessao, 'GET', url, headers={'Range': f'bytes={posicao}-{fim}'}) as response:
+        response.raise_for_status()
+        if response.status != 206:
+            raise RangeNaoSuportado(f"status {response.status} para bytes={posicao}-{fim}")
+        with open(caminho_parcial, 'r+b', buffering=0) as f:
+            f.seek(posicao)
+            async for chunk in _ler_com_limite(response):
+                f.write(chunk)
+                estado.avancar(indice, len(chunk))
+                hash_incremental.alimentar(posicao, chunk)
+                posicao += len(chunk)
+    concluido = estado.dados['intervalos'][indice][2]
+    if inicio + concluido != fim + 1:
+        raise IOError(f"Intervalo {inicio}-{fim} incompleto: {concluido} de {fim - inicio + 1} bytes")
+    # A leitura do arquivo parcial fica fora do event loop
+    await asyncio.to_thread(hash_incremental.alcancar, estado.fronteira_contigua())
+
+
+async def _baixar_intervalos(sessao: aiohttp.ClientSession, url: str, caminho_parcial: str,
+                             estado: EstadoParcial, hash_incremental: HashIncremental) -> None:
+    """
+    Baixa todos os intervalos concorrentemente.
+
+    Se um deles falhar, os demais são cancelados e aguardados antes de o erro
+    ser repassado, para que nenhum continue gravando no `.part` ou no registro
+    de estado durante o fallback ou a nova tentativa (como o executor do motor sync).
+    """
+    tarefas = [
+        asyncio.ensure_future(_baixar_intervalo(sessao, url, caminho_parcial, estado, indice, hash_incremental))
+        for indice in range(len(estado.dados['intervalos']))
+    ]
+    try:
+        await asyncio.gather(*tarefas)
+    except BaseException:
+        for tarefa in tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+        raise
+
+
+async def _baixar_stream_unico(sessao: aiohttp.ClientSession, url: str, caminho_parcial: str,
+                               hash_incremental: HashIncremental) -> int:
+    recebidos = 0
+    async with await _requisitar(sessao, 'GET', url) as response:
+        response.raise_for_status()
+        with open(caminho_parcial, 'wb') as f:
+            async for chunk in _ler_com_limite(response):
+                f.write(chunk)
+                hash_incremental.alimentar(recebidos, chunk)
+                recebidos += len(chunk)
+    return recebidos
+
+
+async def baixar_arquivo(sessao: aiohttp.ClientSession, url: str, caminho: str,
+                         conexoes: int = CONEXOES_POR_DOWNLOAD) -> int:
+    """
+    Versão assíncrona de `panda_transferencia.baixar_arquivo`.
+
+    Usa o mesmo `<arquivo>.part` e o mesmo registro de estado, de modo que um
+    download interrompido em um motor pode ser retomado pelo outro.
+    """
+    caminho_parcial = caminho + SUFIXO_PARCIAL
+    hash_incremental = HashIncremental(caminho_parcial)
+    async with await _requisitar(sessao, 'HEAD', url, allow_redirects=True) as response:
+        url = str(response.url)
+        total = int(response.headers.get('content-length', 0))
+        aceita_ranges = response.headers.get('accept-ranges', '').lower() == 'bytes'
+        etag = response.headers.get('etag', '')
+
+    if not (total > 0 and aceita_ranges):
+        await _baixar_stream_unico(sessao, url, caminho_parcial, hash_incremental)
+        return await asyncio.to_thread(concluir_download, caminho, total, hash_incremental)
+
+    estado = EstadoParcial.carregar(caminho, total, etag)
+    if estado is None:
+        estado = EstadoParcial(caminho, {
+            'url': url,
+            'total': total,
+            'etag': etag,
+            'intervalos': [[inicio, fim, 0] for inicio, fim in dividir_intervalos(total, conexoes)],
+        })
+        with open(caminho_parcial, 'wb') as f:
+            f.truncate(total)
+    estado.dados['url'] = url
+    estado.salvar()
+
+    try:
+        await _baixar_intervalos(sessao, url, caminho_parcial, estado, hash_incremental)
+    except RangeNaoSuportado:
+        estado.remover()
+        hash_incremental = HashIncremental(caminho_parcial)
+        await _baixar_stream_unico(sessao, url, caminho_parcial, hash_incremental)
+        return await asyncio.to_thread(concluir_download, caminho, total, hash_incremental)
+    finally:
+        if os.path.exists(estado.caminho_estado):
+            estado.salvar()
+
+    tamanho = await asyncio.to_thread(concluir_download, caminho, total, hash_incremental)
+    estado.remover()
+    return tamanho
+
+
+async def baixar_video(sessao: aiohttp.ClientSession, video_id: str, pasta_destino: str,
+                       limite_metadados: asyncio.Semaphore, limite_transferencias: asyncio.Semaphore) -> bool:
+    """Baixa um vídeo pelo endpoint oficial, recorrendo aos métodos alternativos se preciso."""
+    if obter_download(video_id, pasta_destino):
+        return True
+    try:
+        async with limite_metadados:
+            video_info = await _obter_info_video(sessao, video_id)
+            titulo = video_info.get('title', f'video_{video_id}')
+            if verificar_video_ja_baixado(titulo, pasta_destino, video_id):
+                return True
+            download_url = await _resolver_url_download(sessao, video_id)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"Erro ao obter informações do vídeo {video_id}: {e}")
+        download_url = None
+
+    async with limite_transferencias:
+        if not download_url:
+            print(f"Tentando método alternativo de download para {video_id}...")
+            return await asyncio.to_thread(baixar_video_alternativo, video_id, pasta_destino)
+
+        nome_arquivo = f"{titulo.replace(' ', '_')}.mp4"
+        caminho_completo = os.path.join(pasta_destino, nome_arquivo)
+        print(f"⬇️ Iniciando: {titulo}")
+        inicio = time.time()
+        try:
+            tamanho = await baixar_arquivo(sessao, download_url, caminho_completo)
+        except (aiohttp.ClientError, asyncio.TimeoutError, IOError) as e:
+            print(f"❌ Erro durante o download de {titulo}: {e}")
+            return False
+        registrar_download(video_id, pasta_destino, caminho_completo, tamanho, 'oficial', titulo,
+                           obter_checksum(caminho_completo))
+        decorrido = max(time.time() - inicio, 1e-6)
+        print(f"✅ {nome_arquivo} ({formatar_tamanho(tamanho)} em {decorrido:.1f}s, "
+              f"{formatar_tamanho(tamanho / decorrido)}/s)")
+        return True
+
+
+async def _baixar_lote(sessao: aiohttp.ClientSession, videos: List[Dict[str, Any]], pasta_destino: str,
+                       limite_metadados: asyncio.Semaphore,
+                       limite_transferencias: asyncio.Semaphore) -> List[Dict[str, Any]]:
+    """Baixa todos os vídeos da lista concorrentemente e devolve os que falharam."""
+    async def tarefa(video: Dict[str, Any]) -> bool:
+        try:
+            return await baixar_video(sessao, video['id'], pasta_destino, limite_metadados, limite_transferencias)
+        except Exception as e:
+            print(f"❌ Erro inesperado ao baixar {video.get('title', video['id'])}: {e}")
+            return False
+
+    resultados = await asyncio.gather(*[tarefa(video) for video in videos])
+    return [video for video, sucesso in zip(videos, resultados) if not sucesso]
+
+
+async def _baixar_todos_videos(videos: List[Dict[str, Any]], pasta_destino: str, jobs: int) -> List[Dict[str, Any]]:
+    limite_metadados = asyncio.Semaphore(MAX_REQUISICOES_METADADOS)
+    limite_transferencias = asyncio.Semaphore(max(1, jobs))
+    conector = aiohttp.TCPConnector(limit=MAX_REQUISICOES_METADADOS + jobs * CONEXOES_POR_DOWNLOAD)
+    async with aiohttp.ClientSession(connector=conector, timeout=TIMEOUT) as sessao:
+        videos_com_falha = await _baixar_lote(sessao, videos, pasta_destino,
+                                              limite_metadados, limite_transferencias)
+        for tentativa in range(2):  # 2 tentativas adicionais (total 3)
+            if not videos_com_falha:
+                break
+            print(f"\n🔄 Tentativa {tentativa + 2} para {len(videos_com_falha)} vídeos...")
+            videos_com_falha = await _baixar_lote(sessao, videos_com_falha, pasta_destino,
+                                                  limite_metadados, limite_transferencias)
+    return videos_com_falha
+
+
+def baixar_todos_videos(videos: List[Dict[str, Any]], pasta_destino: str = 'downloads', jobs: int = 8) -> None:
+    """
+    Equivalente assíncrono de `panda_downloader.baixar_todos_videos`.
+
+    Args:
+        videos: Lista de vídeos (como retornada por `listar_videos_pasta`)
+        pasta_destino: Pasta onde os vídeos serão salvos
+        jobs: Número máximo de transferências simultâneas
+    """
+    if not videos:
+        print("⚠️ Nenhum vídeo disponível para download.")
+        return
+
+    os.makedirs(pasta_destino, exist_ok=True)
+
+    print(f"\n🔄 Iniciando verificação de {len(videos)} vídeos...")
+    concluidos = obter_concluidos([video['id'] for video in videos], pasta_destino)
+    if concluidos:
+        print(f"✅ {len(concluidos)} vídeos já registrados como baixados")
+    videos_para_baixar = [
+        video for video in videos
+        if str(video['id']) not in concluidos
+        and not verificar_video_ja_baixado(video.get('title', f"video_{video['id']}"), pasta_destino, video['id'])
+    ]
+    if not videos_para_baixar:
+        print("✅ Todos os vídeos já foram baixados anteriormente!")
+        return
+
+    print(f"\n🔄 Iniciando download assíncrono de {len(videos_para_baixar)} vídeos pendentes "
+          f"({jobs} transferências simultâneas)...")
+    videos_com_falha = asyncio.run(_baixar_todos_videos(videos_para_baixar, pasta_destino, jobs))
+
+    for video in videos_com_falha:
+        registrar_falha(video['id'], pasta_destino, video.get('title'))
+
+    print("\n=== RESULTADO FINAL ===")
+    print(f"✅ Downloads concluídos: {len(videos_para_baixar) - len(videos_com_falha)}")
+    if videos_com_falha:
+        print(f"❌ Downloads com falha: {len(videos_com_falha)}")
+        for video in videos_com_falha:
+            print(f"  - {video.get('title', 'Sem título')} (ID: {video['id']})")
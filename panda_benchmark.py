@@ -0,0 +1,638 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark offline dos downloads, contra um servidor local que simula a API e a CDN do Panda Videos.
+
+`ServidorSimulado` responde aos endpoints usados pelo downloader:
+GET /folders, /folders/{id}, /videos (paginado, com filtro folder_id),
+/videos/{id}, POST /videos/{id}/download (redirecionamento ou JSON com a
+url), os arquivos MP4 (HEAD e Range) e as playlists HLS mestre e de mídia
+com seus segmentos. Os segmentos são MPEG-TS de verdade (um clipe de teste
+gerado uma vez pelo ffmpeg ao iniciar o servidor, completado com pacotes
+nulos até o tamanho pedido), para que o remux do alvo m3u8 funcione; sem
+ffmpeg eles são só bytes de enchimento e o alvo m3u8 não roda. Ele pode injetar latência, limite de banda por conexão,
+respostas 429, conexões resetadas no meio do corpo e corpos truncados.
+
+Cada rodada (alvo x configuração x cenário) roda em um processo separado,
+com PANDA_BASE_URL / PANDA_DOWNLOAD_URL apontando para o servidor, estado,
+caches e diretório de trabalho em uma pasta temporária e as variáveis da
+configuração (PANDA_CONEXOES, PANDA_SEGMENTOS...). São medidos o tempo total,
+a vazão (bytes recebidos pelo cliente / tempo) e os percentis p50/p99 do
+tempo até o primeiro byte das respostas.
+
+Uso:
+    python3 panda_benchmark.py
+    python3 panda_benchmark.py --alvos todos --configuracoes serial,paralelo --cenarios ideal,instavel
+    python3 panda_benchmark.py --cenarios lento --ambiente PANDA_HLS_INTERVALO_MAXIMO=0 --json resultados.json
+    python3 panda_benchmark.py --falhas latencia=0.1,banda=2M,taxa_reset=0.2
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import socket
+import struct
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# Bloco de conteúdo repetido nos corpos simulados (MP4 e segmentos)
+_PADRAO = bytes(range(256)) * 256  # 64 KiB
+_PADRAO_DUPLO = _PADRAO * 2
+TAMANHO_BLOCO = len(_PADRAO)
+
+# Pacote MPEG-TS nulo (PID 0x1FFF), ignorado pelos demuxers: completa os segmentos
+PACOTE_TS_NULO = b'\x47\x1f\xff\x10' + b'\xff' * 184
+
+ID_PASTA = 'bench-pasta'
+NOME_PASTA = 'Benchmark'
+RETRY_AFTER = '0.1'  # segundos, nas respostas 429 injetadas
+
+
+class Falhas(NamedTuple):
+    """Falhas injetadas pelo servidor simulado."""
+    latencia: float = 0.0       # segundos antes de cada resposta
+    banda: float = 0.0          # bytes/s por conexão (0 = sem limite)
+    taxa_429: float = 0.0       # fração das requisições respondidas com 429
+    taxa_reset: float = 0.0     # fração dos corpos de vídeo interrompidos com RST
+    taxa_truncado: float = 0.0  # fração dos corpos de vídeo encerrados antes do Content-Length
+
+
+class Configuracao(NamedTuple):
+    """Parâmetros do cliente em uma rodada."""
+    jobs: int
+    ambiente: Dict[str, str]
+
+
+CENARIOS: Dict[str, Falhas] = {
+    'ideal': Falhas(),
+    'lento': Falhas(latencia=0.05, banda=4 * 1024 * 1024),
+    'instavel': Falhas(latencia=0.02, taxa_429=0.05, taxa_reset=0.05, taxa_truncado=0.05),
+}
+
+CONFIGURACOES: Dict[str, Configuracao] = {
+    'serial': Configuracao(1, {'PANDA_CONEXOES': '1', 'PANDA_SEGMENTOS': '1'}),
+    'padrao': Configuracao(1, {}),
+    'paralelo': Configuracao(4, {'PANDA_CONEXOES': '4', 'PANDA_SEGMENTOS': '16'}),
+}
+
+ALVOS = ('todos', 'm3u8')
+
+
+def _conteudo(semente: int, deslocamento: int, n: int) -> memoryview:
+    """`n` bytes (até TAMANHO_BLOCO) do arquivo simulado `semente`, a partir de `deslocamento`."""
+    inicio = (deslocamento + semente * 7919) % TAMANHO_BLOCO
+    return memoryview(_PADRAO_DUPLO)[inicio:inicio + n]
+
+
+def _interpretar_range(valor: Optional[str], total: int) -> Optional[Tuple[int, int]]:
+    """Intervalo inclusivo pedido em `Range: bytes=a-b`, ou None para o arquivo inteiro."""
+    if not valor or not valor.startswith('bytes=') or ',' in valor:
+        return None
+    inicio, _, fim = valor[len('bytes='):].partition('-')
+    if not inicio:
+        return max(0, total - int(fim)), total - 1
+    return int(inicio), min(int(fim), total - 1) if fim else total - 1
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clientes que desistem no meio do corpo são esperados nos cenários com falhas
+        pass
+
+
+class _Manipulador(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_HEAD(self) -> None:
+        self._atender(corpo=False)
+
+    def do_GET(self) -> None:
+        self._atender()
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self._atender()
+
+    def _atender(self, corpo: bool = True) -> None:
+        simulado: 'ServidorSimulado' = self.server.simulado
+        simulado.contar('requisicoes')
+        if simulado.falhas.latencia:
+            time.sleep(simulado.falhas.latencia)
+        if simulado.sortear(simulado.falhas.taxa_429):
+            simulado.contar('429')
+            self._responder_json({'message': 'Too Many Requests'}, 429, {'Retry-After': RETRY_AFTER})
+            return
+
+        url = urlsplit(self.path)
+        partes = url.path.strip('/').split('/')
+        consulta = {chave: valores[0] for chave, valores in parse_qs(url.query).items()}
+        video = simulado.videos.get(partes[1]) if len(partes) > 1 else None
+
+        if self.command == 'POST':
+            if partes[0] == 'videos' and video and partes[2:] == ['download']:
+                self._iniciar_download(video)
+            else:
+                self._responder_json({'message': 'Not Found'}, 404)
+        elif partes == ['folders']:
+            self._responder_json({'folders': [simulado.pasta]})
+        elif partes == ['folders', ID_PASTA]:
+            self._responder_json({**simulado.pasta, 'videos': list(simulado.videos.values())})
+        elif partes == ['videos']:
+            self._listar_videos(consulta)
+        elif partes[0] == 'videos' and video and len(partes) == 2:
+            self._responder_json(video)
+        elif partes[0] == 'arquivos' and len(partes) == 2 and partes[1].endswith('.mp4'):
+            self._enviar_mp4(partes[1][:-len('.mp4')], corpo)
+        elif partes[0] == 'hls' and video:
+            self._atender_hls(video, partes[2:], corpo)
+        else:
+            self._responder_json({'message': 'Not Found'}, 404)
+
+    def _responder_json(self, dados: Any, status: int = 200, cabecalhos: Optional[Dict[str, str]] = None) -> None:
+        self._responder(json.dumps(dados).encode(), 'application/json', status, cabecalhos)
+
+    def _responder(self, corpo: bytes, tipo: str, status: int = 200,
+                   cabecalhos: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(corpo)))
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(corpo)
+
+    def _listar_videos(self, consulta: Dict[str, str]) -> None:
+        videos = list(self.server.simulado.videos.values())
+        if 'folder_id' in consulta:
+            videos = [video for video in videos if video['folder_id'] == consulta['folder_id']]
+        limite = max(1, int(consulta.get('limit', 50)))
+        pagina = max(1, int(consulta.get('page', 1)))
+        self._responder_json({
+            'videos': videos[(pagina - 1) * limite:pagina * limite],
+            'total': len(videos),
+            'pages': max(1, math.ceil(len(videos) / limite)),
+        })
+
+    def _iniciar_download(self, video: Dict[str, Any]) -> None:
+        simulado: 'ServidorSimulado' = self.server.simulado
+        url_arquivo = f"{simulado.url}/arquivos/{video['id']}.mp4"
+        if simulado.modo_download == 'json':
+            self._responder_json({'url': url_arquivo})
+        else:
+            self._responder(b'', 'text/plain', 302, {'Location': url_arquivo})
+
+    def _enviar_mp4(self, video_id: str, corpo: bool) -> None:
+        simulado: 'ServidorSimulado' = self.server.simulado
+        video = simulado.videos.get(video_id)
+        if not video:
+            self._responder_json({'message': 'Not Found'}, 404)
+            return
+        total = simulado.tamanho_video
+        cabecalhos = {'Content-Type': 'video/mp4', 'Accept-Ranges': 'bytes', 'ETag': f'"{video_id}"'}
+        intervalo = _interpretar_range(self.headers.get('Range'), total)
+        if intervalo is None:
+            self._enviar_dados(200, cabecalhos, video['semente'], 0, total, corpo)
+            return
+        inicio, fim = intervalo
+        if inicio > fim:
+            self._responder(b'', 'text/plain', 416, {'Content-Range': f'bytes */{total}'})
+            return
+        cabecalhos['Content-Range'] = f'bytes {inicio}-{fim}/{total}'
+        self._enviar_dados(206, cabecalhos, video['semente'], inicio, fim - inicio + 1, corpo)
+
+    def _atender_hls(self, video: Dict[str, Any], partes: List[str], corpo: bool) -> None:
+        simulado: 'ServidorSimulado' = self.server.simulado
+        if partes == ['master.m3u8']:
+            linhas = ['#EXTM3U']
+            for altura, banda in simulado.VARIANTES:
+                linhas += [f'#EXT-X-STREAM-INF:BANDWIDTH={banda},RESOLUTION={altura * 16 // 9}x{altura}',
+                           f'{altura}.m3u8']
+            self._responder('\n'.join(linhas).encode(), 'application/vnd.apple.mpegurl')
+        elif len(partes) == 1 and partes[0].endswith('.m3u8'):
+            altura = partes[0][:-len('.m3u8')]
+            linhas = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:4', '#EXT-X-MEDIA-SEQUENCE:0']
+            for indice in range(simulado.segmentos):
+                linhas += ['#EXTINF:4.0,', f'{altura}/{indice}.ts']
+            linhas.append('#EXT-X-ENDLIST')
+            self._responder('\n'.join(linhas).encode(), 'application/vnd.apple.mpegurl')
+        elif len(partes) == 2 and partes[1].endswith('.ts'):
+            indice = int(partes[1][:-len('.ts')])
+            semente = video['semente'] * 100003 + indice
+            dados = simulado.segmentos_ts[indice] if simulado.segmentos_ts else None
+            self._enviar_dados(200, {'Content-Type': 'video/mp2t'}, semente, 0,
+                               len(dados) if dados else simulado.tamanho_segmento, corpo, dados)
+        else:
+            self._responder_json({'message': 'Not Found'}, 404)
+
+    def _enviar_dados(self, status: int, cabecalhos: Dict[str, str], semente: int, inicio: int,
+                      tamanho: int, corpo: bool, dados: Optional[bytes] = None) -> None:
+        """
+        Envia `tamanho` bytes do arquivo simulado (ou de `dados`), aplicando o
+        limite de banda e as falhas de corpo.
+        """
+        simulado: 'ServidorSimulado' = self.server.simulado
+        self.send_response(status)
+        for nome, valor in cabecalhos.items():
+            self.send_header(nome, valor)
+        self.send_header('Content-Length', str(tamanho))
+        self.end_headers()
+        if not corpo:
+            return
+
+        falha = simulado.sortear_falha_corpo()
+        limite = tamanho // 2 if falha else tamanho
+        banda = simulado.falhas.banda
+        enviados = 0
+        comeco = time.monotonic()
+        while enviados < limite:
+            n = min(TAMANHO_BLOCO, limite - enviados)
+            if dados is None:
+                self.wfile.write(_conteudo(semente, inicio + enviados, n))
+            else:
+                self.wfile.write(memoryview(dados)[inicio + enviados:inicio + enviados + n])
+            enviados += n
+            if banda:
+                atraso = enviados / banda - (time.monotonic() - comeco)
+                if atraso > 0:
+                    time.sleep(atraso)
+        simulado.contar('bytes', enviados)
+        if falha:
+            simulado.contar(falha)
+            self.close_connection = True
+            if falha == 'reset':
+                # SO_LINGER com tempo zero: o close envia RST em vez de FIN
+                self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+                self.connection.close()
+
+
+class ServidorSimulado:
+    """Servidor HTTP local com a API e a CDN simuladas, em uma thread própria."""
+
+    # Variantes HLS (altura, banda em bits/s) oferecidas na playlist mestre
+    VARIANTES = ((360, 800_000), (720, 2_500_000))
+
+    def __init__(self, videos: int = 4, tamanho_video: int = 16 * 1024 * 1024, segmentos: int = 24,
+                 tamanho_segmento: int = 512 * 1024, modo_download: str = 'redirect',
+                 falhas: Falhas = Falhas(), semente: int = 0):
+        self.tamanho_video = tamanho_video
+        self.segmentos = segmentos
+        self.tamanho_segmento = tamanho_segmento
+        self.modo_download = modo_download
+        self.falhas = falhas
+        # Segmentos MPEG-TS reais, gerados em iniciar() se houver ffmpeg
+        self.segmentos_ts: List[bytes] = []
+        self.contagem: Counter = Counter()
+        self._aleatorio = random.Random(semente)
+        self._trava = threading.Lock()
+        self._servidor = _Servidor(('127.0.0.1', 0), _Manipulador)
+        self._servidor.simulado = self
+        self._thread: Optional[threading.Thread] = None
+
+        self.pasta = {'id': ID_PASTA, 'name': NOME_PASTA, 'parent_folder_id': None}
+        self.videos: Dict[str, Dict[str, Any]] = {}
+        for i in range(videos):
+            video_id = f'bench-{i + 1:03d}'
+            self.videos[video_id] = {
+                'id': video_id,
+                'title': f'Video {i + 1:03d}',
+                'folder_id': ID_PASTA,
+                'duration': segmentos * 4,
+                'storage_size': tamanho_video,
+                'delivery_url': f'{self.url}/hls/{video_id}/master.m3u8',
+                'semente': i + 1,
+            }
+
+    @property
+    def url(self) -> str:
+        host, porta = self._servidor.server_address[:2]
+        return f'http://{host}:{porta}'
+
+    def iniciar(self) -> 'ServidorSimulado':
+        if not self.segmentos_ts and shutil.which('ffmpeg'):
+            self.segmentos_ts = _gerar_segmentos_ts(self.segmentos, self.tamanho_segmento)
+        self._thread = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self) -> None:
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self) -> 'ServidorSimulado':
+        return self.iniciar()
+
+    def __exit__(self, *exc) -> None:
+        self.parar()
+
+    def contar(self, evento: str, n: int = 1) -> None:
+        with self._trava:
+            self.contagem[evento] += n
+
+    def sortear(self, taxa: float) -> bool:
+        if taxa <= 0:
+            return False
+        with self._trava:
+            return self._aleatorio.random() < taxa
+
+    def sortear_falha_corpo(self) -> Optional[str]:
+        """'reset', 'truncado' ou None, conforme as taxas do cenário."""
+        with self._trava:
+            sorteio = self._aleatorio.random()
+        if sorteio < self.falhas.taxa_reset:
+            return 'reset'
+        if sorteio < self.falhas.taxa_reset + self.falhas.taxa_truncado:
+            return 'truncado'
+        return None
+
+
+def _gerar_segmentos_ts(segmentos: int, tamanho_segmento: int) -> List[bytes]:
+    """
+    `segmentos` segmentos MPEG-TS de 4 s de um clipe de teste gerado pelo ffmpeg.
+
+    Cada segmento é completado com pacotes nulos até `tamanho_segmento` (em
+    pacotes inteiros de 188 bytes), para que o volume transferido continue
+    sendo o configurado. Retorna lista vazia se o ffmpeg falhar.
+    """
+    with tempfile.TemporaryDirectory(prefix='panda_benchmark_ts-') as pasta:
+        comando = [
+            'ffmpeg', '-v', 'error', '-y',
+            '-f', 'lavfi', '-i', 'testsrc=size=160x90:rate=10', '-t', str(segmentos * 4),
+            '-c:v', 'mpeg2video', '-g', '40',
+            '-f', 'hls', '-hls_time', '4', '-hls_list_size', '0',
+            '-hls_segment_filename', os.path.join(pasta, '%d.ts'), os.path.join(pasta, 'clipe.m3u8'),
+        ]
+        try:
+            subprocess.run(comando, check=True, capture_output=True, timeout=120)
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"⚠️ Não foi possível gerar os segmentos MPEG-TS com o ffmpeg: {e}")
+            return []
+        resultado = []
+        for indice in range(segmentos):
+            caminho = os.path.join(pasta, f'{indice}.ts')
+            if not os.path.exists(caminho):
+                print(f"⚠️ O ffmpeg gerou menos de {segmentos} segmentos MPEG-TS")
+                return []
+            with open(caminho, 'rb') as f:
+                dados = f.read()
+            nulos = max(0, tamanho_segmento - len(dados)) // len(PACOTE_TS_NULO)
+            resultado.append(dados + PACOTE_TS_NULO * nulos)
+        return resultado
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    """Percentil `p` (0-100) pelo método do posto mais próximo."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[max(0, min(len(ordenados) - 1, math.ceil(p / 100 * len(ordenados)) - 1))]
+
+
+def _medir(alvo: str, jobs: int, trabalho: str) -> None:
+    """
+    Executa `alvo` contra o servidor de PANDA_BASE_URL e grava as medições em `trabalho/resultado.json`.
+
+    Roda no processo filho: os módulos do downloader são importados aqui, já
+    com as variáveis de ambiente da rodada.
+    """
+    import panda_downloader
+    from panda_hls import SEGMENTOS_SIMULTANEOS
+    from panda_http import configurar_sessao, observadores_resposta
+    from panda_transferencia import CONEXOES_POR_DOWNLOAD, observadores_bytes
+
+    # Mesmo dimensionamento do pool feito por panda_cli
+    configurar_sessao(jobs * max(CONEXOES_POR_DOWNLOAD, SEGMENTOS_SIMULTANEOS))
+    tempos: List[float] = []
+    recebidos: List[int] = []
+    trava = threading.Lock()
+
+    def registrar_resposta(response) -> None:
+        with trava:
+            tempos.append(response.elapsed.total_seconds())
+
+    def registrar_bytes(n: int) -> None:
+        with trava:
+            recebidos.append(n)
+
+    observadores_resposta.append(registrar_resposta)
+    observadores_bytes.append(registrar_bytes)
+
+    destino = os.path.join(trabalho, 'downloads')
+    inicio = time.perf_counter()
+    videos = panda_downloader.listar_videos_pasta(ID_PASTA, NOME_PASTA)
+    if alvo == 'todos':
+        panda_downloader.baixar_todos_videos(videos, destino, jobs=jobs)
+    else:
+        def baixar(video: Dict[str, Any]) -> bool:
+            info = panda_downloader.obter_info_video(video['id'], completo=True)
+            return panda_downloader.baixar_video_m3u8(info['delivery_url'], info['title'], destino)
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            list(executor.map(baixar, videos))
+    duracao = time.perf_counter() - inicio
+
+    concluidos = [nome for nome in os.listdir(destino) if nome.endswith('.mp4')] if os.path.isdir(destino) else []
+    with trava:
+        total_bytes = sum(recebidos)
+        medidos = list(tempos)
+    with open(os.path.join(trabalho, 'resultado.json'), 'w') as f:
+        json.dump({
+            'videos': len(videos),
+            'concluidos': len(concluidos),
+            'duracao': duracao,
+            'bytes': total_bytes,
+            'vazao': total_bytes / duracao if duracao > 0 else 0.0,
+            'requisicoes': len(medidos),
+            'ttfb_p50': _percentil(medidos, 50),
+            'ttfb_p99': _percentil(medidos, 99),
+        }, f)
+
+
+def executar_rodada(servidor: ServidorSimulado, alvo: str, configuracao: Configuracao, base: str,
+                    ambiente_extra: Optional[Dict[str, str]] = None, timeout: float = 600) -> Dict[str, Any]:
+    """Executa uma rodada em um processo filho isolado e retorna as medições."""
+    trabalho = tempfile.mkdtemp(prefix=f'{alvo}-', dir=base)
+    ambiente = dict(os.environ)
+    ambiente.update({
+        'PANDA_API_KEY': 'benchmark',
+        'PANDA_BASE_URL': servidor.url,
+        'PANDA_DOWNLOAD_URL': servidor.url,
+        'PANDA_ESTADO_DB': os.path.join(trabalho, 'estado.db'),
+        'PANDA_CACHE_HTTP': os.path.join(trabalho, 'cache.db'),
+        'PANDA_CATALOGO_DB': os.path.join(trabalho, 'catalogo.db'),
+        'PANDA_USAR_CATALOGO': '0',
+        'PANDA_HLS_SCRATCH': os.path.join(trabalho, 'hls'),
+        'PYTHONUNBUFFERED': '1',
+    })
+    ambiente.update(configuracao.ambiente)
+    ambiente.update(ambiente_extra or {})
+    caminho_log = os.path.join(trabalho, 'saida.log')
+    with open(caminho_log, 'w') as log:
+        comando = [sys.executable, os.path.abspath(__file__), '--medir', alvo,
+                   '--jobs', str(configuracao.jobs), '--trabalho', trabalho]
+        try:
+            subprocess.run(comando, env=ambiente, stdout=log, stderr=subprocess.STDOUT,
+                           cwd=os.path.dirname(os.path.abspath(__file__)), timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return {'erro': f'tempo esgotado ({timeout:.0f}s)', 'log': caminho_log}
+    try:
+        with open(os.path.join(trabalho, 'resultado.json')) as f:
+            resultado = json.load(f)
+    except FileNotFoundError:
+        return {'erro': 'rodada não concluída', 'log': caminho_log}
+    resultado['log'] = caminho_log
+    return resultado
+
+
+def _formatar_linha(resultado: Dict[str, Any]) -> str:
+    rotulo = f"{resultado['alvo']:<6} {resultado['configuracao']:<10} {resultado['cenario']:<13}"
+    if 'erro' in resultado:
+        return f"{rotulo} ❌ {resultado['erro']} (log: {resultado['log']})"
+    servidor = resultado['servidor']
+    return (f"{rotulo} {resultado['concluidos']:>3}/{resultado['videos']:<3} "
+            f"{resultado['duracao']:>8.2f}s {resultado['vazao'] / 1024 / 1024:>8.1f} MB/s "
+            f"{resultado['ttfb_p50'] * 1000:>7.1f} {resultado['ttfb_p99'] * 1000:>7.1f} ms "
+            f"{resultado['requisicoes']:>6} "
+            f"{servidor.get('429', 0)}/{servidor.get('reset', 0)}/{servidor.get('truncado', 0)}")
+
+
+def _interpretar_tamanho(texto: str) -> int:
+    from panda_transferencia import interpretar_taxa
+    return int(interpretar_taxa(texto))
+
+
+def _interpretar_lista(opcoes: Dict[str, Any]):
+    def interpretar(texto: str) -> List[str]:
+        nomes = [nome.strip() for nome in texto.split(',') if nome.strip()]
+        invalidos = [nome for nome in nomes if nome not in opcoes]
+        if invalidos:
+            raise argparse.ArgumentTypeError(
+                f"opções inválidas: {', '.join(invalidos)} (disponíveis: {', '.join(opcoes)})")
+        return nomes
+    return interpretar
+
+
+def _interpretar_falhas(texto: str) -> Falhas:
+    """Cenário personalizado, ex.: 'latencia=0.1,banda=2M,taxa_429=0.05'."""
+    valores: Dict[str, float] = {}
+    for item in texto.split(','):
+        nome, _, valor = item.strip().partition('=')
+        if nome not in Falhas._fields:
+            raise argparse.ArgumentTypeError(f"falha desconhecida: {nome!r} (use {', '.join(Falhas._fields)})")
+        try:
+            valores[nome] = _interpretar_tamanho(valor) if nome == 'banda' else float(valor)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(f"valor inválido para {nome}: {valor!r}") from e
+    return Falhas(**valores)
+
+
+def _interpretar_ambiente(texto: str) -> Tuple[str, str]:
+    nome, separador, valor = texto.partition('=')
+    if not separador or not nome:
+        raise argparse.ArgumentTypeError(f"use VARIAVEL=valor: {texto!r}")
+    return nome, valor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='🐼 Benchmark offline dos downloads contra uma API/CDN simulada',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f'''
+Cenários: {', '.join(f"{nome} ({falhas._asdict()})" for nome, falhas in CENARIOS.items())}
+Configurações: {', '.join(f"{nome} (jobs={c.jobs} {c.ambiente})" for nome, c in CONFIGURACOES.items())}
+
+Colunas: vídeos concluídos, tempo total, vazão, TTFB p50 e p99, requisições,
+falhas injetadas (429/reset/truncado).
+'''
+    )
+    parser.add_argument('--alvos', type=_interpretar_lista(dict.fromkeys(ALVOS)), default=list(ALVOS),
+                        help='todos (baixar_todos_videos) e/ou m3u8 (baixar_video_m3u8) (padrão: ambos)')
+    parser.add_argument('--configuracoes', type=_interpretar_lista(CONFIGURACOES), default=list(CONFIGURACOES),
+                        help='Configurações do cliente, separadas por vírgula (padrão: todas)')
+    parser.add_argument('--cenarios', type=_interpretar_lista(CENARIOS), default=list(CENARIOS),
+                        help='Cenários de falhas, separados por vírgula (padrão: todos)')
+    parser.add_argument('--falhas', type=_interpretar_falhas, metavar='NOME=VALOR,...',
+                        help='Cenário personalizado no lugar de --cenarios, ex.: latencia=0.1,banda=2M,taxa_reset=0.2')
+    parser.add_argument('--ambiente', type=_interpretar_ambiente, action='append', default=[],
+                        metavar='VAR=VALOR', help='Variável de ambiente aplicada a todas as rodadas (repetível)')
+    parser.add_argument('--videos', type=int, default=4, help='Vídeos na pasta simulada (padrão: 4)')
+    parser.add_argument('--tamanho', type=_interpretar_tamanho, default='16M',
+                        help='Tamanho de cada MP4 (padrão: 16M)')
+    parser.add_argument('--segmentos', type=int, default=24, help='Segmentos por playlist HLS (padrão: 24)')
+    parser.add_argument('--tamanho-segmento', type=_interpretar_tamanho, default='512K',
+                        help='Tamanho de cada segmento HLS (padrão: 512K)')
+    parser.add_argument('--modo-download', choices=['redirect', 'json'], default='redirect',
+                        help='Resposta de POST /videos/{id}/download (padrão: redirect)')
+    parser.add_argument('--timeout', type=float, default=600, help='Limite de cada rodada em segundos (padrão: 600)')
+    parser.add_argument('--json', metavar='ARQUIVO', help='Grava os resultados em JSON')
+    parser.add_argument('--manter', action='store_true', help='Mantém os arquivos e logs das rodadas')
+    # Execução de uma rodada no processo filho
+    parser.add_argument('--medir', choices=ALVOS, help=argparse.SUPPRESS)
+    parser.add_argument('--jobs', type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument('--trabalho', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        _medir(args.medir, args.jobs, args.trabalho)
+        return
+
+    cenarios = dict(CENARIOS)
+    if args.falhas:
+        cenarios = {'personalizado': args.falhas}
+        args.cenarios = ['personalizado']
+    alvos = args.alvos
+    if 'm3u8' in alvos and not shutil.which('ffmpeg'):
+        print("⚠️ ffmpeg não encontrado: alvo m3u8 ignorado")
+        alvos = [alvo for alvo in alvos if alvo != 'm3u8']
+
+    base = tempfile.mkdtemp(prefix='panda_benchmark-')
+    resultados = []
+    try:
+        with ServidorSimulado(args.videos, args.tamanho, args.segmentos, args.tamanho_segmento,
+                              args.modo_download) as servidor:
+            print(f"🧪 Servidor simulado em {servidor.url} ({args.videos} vídeos de "
+                  f"{args.tamanho / 1024 / 1024:.1f} MiB, {args.segmentos} segmentos HLS de "
+                  f"{args.tamanho_segmento / 1024:.0f} KiB)")
+            print(f"{'alvo':<6} {'config':<10} {'cenário':<13} {'ok':>7} {'tempo':>9} {'vazão':>13} "
+                  f"{'p50':>7} {'p99':>7}    {'req':>6} 429/rst/trunc")
+            for alvo in alvos:
+                for nome_configuracao in args.configuracoes:
+                    for nome_cenario in args.cenarios:
+                        servidor.falhas = cenarios[nome_cenario]
+                        servidor.contagem.clear()
+                        resultado = executar_rodada(servidor, alvo, CONFIGURACOES[nome_configuracao], base,
+                                                    dict(args.ambiente), args.timeout)
+                        resultado.update(alvo=alvo, configuracao=nome_configuracao, cenario=nome_cenario,
+                                         servidor=dict(servidor.contagem))
+                        resultados.append(resultado)
+                        print(_formatar_linha(resultado))
+    finally:
+        if args.manter or any('erro' in resultado for resultado in resultados):
+            print(f"📁 Arquivos e logs das rodadas em {base}")
+        else:
+            shutil.rmtree(base, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(resultados, f, indent=2)
+        print(f"💾 Resultados gravados em {args.json}")
+
+
+if __name__ == "__main__":
+    main()
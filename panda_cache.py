@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Caches das respostas da API: metadados dos vídeos e listagens de pastas.
+
+O cache de metadados (GET /videos/{id}) é compartilhado pelo processo.
+
+Os métodos de download (oficial, alternativo, Streamlit e motor assíncrono)
+consultam o cache antes de ir à API, de modo que cada vídeo gera no máximo uma
+requisição de metadados por execução, mesmo com fallback e novas tentativas.
+As listagens de pasta semeiam o cache com o resumo de cada vídeo, que já basta
+para o download oficial (título); os métodos alternativos precisam do registro
+completo (fontes, delivery_url) e o buscam uma única vez.
+
+As entradas expiram após PANDA_TTL_METADADOS segundos (padrão 1 hora). Se
+PANDA_CACHE_DB apontar para um arquivo, o cache também é gravado em disco
+(SQLite) e aproveitado pelas execuções seguintes dentro do mesmo prazo.
+
+As listagens (GET /folders, /folders/{id}, /videos) passam por `cache_listagens`,
+um cache HTTP persistente (`.panda_cache.db`, ou PANDA_CACHE_HTTP). Dentro de
+PANDA_TTL_LISTAGENS segundos (padrão 5 minutos) a resposta guardada é usada sem
+acessar a API; depois disso a requisição é condicional (If-None-Match /
+If-Modified-Since) e um 304 reaproveita o corpo guardado.
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from panda_http import obter_sessao
+
+TTL_METADADOS = float(os.getenv('PANDA_TTL_METADADOS', '3600'))  # segundos
+CAMINHO_CACHE = os.getenv('PANDA_CACHE_DB')
+TTL_LISTAGENS = float(os.getenv('PANDA_TTL_LISTAGENS', '300'))  # segundos
+CAMINHO_CACHE_HTTP = os.getenv('PANDA_CACHE_HTTP', '.panda_cache.db')
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS metadados (
+    video_id      TEXT PRIMARY KEY,
+    dados         TEXT NOT NULL,
+    completo      INTEGER NOT NULL,
+    atualizado_em REAL NOT NULL
+);
+"""
+
+_ESQUEMA_HTTP = """
+CREATE TABLE IF NOT EXISTS respostas (
+    chave         TEXT PRIMARY KEY,
+    corpo         TEXT NOT NULL,
+    etag          TEXT,
+    last_modified TEXT,
+    validado_em   REAL NOT NULL
+);
+"""
+
+
+class CacheMetadados:
+    """Cache com prazo de validade, em memória e opcionalmente em disco."""
+
+    def __init__(self, ttl: float = TTL_METADADOS, caminho: Optional[str] = None):
+        self.ttl = ttl
+        self.caminho = caminho
+        # video_id -> (dados, completo, atualizado_em)
+        self._entradas: Dict[str, Tuple[Dict[str, Any], bool, float]] = {}
+        self._trava = threading.Lock()
+        self._conexao: Optional[sqlite3.Connection] = None
+
+    def _obter_conexao(self) -> Optional[sqlite3.Connection]:
+        if self.caminho and self._conexao is None:
+            self._conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+            self._conexao.execute('PRAGMA journal_mode=WAL')
+            self._conexao.executescript(_ESQUEMA)
+        return self._conexao
+
+    def _valida(self, entrada: Optional[Tuple[Dict[str, Any], bool, float]], completo: bool) -> bool:
+        return (entrada is not None and (entrada[1] or not completo)
+                and time.time() - entrada[2] < self.ttl)
+
+    def obter(self, video_id: str, completo: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Retorna os metadados em cache, se ainda válidos.
+
+        Args:
+            video_id: ID do vídeo
+            completo: Exige o registro completo de GET /videos/{id}, e não apenas o resumo da listagem
+        """
+        video_id = str(video_id)
+        with self._trava:
+            entrada = self._entradas.get(video_id)
+            if not self._valida(entrada, completo):
+                entrada = self._carregar_do_disco(video_id)
+                if not self._valida(entrada, completo):
+                    return None
+                self._entradas[video_id] = entrada
+            return entrada[0]
+
+    def guardar(self, video_id: str, dados: Dict[str, Any], completo: bool = True) -> None:
+        """Guarda os metadados de um vídeo (`completo=False` para resumos de listagem)."""
+        self._guardar_varios([(str(video_id), dados)], completo)
+
+    def semear(self, videos: Iterable[Dict[str, Any]]) -> None:
+        """Guarda os resumos de uma listagem, sem substituir registros completos ainda válidos."""
+        with self._trava:
+            novos = [(str(video['id']), video) for video in videos
+                     if video.get('id') and not self._valida(self._entradas.get(str(video['id'])), True)]
+        self._guardar_varios(novos, False)
+
+    def invalidar(self, video_id: str) -> None:
+        with self._trava:
+            self._entradas.pop(str(video_id), None)
+            conexao = self._obter_conexao()
+            if conexao:
+                conexao.execute("DELETE FROM metadados WHERE video_id = ?", (str(video_id),))
+                conexao.commit()
+
+    def _guardar_varios(self, itens: List[Tuple[str, Dict[str, Any]]], completo: bool) -> None:
+        if not itens:
+            return
+        agora = time.time()
+        with self._trava:
+            for video_id, dados in itens:
+                self._entradas[video_id] = (dados, completo, agora)
+            conexao = self._obter_conexao()
+            if conexao:
+                conexao.executemany(
+                    "INSERT OR REPLACE INTO metadados (video_id, dados, completo, atualizado_em) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(video_id, json.dumps(dados), int(completo), agora) for video_id, dados in itens],
+                )
+                conexao.commit()
+
+    def _carregar_do_disco(self, video_id: str) -> Optional[Tuple[Dict[str, Any], bool, float]]:
+        conexao = self._obter_conexao()
+        if conexao is None:
+            return None
+        linha = conexao.execute(
+            "SELECT dados, completo, atualizado_em FROM metadados WHERE video_id = ?", (video_id,)
+        ).fetchone()
+        if linha is None:
+            return None
+        return json.loads(linha[0]), bool(linha[1]), linha[2]
+
+
+class CacheHTTP:
+    """
+    Cache persistente de respostas GET em JSON, com revalidação condicional.
+
+    A chave combina a URL com um resumo do cabeçalho Authorization, para que
+    contas diferentes não compartilhem respostas.
+    """
+
+    def __init__(self, ttl: float = TTL_LISTAGENS, caminho: Optional[str] = CAMINHO_CACHE_HTTP):
+        self.ttl = ttl
+        self.caminho = caminho
+        # chave -> {'dados', 'corpo', 'etag', 'last_modified', 'validado_em'}
+        self._entradas: Dict[str, Dict[str, Any]] = {}
+        self._trava = threading.Lock()
+        self._conexao: Optional[sqlite3.Connection] = None
+
+    def _obter_conexao(self) -> Optional[sqlite3.Connection]:
+        if self.caminho and self._conexao is None:
+            self._conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+            self._conexao.execute('PRAGMA journal_mode=WAL')
+            self._conexao.executescript(_ESQUEMA_HTTP)
+        return self._conexao
+
+    @staticmethod
+    def _chave(url: str, headers: Dict[str, str]) -> str:
+        conta = hashlib.sha256(headers.get('Authorization', '').encode()).hexdigest()[:16]
+        return f"{conta} {url}"
+
+    def _carregar(self, chave: str) -> Optional[Dict[str, Any]]:
+        entrada = self._entradas.get(chave)
+        if entrada is None:
+            conexao = self._obter_conexao()
+            if conexao is None:
+                return None
+            linha = conexao.execute(
+                "SELECT corpo, etag, last_modified, validado_em FROM respostas WHERE chave = ?", (chave,)
+            ).fetchone()
+            if linha is None:
+                return None
+            entrada = {'dados': json.loads(linha[0]), 'corpo': linha[0], 'etag': linha[1],
+                       'last_modified': linha[2], 'validado_em': linha[3]}
+            self._entradas[chave] = entrada
+        return entrada
+
+    def _guardar(self, chave: str, entrada: Dict[str, Any]) -> None:
+        self._entradas[chave] = entrada
+        conexao = self._obter_conexao()
+        if conexao:
+            conexao.execute(
+                "INSERT OR REPLACE INTO respostas (chave, corpo, etag, last_modified, validado_em) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (chave, entrada['corpo'], entrada['etag'], entrada['last_modified'], entrada['validado_em']),
+            )
+            conexao.commit()
+
+    def obter_json(self, url: str, headers: Dict[str, str], revalidar: bool = False) -> Any:
+        """
+        GET `url` retornando o JSON, do cache quando possível.
+
+        Com `revalidar`, a resposta guardada nunca é usada sem uma requisição
+        condicional, mesmo dentro do prazo.
+
+        Raises:
+            requests.exceptions.RequestException: Falha de rede ou status de erro
+        """
+        chave = self._chave(url, headers)
+        with self._trava:
+            entrada = self._carregar(chave)
+        if entrada and not revalidar and time.time() - entrada['validado_em'] < self.ttl:
+            return entrada['dados']
+
+        cabecalhos = dict(headers)
+        if entrada and entrada['etag']:
+            cabecalhos['If-None-Match'] = entrada['etag']
+        if entrada and entrada['last_modified']:
+            cabecalhos['If-Modified-Since'] = entrada['last_modified']
+        response = obter_sessao().get(url, headers=cabecalhos)
+
+        if response.status_code == 304 and entrada:
+            entrada = dict(entrada, validado_em=time.time())
+        else:
+            response.raise_for_status()
+            entrada = {'dados': response.json(), 'corpo': response.text,
+                       'etag': response.headers.get('ETag'),
+                       'last_modified': response.headers.get('Last-Modified'),
+                       'validado_em': time.time()}
+        with self._trava:
+            self._guardar(chave, entrada)
+        return entrada['dados']
+
+    def invalidar(self) -> None:
+        """Descarta todas as respostas guardadas."""
+        with self._trava:
+            self._entradas.clear()
+            conexao = self._obter_conexao()
+            if conexao:
+                conexao.execute("DELETE FROM respostas")
+                conexao.commit()
+
+
+# Cache de metadados do processo
+cache_metadados = CacheMetadados(TTL_METADADOS, CAMINHO_CACHE)
+# Cache HTTP das listagens, persistido entre execuções
+cache_listagens = CacheHTTP(TTL_LISTAGENS, CAMINHO_CACHE_HTTP)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Catálogo local (SQLite) das pastas e vídeos da conta, com sincronização incremental.
+
+`python3 panda_cli.py sync-catalog` espelha GET /folders e GET /videos
+(paginado) em `.panda_catalogo.db` (ou PANDA_CATALOGO_DB): id, título, pasta,
+duração, tamanho e updated_at de cada vídeo, além do registro completo da API.
+As páginas passam pelo cache HTTP com revalidação condicional, então o que não
+mudou volta como 304; dos registros recebidos, só são gravados os que mudaram,
+e os que sumiram da conta são removidos.
+
+Depois da primeira sincronização, `listar_pastas` e `listar_videos_pasta` (e,
+por elas, os comandos listar, todos, subpastas e as páginas do Streamlit) leem
+do catálogo, sem acessar a API. Pastas ou vídeos que não estão no catálogo
+(criados depois da sincronização) são buscados na API, e um catálogo mais
+antigo que PANDA_TTL_CATALOGO segundos (padrão 24 h; 0 = sem prazo) deixa de
+ser usado até a próxima sincronização. PANDA_USAR_CATALOGO=0 volta a consultar
+sempre a API.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from panda_pastas import id_pasta_pai
+
+CAMINHO_CATALOGO = os.getenv('PANDA_CATALOGO_DB', '.panda_catalogo.db')
+USAR_CATALOGO = os.getenv('PANDA_USAR_CATALOGO', '1') != '0'
+# Idade máxima do catálogo para que as listagens o usem (0 = sem prazo)
+TTL_CATALOGO = float(os.getenv('PANDA_TTL_CATALOGO', '86400'))  # segundos
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS pastas (
+    id         TEXT PRIMARY KEY,
+    nome       TEXT,
+    parent_id  TEXT,
+    updated_at TEXT,
+    ordem      INTEGER NOT NULL,
+    dados      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pastas_parent ON pastas (parent_id);
+CREATE TABLE IF NOT EXISTS videos (
+    id         TEXT PRIMARY KEY,
+    titulo     TEXT,
+    folder_id  TEXT,
+    duracao    REAL,
+    tamanho    INTEGER,
+    updated_at TEXT,
+    ordem      INTEGER NOT NULL,
+    dados      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_videos_pasta ON videos (folder_id, ordem);
+CREATE TABLE IF NOT EXISTS sincronizacao (
+    chave TEXT PRIMARY KEY,
+    valor TEXT NOT NULL
+);
+"""
+
+_conexao: Optional[sqlite3.Connection] = None
+_trava = threading.Lock()
+# Pastas lidas do catálogo, reaproveitadas até a próxima sincronização
+_pastas_lidas: Optional[List[Dict[str, Any]]] = None
+
+
+def _obter_conexao() -> sqlite3.Connection:
+    global _conexao
+    if _conexao is None:
+        _conexao = sqlite3.connect(CAMINHO_CATALOGO, check_same_thread=False)
+        _conexao.execute('PRAGMA journal_mode=WAL')
+        _conexao.executescript(_ESQUEMA)
+    return _conexao
+
+
+def _serializar(item: Dict[str, Any]) -> str:
+    return json.dumps(item, sort_keys=True, ensure_ascii=False)
+
+
+def _atualizar_tabela(conexao: sqlite3.Connection, tabela: str, linhas: Dict[str, tuple],
+                      remover: bool = True) -> Dict[str, int]:
+    """
+    Grava em `tabela` só as linhas novas ou alteradas e, com `remover`, apaga as ausentes.
+
+    `linhas` mapeia id -> valores das colunas na ordem do INSERT, com `dados` por último.
+    """
+    colunas = {'pastas': '(id, nome, parent_id, updated_at, ordem, dados)',
+               'videos': '(id, titulo, folder_id, duracao, tamanho, updated_at, ordem, dados)'}[tabela]
+    existentes = dict(conexao.execute(f"SELECT id, dados FROM {tabela}").fetchall())
+    alteradas = [(item_id, *valores) for item_id, valores in linhas.items()
+                 if existentes.get(item_id) != valores[-1]]
+    removidas = [(item_id,) for item_id in existentes if item_id not in linhas] if remover else []
+    if alteradas:
+        marcadores = ', '.join('?' * len(alteradas[0]))
+        conexao.executemany(f"INSERT OR REPLACE INTO {tabela} {colunas} VALUES ({marcadores})", alteradas)
+    conexao.executemany(f"DELETE FROM {tabela} WHERE id = ?", removidas)
+    # A ordem da API pode mudar sem que o registro mude
+    conexao.executemany(f"UPDATE {tabela} SET ordem = ? WHERE id = ?",
+                        [(valores[-2], item_id) for item_id, valores in linhas.items()
+                         if existentes.get(item_id) == valores[-1]])
+    novas = sum(1 for item_id, *_ in alteradas if item_id not in existentes)
+    return {'novas': novas, 'alteradas': len(alteradas) - novas, 'removidas': len(removidas)}
+
+
+def atualizar_catalogo(pastas: List[Dict[str, Any]], paginas_videos: Iterable[List[Dict[str, Any]]],
+                       total_videos: Optional[int] = None) -> Dict[str, Dict[str, int]]:
+    """
+    Sincroniza o catálogo com a listagem completa de pastas e as páginas de vídeos da conta.
+
+    Se a iteração das páginas falhar, nada é gravado (a exceção é repassada).
+    Se a API informou `total_videos` e a quantidade recebida for diferente, a
+    listagem é tratada como incompleta: os vídeos recebidos são gravados, mas
+    nenhum vídeo do catálogo é removido.
+
+    Returns:
+        {'pastas': {...}, 'videos': {...}} com as contagens de novas, alteradas e
+        removidas; 'videos' traz também 'incompleta' (1 se a listagem não bateu com o total)
+    """
+    linhas_pastas = {
+        str(pasta['id']): (pasta.get('name'), id_pasta_pai(pasta), pasta.get('updated_at'), ordem, _serializar(pasta))
+        for ordem, pasta in enumerate(pastas) if pasta.get('id')
+    }
+    linhas_videos: Dict[str, tuple] = {}
+    for pagina in paginas_videos:
+        for video in pagina:
+            if video.get('id') and str(video['id']) not in linhas_videos:
+                linhas_videos[str(video['id'])] = (
+                    video.get('title'), video.get('folder_id'), video.get('duration'),
+                    video.get('size') or video.get('storage_size'), video.get('updated_at'),
+                    len(linhas_videos), _serializar(video),
+                )
+    global _pastas_lidas
+    with _trava:
+        _pastas_lidas = None
+        conexao = _obter_conexao()
+        with conexao:
+            incompleta = total_videos is not None and len(linhas_videos) != int(total_videos)
+            resultado = {'pastas': _atualizar_tabela(conexao, 'pastas', linhas_pastas),
+                         'videos': _atualizar_tabela(conexao, 'videos', linhas_videos, remover=not incompleta)}
+            resultado['videos']['incompleta'] = int(incompleta)
+            conexao.execute("INSERT OR REPLACE INTO sincronizacao (chave, valor) VALUES ('concluida_em', ?)",
+                            (str(time.time()),))
+    return resultado
+
+
+def catalogo_sincronizado() -> Optional[float]:
+    """
+    Momento (timestamp) da última sincronização, ou None se o catálogo não deve
+    ser usado (desligado, nunca sincronizado ou mais antigo que PANDA_TTL_CATALOGO).
+    """
+    if not USAR_CATALOGO or not os.path.exists(CAMINHO_CATALOGO):
+        return None
+    with _trava:
+        linha = _obter_conexao().execute(
+            "SELECT valor FROM sincronizacao WHERE chave = 'concluida_em'").fetchone()
+    if not linha:
+        return None
+    sincronizado_em = float(linha[0])
+    if TTL_CATALOGO and time.time() - sincronizado_em > TTL_CATALOGO:
+        return None
+    return sincronizado_em
+
+
+def listar_pastas_catalogo() -> List[Dict[str, Any]]:
+    """
+    Pastas da conta, na ordem da API, como retornadas por GET /folders.
+
+    A mesma lista é retornada até a próxima sincronização; não a modifique.
+    """
+    global _pastas_lidas
+    with _trava:
+        if _pastas_lidas is None:
+            linhas = _obter_conexao().execute("SELECT dados FROM pastas ORDER BY ordem").fetchall()
+            _pastas_lidas = [json.loads(dados) for dados, in linhas]
+        return _pastas_lidas
+
+
+def obter_pasta_catalogo(pasta_id: str) -> Optional[Dict[str, Any]]:
+    with _trava:
+        linha = _obter_conexao().execute("SELECT dados FROM pastas WHERE id = ?", (str(pasta_id),)).fetchone()
+    return json.loads(linha[0]) if linha else None
+
+
+def listar_videos_catalogo(pasta_id: str) -> List[Dict[str, Any]]:
+    """Vídeos de uma pasta (consulta pelo índice de folder_id)."""
+    with _trava:
+        linhas = _obter_conexao().execute(
+            "SELECT dados FROM videos WHERE folder_id = ? ORDER BY ordem", (str(pasta_id),)).fetchall()
+    return [json.loads(dados) for dados, in linhas]
@@ -7,11 +7,17 @@ import sys
 from panda_downloader import (
     verificar_autenticacao,
     listar_pastas,
+    buscar_pasta_por_nome,
     listar_videos_pasta,
     baixar_video,
     baixar_todos_videos,
-    identificar_subpastas
+    identificar_subpastas,
+    sincronizar_catalogo
 )
+from panda_http import configurar_sessao
+from panda_concorrencia import ControladorConcorrencia
+from panda_transferencia import CONEXOES_POR_DOWNLOAD, interpretar_taxa, limitador_banda
+from panda_hls import SEGMENTOS_SIMULTANEOS, definir_qualidade, interpretar_qualidade
 
 def formatar_tamanho(tamanho_bytes):
     """Formata o tamanho em bytes para um formato legível."""
@@ -21,6 +27,15 @@ def formatar_tamanho(tamanho_bytes):
         tamanho_bytes /= 1024.0
     return f"{tamanho_bytes:.2f} TB"
 
+def baixar_videos(videos, pasta_destino, args):
+    """Baixa a lista de vídeos com o motor escolhido em --engine."""
+    if args.engine == 'async':
+        # Importado sob demanda: o motor assíncrono depende do aiohttp
+        from panda_async import baixar_todos_videos as baixar_todos_videos_async
+        baixar_todos_videos_async(videos, pasta_destino, args.jobs)
+    else:
+        baixar_todos_videos(videos, pasta_destino, args.jobs, args.controlador)
+
 def comando_baixar(args):
     """Executa o comando para baixar um vídeo específico."""
     print(f"🎬 Baixando vídeo ID: {args.video_id}")
@@ -40,15 +55,9 @@ def comando_listar_pastas(args):
 def comando_listar_videos(args):
     """Executa o comando para listar vídeos de uma pasta específica."""
     # Encontrar ID da pasta pelo nome
-    pastas = listar_pastas()
-    pasta_id = None
-    pasta_nome = None
-    
-    for pasta in pastas:
-        if pasta.get('name', '').lower() == args.pasta_nome.lower():
-            pasta_id = pasta.get('id')
-            pasta_nome = pasta.get('name')
-            break
+    pasta = buscar_pasta_por_nome(args.pasta_nome, listar_pastas())
+    pasta_id = pasta.get('id') if pasta else None
+    pasta_nome = pasta.get('name') if pasta else None
     
     if pasta_id:
         videos = listar_videos_pasta(pasta_id, pasta_nome)
@@ -62,15 +71,9 @@ def comando_listar_videos(args):
 def comando_baixar_todos(args):
     """Executa o comando para baixar todos os vídeos de uma pasta."""
     # Encontrar ID da pasta pelo nome
-    pastas = listar_pastas()
-    pasta_id = None
-    pasta_nome = None
-    
-    for pasta in pastas:
-        if pasta.get('name', '').lower() == args.pasta_nome.lower():
-            pasta_id = pasta.get('id')
-            pasta_nome = pasta.get('name')
-            break
+    pasta = buscar_pasta_por_nome(args.pasta_nome, listar_pastas())
+    pasta_id = pasta.get('id') if pasta else None
+    pasta_nome = pasta.get('name') if pasta else None
     
     if pasta_id:
         # Definir pasta de destino
@@ -87,7 +90,7 @@ def comando_baixar_todos(args):
         videos = listar_videos_pasta(pasta_id, pasta_nome)
         if videos:
             print(f"📁 Baixando {len(videos)} vídeos da pasta '{pasta_nome}' para '{pasta_destino}'")
-            baixar_todos_videos(videos, pasta_destino)
+            baixar_videos(videos, pasta_destino, args)
         else:
             print(f"⚠️ Nenhum vídeo encontrado na pasta '{pasta_nome}'")
             sys.exit(1)
@@ -124,11 +127,27 @@ def comando_baixar_todos_id(args):
     videos = listar_videos_pasta(pasta_id, pasta_nome)
     if videos:
         print(f"📁 Baixando {len(videos)} vídeos da pasta '{pasta_nome}' para '{pasta_destino}'")
-        baixar_todos_videos(videos, pasta_destino)
+        baixar_videos(videos, pasta_destino, args)
     else:
         print(f"⚠️ Nenhum vídeo encontrado na pasta ID '{pasta_id}'")
         sys.exit(1)
 
+def comando_sincronizar_catalogo(args):
+    """Executa o comando para sincronizar o catálogo local de pastas e vídeos."""
+    print("📚 Sincronizando o catálogo local...")
+    try:
+        resultado = sincronizar_catalogo()
+    except Exception as e:
+        print(f"❌ Falha ao sincronizar o catálogo: {e}")
+        sys.exit(1)
+    for tipo, contagem in resultado.items():
+        print(f"  {tipo}: {contagem['novas']} novas, {contagem['alteradas']} alteradas, "
+              f"{contagem['removidas']} removidas")
+    if resultado['videos'].get('incompleta'):
+        print("⚠️ A API informou um total de vídeos diferente do recebido: "
+              "nenhum vídeo foi removido do catálogo nesta sincronização")
+    print("✅ Catálogo atualizado")
+
 def comando_identificar_subpastas(args):
     """Executa o comando para identificar subpastas de um curso/pasta principal."""
     pasta_id = args.pasta_id
@@ -168,7 +187,7 @@ def comando_identificar_subpastas(args):
             
             if videos:
                 print(f"📥 Baixando {len(videos)} vídeos da subpasta '{subpasta_nome}' para '{pasta_destino}'")
-                baixar_todos_videos(videos, pasta_destino)
+                baixar_videos(videos, pasta_destino, args)
             else:
                 print(f"⚠️ Nenhum vídeo encontrado na subpasta '{subpasta_nome}'")
 
@@ -180,21 +199,47 @@ def main():
         epilog='''
 Exemplos de uso:
   python panda_cli.py pastas                    # Lista todas as pastas disponíveis
+  python panda_cli.py sync-catalog              # Atualiza o catálogo local usado pelas listagens
   python panda_cli.py listar "Nome da Pasta"    # Lista vídeos de uma pasta específica
   python panda_cli.py baixar abc123             # Baixa o vídeo com ID abc123
   python panda_cli.py todos "Nome da Pasta"     # Baixa todos os vídeos da pasta
   python panda_cli.py todos-id abc123           # Baixa todos os vídeos da pasta com ID abc123
+  python panda_cli.py todos-id abc123 --jobs 4  # Baixa 4 vídeos simultaneamente
+  python panda_cli.py todos-id abc123 --engine async --jobs 32  # Motor assíncrono
+  python panda_cli.py todos-id abc123 --jobs 4 --max-rate 40M   # Limita a banda total a 40 MB/s
+  python panda_cli.py todos-id abc123 --qualidade '<=720p'      # HLS em até 720p, sem perguntar
+  python panda_cli.py todos-id abc123 --jobs 16 --adaptativo    # Ajusta a concorrência automaticamente
   python panda_cli.py subpastas abc123          # Identifica subpastas/módulos de um curso
   python panda_cli.py subpastas abc123 --baixar # Baixa vídeos de todas as subpastas
 '''
     )
     
+    # Opções comuns a todos os comandos de download
+    opcoes_transferencia = argparse.ArgumentParser(add_help=False)
+    opcoes_transferencia.add_argument('--max-rate', type=interpretar_taxa, default=None, metavar='TAXA',
+                                      help='Limite de banda global, ex.: 40M, 512K (padrão: PANDA_MAX_RATE ou sem limite)')
+    opcoes_transferencia.add_argument('--qualidade', '--quality', type=interpretar_qualidade, default=None,
+                                      metavar='POLITICA',
+                                      help='Variante dos vídeos HLS: best, worst, <=720p ou max-bitrate=2.5M '
+                                           '(padrão: PANDA_QUALIDADE ou best)')
+    
+    # Opções comuns aos comandos que baixam vários vídeos
+    opcoes_download = argparse.ArgumentParser(add_help=False, parents=[opcoes_transferencia])
+    opcoes_download.add_argument('--jobs', '-j', type=int, default=1,
+                                 help='Número de vídeos baixados simultaneamente (padrão: 1)')
+    opcoes_download.add_argument('--engine', choices=['sync', 'async'], default='sync',
+                                 help='Motor de download: threads (sync) ou asyncio (async) (padrão: sync)')
+    opcoes_download.add_argument('--adaptativo', action='store_true',
+                                 help='Ajusta os downloads simultâneos (AIMD) entre 1 e --jobs '
+                                      '(16 se --jobs não for informado); motor sync')
+    
     # Definir os subcomandos
     subparsers = parser.add_subparsers(dest='comando', help='Comandos disponíveis')
     subparsers.required = True
     
     # Comando para baixar um vídeo específico
-    baixar_parser = subparsers.add_parser('baixar', help='Baixar um vídeo específico')
+    baixar_parser = subparsers.add_parser('baixar', help='Baixar um vídeo específico',
+                                          parents=[opcoes_transferencia])
     baixar_parser.add_argument('video_id', help='ID do vídeo a ser baixado')
     baixar_parser.add_argument('--pasta', '-p', default='downloads', help='Pasta de destino (padrão: downloads)')
     baixar_parser.set_defaults(func=comando_baixar)
@@ -203,27 +248,35 @@ Exemplos de uso:
     pastas_parser = subparsers.add_parser('pastas', help='Listar todas as pastas disponíveis')
     pastas_parser.set_defaults(func=comando_listar_pastas)
     
+    # Comando para sincronizar o catálogo local
+    catalogo_parser = subparsers.add_parser('sync-catalog', aliases=['sincronizar-catalogo'],
+                                            help='Sincronizar o catálogo local de pastas e vídeos')
+    catalogo_parser.set_defaults(func=comando_sincronizar_catalogo)
+    
     # Comando para listar vídeos de uma pasta
     listar_parser = subparsers.add_parser('listar', help='Listar vídeos de uma pasta específica')
     listar_parser.add_argument('pasta_nome', help='Nome da pasta')
     listar_parser.set_defaults(func=comando_listar_videos)
     
     # Comando para baixar todos os vídeos de uma pasta
-    todos_parser = subparsers.add_parser('todos', help='Baixar todos os vídeos de uma pasta')
+    todos_parser = subparsers.add_parser('todos', help='Baixar todos os vídeos de uma pasta',
+                                         parents=[opcoes_download])
     todos_parser.add_argument('pasta_nome', help='Nome da pasta')
     todos_parser.add_argument('--pasta-destino', '-p', default=None, 
                              help='Pasta de destino (padrão: nome da pasta dentro de downloads)')
     todos_parser.set_defaults(func=comando_baixar_todos)
     
     # Comando para baixar todos os vídeos de uma pasta usando o ID da pasta
-    todos_id_parser = subparsers.add_parser('todos-id', help='Baixar todos os vídeos de uma pasta usando o ID da pasta')
+    todos_id_parser = subparsers.add_parser('todos-id', help='Baixar todos os vídeos de uma pasta usando o ID da pasta',
+                                            parents=[opcoes_download])
     todos_id_parser.add_argument('pasta_id', help='ID da pasta')
     todos_id_parser.add_argument('--pasta-destino', '-p', default=None, 
                              help='Pasta de destino (padrão: nome da pasta dentro de downloads)')
     todos_id_parser.set_defaults(func=comando_baixar_todos_id)
     
     # Comando para identificar subpastas
-    subpastas_parser = subparsers.add_parser('subpastas', help='Identificar subpastas/módulos de um curso')
+    subpastas_parser = subparsers.add_parser('subpastas', help='Identificar subpastas/módulos de um curso',
+                                             parents=[opcoes_download])
     subpastas_parser.add_argument('pasta_id', help='ID da pasta principal/curso')
     subpastas_parser.add_argument('--padrao', '-p', help='Padrão regex para filtrar nomes de subpastas', default=None)
     subpastas_parser.add_argument('--baixar', '-b', action='store_true', dest='baixar_todos', 
@@ -234,6 +287,24 @@ Exemplos de uso:
     
     # Analisar argumentos
     args = parser.parse_args()
+    if getattr(args, 'adaptativo', False) and getattr(args, 'engine', 'sync') == 'async':
+        parser.error("--adaptativo só funciona com o motor sync (o motor async não usa o controlador)")
+    
+    # Controlador adaptativo de concorrência (--adaptativo)
+    max_jobs = getattr(args, 'jobs', 1)
+    args.controlador = None
+    if getattr(args, 'adaptativo', False):
+        max_jobs = max_jobs if max_jobs > 1 else 16
+        args.controlador = ControladorConcorrencia(maximo=max_jobs)
+        args.controlador.conectar()
+    
+    # Pool de conexões compartilhado, dimensionado pela concorrência dos downloads
+    # (conexões por arquivo no download direto, segmentos paralelos no HLS)
+    configurar_sessao(max_jobs * max(CONEXOES_POR_DOWNLOAD, SEGMENTOS_SIMULTANEOS))
+    if getattr(args, 'max_rate', None) is not None:
+        limitador_banda.ajustar(args.max_rate)
+    if getattr(args, 'qualidade', None) is not None:
+        definir_qualidade(args.qualidade)
     
     # Verificar autenticação antes de continuar
     print("🔑 Testando autenticação com a API do Panda Videos...")
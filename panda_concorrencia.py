@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Controle adaptativo (AIMD) do número de downloads simultâneos.
+
+O controlador mede a vazão agregada em janelas de alguns segundos. Enquanto
+ela continua subindo com todas as vagas ocupadas, o limite cresce uma vaga
+por janela (aumento aditivo). Respostas HTTP 429 ou 5xx, timeouts e quedas
+fortes na vazão por conexão reduzem o limite pela metade (redução
+multiplicativa), no máximo uma vez por janela.
+
+Os sinais chegam pelos observadores de `panda_http` (respostas e falhas de
+rede) e de `panda_transferencia` (bytes recebidos), registrados com
+`conectar()`. O limite atual fica disponível em `metricas()` e, se a variável
+PANDA_ARQUIVO_METRICAS estiver definida, é exportado nesse arquivo no
+formato texto do Prometheus.
+"""
+
+import os
+import time
+import threading
+from typing import Any, Dict, Optional
+
+import panda_http
+import panda_transferencia
+
+# Duração da janela de medição da vazão
+JANELA_MEDICAO = 5.0  # segundos
+# Aumento mínimo de vazão para abrir mais uma vaga
+TOLERANCIA_AUMENTO = 0.05
+# Fração da melhor vazão por conexão abaixo da qual o limite é reduzido
+QUEDA_POR_CONEXAO = 0.5
+# Fator aplicado ao limite em cada redução
+FATOR_REDUCAO = 0.5
+
+ARQUIVO_METRICAS = os.getenv('PANDA_ARQUIVO_METRICAS')
+
+
+class ControladorConcorrencia:
+    """Semáforo com capacidade ajustada por AIMD. Use `with controlador:` em cada download."""
+
+    def __init__(self, minimo: int = 1, maximo: int = 16, inicial: Optional[int] = None,
+                 janela: float = JANELA_MEDICAO):
+        self.minimo = max(1, minimo)
+        self.maximo = max(self.minimo, maximo)
+        self.limite = float(min(self.maximo, max(self.minimo, inicial or 2)))
+        self.janela = janela
+        self.ativos = 0
+        self.taxa = 0.0
+        self._cond = threading.Condition()
+        self._bytes_janela = 0
+        self._inicio_janela = time.monotonic()
+        self._taxa_anterior = 0.0
+        self._melhor_por_conexao = 0.0
+        self._ultima_reducao = 0.0
+
+    # --- vagas ---
+
+    def __enter__(self) -> 'ControladorConcorrencia':
+        self.adquirir()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.liberar()
+
+    def adquirir(self) -> None:
+        with self._cond:
+            while self.ativos >= int(self.limite):
+                self._cond.wait()
+            self.ativos += 1
+
+    def liberar(self) -> None:
+        with self._cond:
+            self.ativos -= 1
+            self._cond.notify_all()
+
+    # --- sinais ---
+
+    def registrar_bytes(self, n: int) -> None:
+        with self._cond:
+            self._bytes_janela += n
+            agora = time.monotonic()
+            if agora - self._inicio_janela >= self.janela:
+                self._avaliar(agora)
+
+    def registrar_resposta(self, response) -> None:
+        if response.status_code == 429 or response.status_code >= 500:
+            self.registrar_falha(f"HTTP {response.status_code}")
+
+    def registrar_falha(self, motivo: str) -> None:
+        with self._cond:
+            self._reduzir(motivo)
+
+    def conectar(self) -> None:
+        """Passa a receber os sinais de rede do processo."""
+        panda_http.observadores_resposta.append(self.registrar_resposta)
+        panda_http.observadores_falha.append(self.registrar_falha)
+        panda_transferencia.observadores_bytes.append(self.registrar_bytes)
+
+    def desconectar(self) -> None:
+        for lista, funcao in ((panda_http.observadores_resposta, self.registrar_resposta),
+                              (panda_http.observadores_falha, self.registrar_falha),
+                              (panda_transferencia.observadores_bytes, self.registrar_bytes)):
+            if funcao in lista:
+                lista.remove(funcao)
+
+    # --- ajuste ---
+
+    def _avaliar(self, agora: float) -> None:
+        self.taxa = self._bytes_janela / (agora - self._inicio_janela)
+        self._bytes_janela = 0
+        self._inicio_janela = agora
+        por_conexao = self.taxa / max(1, self.ativos)
+        # A referência decai aos poucos para acompanhar mudanças na rede
+        self._melhor_por_conexao = max(por_conexao, self._melhor_por_conexao * 0.9)
+
+        if self.taxa > self._taxa_anterior * (1 + TOLERANCIA_AUMENTO) and self.ativos >= int(self.limite):
+            self._ajustar(self.limite + 1, "vazão subindo")
+        elif por_conexao < self._melhor_por_conexao * QUEDA_POR_CONEXAO:
+            self._reduzir("vazão por conexão caindo")
+        self._taxa_anterior = self.taxa
+
+    def _reduzir(self, motivo: str) -> None:
+        agora = time.monotonic()
+        if agora - self._ultima_reducao < self.janela:
+            return
+        self._ultima_reducao = agora
+        self._ajustar(self.limite * FATOR_REDUCAO, motivo)
+
+    def _ajustar(self, novo: float, motivo: str) -> None:
+        novo = max(float(self.minimo), min(float(self.maximo), novo))
+        if int(novo) != int(self.limite):
+            simbolo = "📈" if novo > self.limite else "📉"
+            print(f"{simbolo} Downloads simultâneos: {int(self.limite)} → {int(novo)} ({motivo})")
+        self.limite = novo
+        self._cond.notify_all()
+        if ARQUIVO_METRICAS:
+            self.exportar_metricas(ARQUIVO_METRICAS)
+
+    # --- métricas ---
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            'limite': int(self.limite),
+            'ativos': self.ativos,
+            'vazao_bytes_por_segundo': self.taxa,
+        }
+
+    def exportar_metricas(self, caminho: str) -> None:
+        """Grava as métricas no formato texto do Prometheus (node_exporter textfile)."""
+        dados = self.metricas()
+        temporario = caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            f.write(f"panda_downloads_limite {dados['limite']}\n")
+            f.write(f"panda_downloads_ativos {dados['ativos']}\n")
+            f.write(f"panda_vazao_bytes_por_segundo {dados['vazao_bytes_por_segundo']:.0f}\n")
+        os.replace(temporario, caminho)
+
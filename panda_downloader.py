@@ -2,12 +2,37 @@ import os
 import requests
 import json
 import re
-import shutil
 import time
-import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from tqdm import tqdm
 from dotenv import load_dotenv
-from typing import Optional, List, Dict, Tuple, Any
+from typing import Optional, List, Dict, Tuple, Any, Iterator
+from urllib.parse import urlencode
+from panda_transferencia import obter_info_remota, baixar_arquivo
+from panda_http import obter_sessao
+from panda_concorrencia import ControladorConcorrencia
+from panda_estado import registrar_download, registrar_falha, obter_concluidos, obter_download
+from panda_cache import cache_listagens, cache_metadados
+from panda_catalogo import (
+    atualizar_catalogo,
+    catalogo_sincronizado,
+    listar_pastas_catalogo,
+    listar_videos_catalogo,
+)
+from panda_pastas import ArvorePastas
+from panda_hls import (
+    SEGMENTOS_SIMULTANEOS,
+    FalhaRemux,
+    JobEmAndamento,
+    analisar_playlist_mestre,
+    analisar_playlist_midia,
+    baixar_hls,
+    eh_playlist_mestre,
+    escolher_variante,
+)
+from panda_manifesto import calcular_checksum_arquivo, obter_checksum, registrar_no_manifesto, tamanho_confere
 
 # Carregar variáveis de ambiente do arquivo .env
 load_dotenv()
@@ -17,9 +42,14 @@ API_KEY: Optional[str] = os.getenv('PANDA_API_KEY')
 if API_KEY is None:
     raise ValueError("PANDA_API_KEY não está definida no ambiente.")
 
-# URLs base da API do Panda Videos
-BASE_URL = 'https://api-v2.pandavideo.com.br'
-DOWNLOAD_URL = 'https://download-us01.pandavideo.com:7443'
+# URLs base da API do Panda Videos (substituíveis, ex.: pelo servidor simulado do panda_benchmark)
+BASE_URL = os.getenv('PANDA_BASE_URL', 'https://api-v2.pandavideo.com.br')
+DOWNLOAD_URL = os.getenv('PANDA_DOWNLOAD_URL', 'https://download-us01.pandavideo.com:7443')
+# Vídeos por página nas listagens paginadas de GET /videos
+TAMANHO_PAGINA = int(os.getenv('PANDA_TAMANHO_PAGINA', '100'))
+
+# Índice da hierarquia de pastas, refeito só quando a listagem de pastas muda
+_arvore_pastas: Optional[ArvorePastas] = None
 
 # Headers para as requisições
 headers = {
@@ -35,27 +65,50 @@ def formatar_tamanho(tamanho_bytes):
         tamanho_bytes /= 1024.0
     return f"{tamanho_bytes:.2f} TB"
 
-def verificar_video_ja_baixado(titulo: str, pasta_destino: str) -> bool:
-    """Verifica se o vídeo já foi baixado anteriormente."""
+def verificar_video_ja_baixado(titulo: str, pasta_destino: str, video_id: Optional[str] = None) -> bool:
+    """
+    Verifica se o vídeo já foi baixado anteriormente, pelo nome do arquivo.
+    
+    Se `video_id` for informado e o arquivo existir, o vídeo é registrado no banco
+    de estado, para que as próximas execuções o encontrem sem acessar o disco.
+    Arquivos cujo tamanho não confere com o manifesto da pasta são baixados de novo.
+    """
     nome_arquivo = f"{titulo.replace(' ', '_')}.mp4"
     caminho_completo = os.path.join(pasta_destino, nome_arquivo)
     
     if os.path.exists(caminho_completo):
         tamanho = os.path.getsize(caminho_completo)
+        if not tamanho_confere(caminho_completo):
+            print(f"⚠️ Vídeo '{titulo}' existe mas não confere com o manifesto. Baixando novamente...")
+            return False
         print(f"⚠️ Vídeo '{titulo}' já existe ({formatar_tamanho(tamanho)})")
+        if video_id is not None:
+            registrar_download(video_id, pasta_destino, caminho_completo, tamanho, 'existente', titulo,
+                               obter_checksum(caminho_completo))
         return True
     return False
 
+def _registrar_resultado(video_id: str, pasta_destino: str, titulo: str, caminho: str,
+                         metodo: str, sucesso: bool) -> bool:
+    """Registra no banco de estado um download concluído e devolve `sucesso`."""
+    if sucesso and os.path.exists(caminho):
+        registrar_download(video_id, pasta_destino, caminho, os.path.getsize(caminho), metodo, titulo,
+                           obter_checksum(caminho))
+    return sucesso
+
 def download_with_progress(download_url: str, output_path: str, description: str) -> bool:
-    """Faz download de um arquivo com barra de progresso."""
+    """
+    Faz download de um arquivo com barra de progresso, em conexões paralelas quando possível.
+    
+    O arquivo é gravado em `output_path + '.part'` e só recebe o nome final quando
+    completo; uma execução interrompida é retomada de onde parou.
+    """
     try:
-        head_response = requests.head(download_url, timeout=10)
-        total_size = int(head_response.headers.get('content-length', 0))
+        download_url, total_size, aceita_ranges, etag = obter_info_remota(download_url)
         print(f"Tamanho total do arquivo: {formatar_tamanho(total_size)}")
         start_time = time.time()
         
-        response = requests.get(download_url, stream=True, timeout=60)
-        with open(output_path, 'wb') as f, tqdm(
+        with tqdm(
             desc=description,
             total=total_size,
             unit='B',
@@ -63,10 +116,7 @@ def download_with_progress(download_url: str, output_path: str, description: str
             unit_divisor=1024,
             bar_format='{desc}: {percentage:3.1f}%|{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]'
         ) as bar:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    bytes_written = f.write(chunk)
-                    bar.update(bytes_written)
+            baixar_arquivo(download_url, output_path, total_size, aceita_ranges, etag, progresso=bar.update)
         elapsed = time.time() - start_time
         print(f"\n✅ Download concluído em {elapsed:.2f} segundos")
         if total_size > 0:
@@ -78,10 +128,11 @@ def download_with_progress(download_url: str, output_path: str, description: str
 
 def verificar_autenticacao() -> bool:
     """Verifica se a autenticação com a API está funcionando corretamente."""
-    endpoint = f'{BASE_URL}/videos'
+    # Uma página de um único vídeo basta para validar a chave
+    endpoint = f'{BASE_URL}/videos?limit=1'
     print(f"Testando autenticação com a chave API: {API_KEY[:10]}...")
     try:
-        response = requests.get(endpoint, headers=headers)
+        response = obter_sessao().get(endpoint, headers=headers)
         print(f"Status code: {response.status_code}")
         if response.status_code == 200:
             print("Autenticação bem-sucedida!")
@@ -93,14 +144,40 @@ def verificar_autenticacao() -> bool:
         print(f"Erro: {e}")
         return False
 
-def listar_pastas(exibir: bool = True) -> List[Dict[str, Any]]:
-    """Lista todas as pastas disponíveis na conta."""
+def _avisar_catalogo(sincronizado_em: float) -> None:
+    idade = (time.time() - sincronizado_em) / 3600
+    print(f"📚 Usando o catálogo local (sincronizado há {idade:.1f} h; atualize com 'panda_cli.py sync-catalog')")
+
+def sincronizar_catalogo() -> Dict[str, Dict[str, int]]:
+    """
+    Atualiza o catálogo local com as pastas e os vídeos da conta.
+
+    As listagens são revalidadas na API (304 quando nada mudou) e só os
+    registros alterados são gravados.
+
+    Raises:
+        requests.exceptions.RequestException: Falha ao obter alguma listagem
+    """
+    pastas = cache_listagens.obter_json(f'{BASE_URL}/folders', headers, revalidar=True).get('folders', [])
+    informado: Dict[str, Any] = {}
+    paginas = list(iterar_videos(revalidar=True, informado=informado))
+    return atualizar_catalogo(pastas, paginas, informado.get('total'))
+
+def listar_pastas(exibir: bool = True, usar_catalogo: bool = True) -> List[Dict[str, Any]]:
+    """
+    Lista todas as pastas disponíveis na conta (do catálogo local, se sincronizado).
+
+    Com `usar_catalogo=False` a listagem vem sempre da API (ou do cache HTTP).
+    """
     endpoint = f'{BASE_URL}/folders'
     try:
-        response = requests.get(endpoint, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        folders = data.get('folders', [])
+        sincronizado_em = catalogo_sincronizado() if usar_catalogo else None
+        if sincronizado_em:
+            if exibir:
+                _avisar_catalogo(sincronizado_em)
+            folders = listar_pastas_catalogo()
+        else:
+            folders = cache_listagens.obter_json(endpoint, headers).get('folders', [])
         
         if folders and exibir:
             print("\n=== Pastas Disponíveis ===")
@@ -116,6 +193,35 @@ def listar_pastas(exibir: bool = True) -> List[Dict[str, Any]]:
         print(f"Erro ao listar pastas: {e}")
         return []
 
+def buscar_pasta_por_nome(nome: str, pastas: Optional[List[Dict[str, Any]]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Pasta chamada `nome` (sem diferenciar maiúsculas), em `pastas` ou em `listar_pastas`.
+
+    Se o catálogo local estiver em uso e não tiver a pasta (criada depois da
+    sincronização), a busca é repetida na listagem da API.
+    """
+    def buscar(lista: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        return next((pasta for pasta in lista if pasta.get('name', '').lower() == nome.lower()), None)
+
+    pasta = buscar(pastas if pastas is not None else listar_pastas(exibir=False))
+    if pasta is None and catalogo_sincronizado():
+        print(f"📚 Pasta '{nome}' não está no catálogo local; consultando a API...")
+        pasta = buscar(listar_pastas(exibir=False, usar_catalogo=False))
+    return pasta
+
+def obter_arvore_pastas(usar_catalogo: bool = True) -> ArvorePastas:
+    """
+    Hierarquia de pastas da conta, montada a partir de `listar_pastas`.
+
+    Enquanto a listagem vier do cache (ou do catálogo) sem mudanças, o mesmo
+    índice é reaproveitado.
+    """
+    global _arvore_pastas
+    pastas = listar_pastas(exibir=False, usar_catalogo=usar_catalogo)
+    if _arvore_pastas is None or _arvore_pastas.origem is not pastas:
+        _arvore_pastas = ArvorePastas(pastas)
+    return _arvore_pastas
+
 def selecionar_pasta(pastas: List[Dict[str, Any]]) -> Tuple[Optional[str], Optional[str]]:
     """Permite ao usuário selecionar uma pasta da lista."""
     if not pastas:
@@ -138,77 +244,162 @@ def selecionar_pasta(pastas: List[Dict[str, Any]]) -> Tuple[Optional[str], Optio
             print("Entrada inválida. Digite um número ou 'q' para sair.")
 
 def listar_videos_pasta(pasta_id: str, pasta_nome: str) -> List[Dict[str, Any]]:
-    """Lista vídeos de uma pasta específica."""
+    """Lista vídeos de uma pasta específica (do catálogo local, se sincronizado)."""
     endpoint = f'{BASE_URL}/folders/{pasta_id}'
     try:
         print(f"\nListando vídeos da pasta: {pasta_nome} (ID: {pasta_id})")
-        response = requests.get(endpoint, headers=headers)
-        if response.status_code == 200:
-            data = response.json()
-            videos = data.get('videos', [])
-            if videos:
-                print(f"\n=== Vídeos na Pasta {pasta_nome} ===")
-                for i, video in enumerate(videos, 1):
-                    duracao = video.get('duration', 'N/A')
-                    titulo = video.get('title', 'Sem título')
-                    print(f"{i}. ID: {video.get('id')} - Título: {titulo} - Duração: {duracao}")
-                return videos
-            else:
-                print(f"Nenhum vídeo encontrado na pasta {pasta_nome}.")
-                return obter_videos_da_pasta_alternativo(pasta_id, pasta_nome)
+        sincronizado_em = catalogo_sincronizado()
+        videos = []
+        if sincronizado_em:
+            _avisar_catalogo(sincronizado_em)
+            videos = listar_videos_catalogo(pasta_id)
+            if not videos:
+                # Pasta nova (ou esvaziada) desde a sincronização: a API decide
+                print("📚 Nenhum vídeo da pasta no catálogo local; consultando a API...")
+        if not videos:
+            videos = cache_listagens.obter_json(endpoint, headers).get('videos', [])
+        if videos:
+            cache_metadados.semear(videos)
+            print(f"\n=== Vídeos na Pasta {pasta_nome} ===")
+            for i, video in enumerate(videos, 1):
+                duracao = video.get('duration', 'N/A')
+                titulo = video.get('title', 'Sem título')
+                print(f"{i}. ID: {video.get('id')} - Título: {titulo} - Duração: {duracao}")
+            return videos
         else:
-            print(f"Erro ao acessar a pasta: {response.status_code}")
-            print(f"Resposta: {response.text}")
-            print("Tentando método alternativo para listar vídeos...")
+            print(f"Nenhum vídeo encontrado na pasta {pasta_nome}.")
             return obter_videos_da_pasta_alternativo(pasta_id, pasta_nome)
+    except requests.exceptions.HTTPError as e:
+        print(f"Erro ao acessar a pasta: {e.response.status_code}")
+        print(f"Resposta: {e.response.text}")
+        print("Tentando método alternativo para listar vídeos...")
+        return obter_videos_da_pasta_alternativo(pasta_id, pasta_nome)
     except requests.exceptions.RequestException as e:
         print(f"Erro ao listar vídeos da pasta: {e}")
         return obter_videos_da_pasta_alternativo(pasta_id, pasta_nome)
 
+def iterar_videos(filtros: Optional[Dict[str, str]] = None, tamanho_pagina: int = TAMANHO_PAGINA,
+                  revalidar: bool = False, informado: Optional[Dict[str, Any]] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Percorre GET /videos paginado (`page`/`limit`), uma página por vez.
+
+    A iteração termina na última página informada em `pages` ou, se a API não
+    informar, numa página vazia ou repetida (API que não pagina). Uma página
+    menor que `tamanho_pagina` não encerra a iteração: a API pode limitar o
+    `limit` pedido. Cada página semeia o cache de metadados e pode ser usada
+    antes de a próxima ser pedida.
+
+    Args:
+        filtros: Parâmetros de filtro da API, ex.: {'folder_id': ...}
+        tamanho_pagina: Vídeos por página
+        revalidar: Revalida cada página na API mesmo dentro do prazo do cache
+        informado: Recebe `total` e `pages` da última resposta, quando a API os informa
+
+    Raises:
+        requests.exceptions.RequestException: Falha ao obter uma página
+    """
+    pagina = 1
+    primeiro_anterior = None
+    while True:
+        parametros = urlencode({**(filtros or {}), 'page': pagina, 'limit': tamanho_pagina})
+        data = cache_listagens.obter_json(f'{BASE_URL}/videos?{parametros}', headers, revalidar)
+        videos = data.get('videos', [])
+        if not videos or videos[0].get('id') == primeiro_anterior:
+            return
+        primeiro_anterior = videos[0].get('id')
+        if informado is not None:
+            informado.update({chave: data[chave] for chave in ('total', 'pages') if data.get(chave) is not None})
+        cache_metadados.semear(videos)
+        yield videos
+        paginas = data.get('pages')
+        if paginas and pagina >= int(paginas):
+            return
+        pagina += 1
+
+def iterar_videos_pasta(pasta_id: str, tamanho_pagina: int = TAMANHO_PAGINA) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Percorre GET /videos filtrado pela pasta, uma página por vez.
+
+    O filtro (`folder_id`) fica a cargo da API e é repetido aqui caso ela
+    ignore o parâmetro.
+
+    Raises:
+        requests.exceptions.RequestException: Falha ao obter uma página
+    """
+    for videos in iterar_videos({'folder_id': pasta_id}, tamanho_pagina):
+        yield [video for video in videos if video.get('folder_id') == pasta_id]
+
 def obter_videos_da_pasta_alternativo(pasta_id: str, pasta_nome: str) -> List[Dict[str, Any]]:
-    """Obtém vídeos da pasta específica por método alternativo."""
+    """
+    Obtém vídeos da pasta específica por método alternativo (GET /videos paginado e filtrado).
+
+    Se alguma página falhar, a listagem é descartada e a função retorna lista
+    vazia, como em qualquer erro: uma lista parcial faria a pasta parecer
+    completa para quem a baixa.
+    """
     print(f"\nMétodo alternativo: obtendo vídeos da pasta {pasta_nome}")
+    videos_na_pasta: List[Dict[str, Any]] = []
     try:
-        all_videos_endpoint = f'{BASE_URL}/videos'
-        response = requests.get(all_videos_endpoint, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        all_videos = data.get('videos', [])
-        videos_na_pasta = [video for video in all_videos if video.get('folder_id') == pasta_id]
-        if videos_na_pasta:
-            print(f"\n=== Vídeos na Pasta {pasta_nome} ===")
-            for i, video in enumerate(videos_na_pasta, 1):
-                duracao = video.get('duration', 'N/A')
-                titulo = video.get('title', 'Sem título')
-                print(f"{i}. ID: {video.get('id')} - Título: {titulo} - Duração: {duracao}")
-        else:
-            print(f"Nenhum vídeo encontrado na pasta {pasta_nome}.")
-        return videos_na_pasta
+        for pagina in iterar_videos_pasta(pasta_id):
+            videos_na_pasta.extend(pagina)
     except requests.exceptions.RequestException as e:
         print(f"Erro ao obter vídeos: {e}")
+        if videos_na_pasta:
+            print(f"⚠️ Listagem da pasta {pasta_nome} incompleta ({len(videos_na_pasta)} vídeos recebidos "
+                  f"antes da falha); nenhum vídeo será considerado")
         return []
+    if videos_na_pasta:
+        print(f"\n=== Vídeos na Pasta {pasta_nome} ===")
+        for i, video in enumerate(videos_na_pasta, 1):
+            duracao = video.get('duration', 'N/A')
+            titulo = video.get('title', 'Sem título')
+            print(f"{i}. ID: {video.get('id')} - Título: {titulo} - Duração: {duracao}")
+    else:
+        print(f"Nenhum vídeo encontrado na pasta {pasta_nome}.")
+    return videos_na_pasta
+
+def obter_info_video(video_id: str, completo: bool = False) -> Dict[str, Any]:
+    """
+    Retorna os metadados de um vídeo, consultando a API só se não estiverem em cache.
+
+    Args:
+        video_id: ID do vídeo
+        completo: Exige o registro completo (fontes, delivery_url), e não apenas o
+            resumo obtido na listagem da pasta
+    """
+    video_info = cache_metadados.obter(video_id, completo)
+    if video_info is None:
+        response = obter_sessao().get(f'{BASE_URL}/videos/{video_id}', headers=headers)
+        response.raise_for_status()
+        video_info = response.json()
+        cache_metadados.guardar(video_id, video_info)
+    return video_info
 
 def baixar_video_oficial(video_id: str, pasta_destino: str = 'downloads') -> bool:
     """Baixa um vídeo usando o endpoint oficial de download do Panda Videos."""
     if not os.path.exists(pasta_destino):
         os.makedirs(pasta_destino)
-    info_endpoint = f'{BASE_URL}/videos/{video_id}'
+    
+    # Consulta o banco de estado antes de qualquer requisição
+    registro = obter_download(video_id, pasta_destino)
+    if registro:
+        print(f"⚠️ Vídeo '{registro['titulo']}' já baixado em {registro['caminho']}")
+        return True
+    
     try:
-        info_response = requests.get(info_endpoint, headers=headers)
-        info_response.raise_for_status()
-        video_info = info_response.json()
+        video_info = obter_info_video(video_id)
         titulo = video_info.get('title', f'video_{video_id}')
         nome_arquivo = f"{titulo.replace(' ', '_')}.mp4"
         caminho_completo = os.path.join(pasta_destino, nome_arquivo)
         
         # Verifica se o vídeo já foi baixado
-        if verificar_video_ja_baixado(titulo, pasta_destino):
+        if verificar_video_ja_baixado(titulo, pasta_destino, video_id):
             return True
         
         download_endpoint = f'{DOWNLOAD_URL}/videos/{video_id}/download'
         print(f"\nIniciando download oficial do vídeo: {titulo}")
         print(f"Fazendo requisição para: {download_endpoint}")
-        download_response = requests.post(download_endpoint, headers=headers, timeout=30, allow_redirects=False)
+        download_response = obter_sessao().post(download_endpoint, headers=headers, timeout=30, allow_redirects=False)
         print(f"Status da resposta: {download_response.status_code}")
         
         # Caso haja redirecionamento
@@ -216,7 +407,8 @@ def baixar_video_oficial(video_id: str, pasta_destino: str = 'downloads') -> boo
             download_url = download_response.headers.get('Location')
             print(f"Redirecionamento detectado para: {download_url}")
             if download_url:
-                return download_with_progress(download_url, caminho_completo, nome_arquivo)
+                return _registrar_resultado(video_id, pasta_destino, titulo, caminho_completo, 'oficial',
+                                            download_with_progress(download_url, caminho_completo, nome_arquivo))
             else:
                 print("❌ URL de redirecionamento não encontrada nos cabeçalhos.")
                 return baixar_video_alternativo(video_id, pasta_destino)
@@ -232,7 +424,8 @@ def baixar_video_oficial(video_id: str, pasta_destino: str = 'downloads') -> boo
                     download_url = download_data.get('url')
                     if download_url:
                         print("URL de download obtida, baixando o vídeo...")
-                        return download_with_progress(download_url, caminho_completo, nome_arquivo)
+                        return _registrar_resultado(video_id, pasta_destino, titulo, caminho_completo, 'oficial',
+                                                    download_with_progress(download_url, caminho_completo, nome_arquivo))
                     else:
                         print("URL de download não encontrada na resposta.")
                         print(f"Resposta: {download_data}")
@@ -243,7 +436,8 @@ def baixar_video_oficial(video_id: str, pasta_destino: str = 'downloads') -> boo
             else:
                 # Se a resposta já contém o arquivo, salvar diretamente
                 print("🔄 A resposta contém os dados do arquivo. Salvando diretamente...")
-                return download_with_progress(download_response.url, caminho_completo, nome_arquivo)
+                return _registrar_resultado(video_id, pasta_destino, titulo, caminho_completo, 'oficial',
+                                            download_with_progress(download_response.url, caminho_completo, nome_arquivo))
         else:
             print(f"Erro ao iniciar o download oficial: {download_response.status_code}")
             print(f"Resposta: {download_response.text}")
@@ -258,36 +452,36 @@ def baixar_video_alternativo(video_id: str, pasta_destino: str = 'downloads') ->
     """Tenta baixar um vídeo usando métodos alternativos quando o oficial falha."""
     if not os.path.exists(pasta_destino):
         os.makedirs(pasta_destino)
-    endpoint = f'{BASE_URL}/videos/{video_id}'
     try:
-        response = requests.get(endpoint, headers=headers)
-        response.raise_for_status()
-        video_info = response.json()
+        video_info = obter_info_video(video_id, completo=True)
         titulo = video_info.get('title', f'video_{video_id}')
         nome_arquivo = f"{titulo.replace(' ', '_')}.mp4"
         caminho_completo = os.path.join(pasta_destino, nome_arquivo)
         
         # Verifica se o vídeo já foi baixado
-        if verificar_video_ja_baixado(titulo, pasta_destino):
+        if verificar_video_ja_baixado(titulo, pasta_destino, video_id):
             return True
         
         if 'sources' in video_info and video_info['sources']:
             download_url = video_info['sources'][0].get('url')
             if download_url:
                 print(f"\nBaixando via fontes diretas: {titulo}")
-                return download_with_progress(download_url, caminho_completo, nome_arquivo)
+                return _registrar_resultado(video_id, pasta_destino, titulo, caminho_completo, 'fontes',
+                                            download_with_progress(download_url, caminho_completo, nome_arquivo))
             else:
                 print("Link direto não disponível em 'sources'.")
         print("Tentando método m3u8...")
         if 'delivery_url' in video_info:
-            return baixar_video_m3u8(video_info['delivery_url'], titulo, pasta_destino)
+            return _registrar_resultado(video_id, pasta_destino, titulo, caminho_completo, 'm3u8',
+                                        baixar_video_m3u8(video_info['delivery_url'], titulo, pasta_destino))
         else:
             try:
-                player_response = requests.get(f"{BASE_URL}/videos/{video_id}/player", headers=headers)
+                player_response = obter_sessao().get(f"{BASE_URL}/videos/{video_id}/player", headers=headers)
                 if player_response.status_code == 200:
                     player_info = player_response.json()
                     if 'playerUrl' in player_info:
-                        return baixar_video_m3u8(player_info['playerUrl'], titulo, pasta_destino)
+                        return _registrar_resultado(video_id, pasta_destino, titulo, caminho_completo, 'm3u8',
+                                                    baixar_video_m3u8(player_info['playerUrl'], titulo, pasta_destino))
                 print(f"Não foi possível encontrar um link de playback para o vídeo: {video_id}")
                 return False
             except Exception as e:
@@ -307,7 +501,7 @@ def baixar_video_m3u8(url: str, titulo: str, pasta_destino: str = 'downloads') -
         'Referer': 'https://dashboard.pandavideo.com.br/',
     }
     try:
-        response = requests.get(url, headers=headers_web)
+        response = obter_sessao().get(url, headers=headers_web)
         content = response.text
         if '<html' in content.lower():
             m3u8_urls = re.findall(r'https://[^"\']+\.m3u8', content)
@@ -318,71 +512,44 @@ def baixar_video_m3u8(url: str, titulo: str, pasta_destino: str = 'downloads') -
         else:
             m3u8_url = url
         
-        response = requests.get(m3u8_url, headers=headers_web)
-        m3u8_content = response.text
+        response = obter_sessao().get(m3u8_url, headers=headers_web)
+        playlist_url, playlist = m3u8_url, response.text
         
-        resolucoes = re.findall(r'RESOLUTION=(\d+x\d+)', m3u8_content)
-        if resolucoes:
-            print("\nResoluções disponíveis:")
-            for i, res in enumerate(resolucoes, 1):
-                print(f"{i}. {res}")
-            escolha = input("\nEscolha o número da resolução desejada (ou ENTER para a melhor qualidade): ")
-            resolucao_idx = int(escolha) - 1 if escolha.strip().isdigit() and 1 <= int(escolha) <= len(resolucoes) else 0
-            playlist_urls = re.findall(r'^[^#].+\.m3u8', m3u8_content, re.MULTILINE)
-            if not playlist_urls:
-                print("Não foi possível encontrar playlists específicas de resolução.")
-                return False
-            resolucao_url = playlist_urls[resolucao_idx]
-            if not resolucao_url.startswith('http'):
-                base_url = m3u8_url.rsplit('/', 1)[0]
-                resolucao_url = f"{base_url}/{resolucao_url}"
-            
-            response = requests.get(resolucao_url, headers=headers_web)
-            segmentos_content = response.text
-            segmentos = re.findall(r'^[^#].+\.ts', segmentos_content, re.MULTILINE)
-            if not segmentos:
-                print("Não foi possível encontrar segmentos de vídeo.")
-                return False
-            
-            temp_dir = os.path.join(os.getcwd(), "temp")
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-            os.makedirs(temp_dir)
-            base_segment_url = resolucao_url.rsplit('/', 1)[0]
-            lista_segmentos_path = os.path.join(temp_dir, 'lista.txt')
-            print(f"\nBaixando {len(segmentos)} segmentos...")
-            with open(lista_segmentos_path, 'w') as lista_file:
-                for i, segmento in enumerate(tqdm(segmentos, desc="Segmentos")):
-                    segmento_url = segmento if segmento.startswith('http') else f"{base_segment_url}/{segmento}"
-                    segmento_path = os.path.join(temp_dir, f"segmento_{i:04d}.ts")
-                    seg_response = requests.get(segmento_url, headers=headers_web)
-                    with open(segmento_path, 'wb') as seg_file:
-                        seg_file.write(seg_response.content)
-                    lista_file.write(f"file '{segmento_path}'\n")
-            
-            if not os.path.exists(pasta_destino):
-                os.makedirs(pasta_destino)
-            nome_arquivo = f"{titulo.replace(' ', '_')}.mp4"
-            caminho_completo = os.path.join(pasta_destino, nome_arquivo)
-            
-            print("\nUnindo segmentos com ffmpeg...")
-            ffmpeg_cmd = [
-                'ffmpeg', '-f', 'concat', '-safe', '0',
-                '-i', lista_segmentos_path,
-                '-c', 'copy', caminho_completo
-            ]
-            result = subprocess.run(ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            if result.returncode == 0:
-                print(f"Download concluído: {caminho_completo}")
-                shutil.rmtree(temp_dir)
-                return True
-            else:
-                print("Erro ao unir os segmentos com ffmpeg.")
-                print(f"Erro: {result.stderr.decode()}")
+        if eh_playlist_mestre(playlist):
+            variantes = analisar_playlist_mestre(playlist, m3u8_url)
+            if not variantes:
+                print("Não foi possível identificar as resoluções disponíveis.")
                 return False
-        else:
-            print("Não foi possível identificar as resoluções disponíveis.")
+            variante = escolher_variante(variantes)
+            print(f"\nResolução escolhida entre {len(variantes)} disponíveis: {variante.descricao()}")
+            playlist_url = variante.url
+            playlist = obter_sessao().get(playlist_url, headers=headers_web).text
+        
+        segmentos = analisar_playlist_midia(playlist, playlist_url)
+        if not segmentos:
+            print("Não foi possível encontrar segmentos de vídeo.")
+            return False
+        
+        if not os.path.exists(pasta_destino):
+            os.makedirs(pasta_destino)
+        nome_arquivo = f"{titulo.replace(' ', '_')}.mp4"
+        caminho_completo = os.path.join(pasta_destino, nome_arquivo)
+        
+        print(f"\nBaixando {len(segmentos)} segmentos ({SEGMENTOS_SIMULTANEOS} em paralelo)...")
+        try:
+            baixar_hls(segmentos, caminho_completo, headers_web)
+        except JobEmAndamento as e:
+            print(f"Vídeo já está sendo baixado por outro processo: {e}")
             return False
+        except FalhaRemux as e:
+            print("Erro ao unir os segmentos com ffmpeg.")
+            print(f"Erro: {e}")
+            return False
+        print(f"Download concluído: {caminho_completo}")
+        # O arquivo é gerado pelo ffmpeg: o checksum é calculado sobre a saída final
+        registrar_no_manifesto(caminho_completo, os.path.getsize(caminho_completo),
+                               calcular_checksum_arquivo(caminho_completo))
+        return True
     except Exception as e:
         print(f"Erro no processo de download via m3u8: {e}")
         return False
@@ -391,8 +558,51 @@ def baixar_video(video_id: str, pasta_destino: str = 'downloads') -> bool:
     """Função principal para baixar vídeo - tenta o método oficial primeiro."""
     return baixar_video_oficial(video_id, pasta_destino)
 
-def baixar_todos_videos(videos: List[Dict[str, Any]], pasta_destino: str = 'downloads') -> None:
-    """Baixa todos os vídeos da lista fornecida, verificando quais já foram baixados."""
+def _baixar_lote(videos: List[Dict[str, Any]], pasta_destino: str, jobs: int, prefixo: str = '',
+                 controlador: Optional[ControladorConcorrencia] = None) -> List[Dict[str, Any]]:
+    """
+    Baixa os vídeos com até `jobs` downloads simultâneos.
+    
+    Com um `controlador`, o número de downloads ativos segue o limite adaptativo
+    dele (até `controlador.maximo`) em vez de `jobs`.
+    
+    Returns:
+        Lista dos vídeos que falharam, na ordem original
+    """
+    falhas: List[Tuple[int, Dict[str, Any]]] = []
+    trava_falhas = threading.Lock()
+    
+    def tarefa(i: int, video: Dict[str, Any]) -> None:
+        titulo = video.get('title', 'Sem título')
+        print(f"\n🔄 {prefixo}Baixando vídeo {i} de {len(videos)}: {titulo}")
+        try:
+            with controlador or nullcontext():
+                sucesso = baixar_video(video['id'], pasta_destino)
+        except Exception as e:
+            print(f"❌ Erro inesperado ao baixar {titulo}: {e}")
+            sucesso = False
+        if not sucesso:
+            with trava_falhas:
+                falhas.append((i, video))
+    
+    workers = controlador.maximo if controlador else jobs
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for futuro in [executor.submit(tarefa, i, video) for i, video in enumerate(videos, 1)]:
+            futuro.result()
+    
+    return [video for _, video in sorted(falhas, key=lambda item: item[0])]
+
+def baixar_todos_videos(videos: List[Dict[str, Any]], pasta_destino: str = 'downloads', jobs: int = 1,
+                        controlador: Optional[ControladorConcorrencia] = None) -> None:
+    """
+    Baixa todos os vídeos da lista fornecida, verificando quais já foram baixados.
+    
+    Args:
+        videos: Lista de vídeos (como retornada por `listar_videos_pasta`)
+        pasta_destino: Pasta onde os vídeos serão salvos
+        jobs: Número de vídeos baixados simultaneamente
+        controlador: Controlador adaptativo que substitui o número fixo `jobs` (opcional)
+    """
     if not videos:
         print("⚠️ Nenhum vídeo disponível para download.")
         return
@@ -402,29 +612,25 @@ def baixar_todos_videos(videos: List[Dict[str, Any]], pasta_destino: str = 'down
         print(f"📁 Pasta criada: {pasta_destino}")
     
     print(f"\n🔄 Iniciando verificação de {len(videos)} vídeos...")
+    # Uma consulta ao banco de estado para o lote inteiro
+    concluidos = obter_concluidos([video['id'] for video in videos], pasta_destino)
+    if concluidos:
+        print(f"✅ {len(concluidos)} vídeos já registrados como baixados")
     videos_para_baixar = []
     for video in videos:
+        if str(video['id']) in concluidos:
+            continue
         titulo = video.get('title', f"video_{video['id']}")
-        if not verificar_video_ja_baixado(titulo, pasta_destino):
+        if not verificar_video_ja_baixado(titulo, pasta_destino, video['id']):
             videos_para_baixar.append(video)
     
     if not videos_para_baixar:
         print("✅ Todos os vídeos já foram baixados anteriormente!")
         return
     
-    print(f"\n🔄 Iniciando download de {len(videos_para_baixar)} vídeos pendentes...")
-    sucessos = 0
-    falhas = 0
-    videos_com_falha = []
-    
-    for i, video in enumerate(videos_para_baixar, 1):
-        titulo = video.get('title', 'Sem título')
-        print(f"\n🔄 Baixando vídeo {i} de {len(videos_para_baixar)}: {titulo}")
-        if baixar_video(video['id'], pasta_destino):
-            sucessos += 1
-        else:
-            falhas += 1
-            videos_com_falha.append(video)
+    simultaneos = f"até {controlador.maximo}, adaptativo" if controlador else jobs
+    print(f"\n🔄 Iniciando download de {len(videos_para_baixar)} vídeos pendentes ({simultaneos} simultâneos)...")
+    videos_com_falha = _baixar_lote(videos_para_baixar, pasta_destino, jobs, controlador=controlador)
     
     # Tentar novamente os vídeos que falharam (até 3 tentativas)
     if videos_com_falha:
@@ -434,23 +640,15 @@ def baixar_todos_videos(videos: List[Dict[str, Any]], pasta_destino: str = 'down
             if not videos_com_falha:
                 break
                 
+            # Sem pausa fixa: limites da API são respeitados pelo agendador da sessão
             print(f"\n🔄 Tentativa {tentativa + 2} para {len(videos_com_falha)} vídeos...")
-            videos_ainda_com_falha = []
-            
-            for i, video in enumerate(videos_com_falha, 1):
-                titulo = video.get('title', 'Sem título')
-                print(f"\n🔄 Tentativa {tentativa + 2} - Baixando vídeo {i} de {len(videos_com_falha)}: {titulo}")
-                
-                # Esperar um pouco antes de tentar novamente
-                time.sleep(3)
-                
-                if baixar_video(video['id'], pasta_destino):
-                    sucessos += 1
-                    falhas -= 1
-                else:
-                    videos_ainda_com_falha.append(video)
-            
-            videos_com_falha = videos_ainda_com_falha
+            videos_com_falha = _baixar_lote(videos_com_falha, pasta_destino, jobs,
+                                            f"Tentativa {tentativa + 2} - ", controlador)
+    
+    sucessos = len(videos_para_baixar) - len(videos_com_falha)
+    falhas = len(videos_com_falha)
+    for video in videos_com_falha:
+        registrar_falha(video['id'], pasta_destino, video.get('title'))
     
     print("\n=== RESULTADO FINAL ===")
     print(f"✅ Downloads concluídos: {sucessos}")
@@ -516,19 +714,24 @@ def main() -> None:
 
 def identificar_subpastas(pasta_principal_id: str, padrao_nome: str = None) -> List[Dict[str, Any]]:
     """
-    Identifica subpastas de uma pasta principal com base em padrões de nomenclatura.
+    Identifica as subpastas diretas de uma pasta principal pela hierarquia da conta.
     
     Args:
         pasta_principal_id: ID da pasta principal
         padrao_nome: Padrão regex para filtrar nomes de subpastas (opcional)
         
     Returns:
-        Lista de dicionários com informações das subpastas identificadas
+        Lista de dicionários com id, nome, número, caminho e profundidade das subpastas,
+        ordenada pelo número no nome (as sem número ficam no fim, na ordem da API)
     """
     print(f"🔍 Buscando subpastas para a pasta ID: {pasta_principal_id}")
     
-    # Obter informações da pasta principal para referência
-    pasta_principal_info = obter_info_pasta(pasta_principal_id)
+    arvore = obter_arvore_pastas()
+    if catalogo_sincronizado() and (arvore.obter(pasta_principal_id) is None
+                                    or (arvore.hierarquica and not arvore.subpastas(pasta_principal_id))):
+        # Pasta (ou subpastas) criada depois da sincronização do catálogo
+        arvore = obter_arvore_pastas(usar_catalogo=False)
+    pasta_principal_info = arvore.obter(pasta_principal_id) or obter_info_pasta(pasta_principal_id)
     if not pasta_principal_info:
         print("❌ Não foi possível obter informações da pasta principal")
         return []
@@ -536,36 +739,33 @@ def identificar_subpastas(pasta_principal_id: str, padrao_nome: str = None) -> L
     nome_pasta_principal = pasta_principal_info.get('name', '')
     print(f"📁 Pasta principal: {nome_pasta_principal}")
     
-    # Buscar todas as pastas disponíveis
-    todas_pastas = listar_pastas(exibir=False)
-    
-    # Identificar potenciais subpastas com base nos padrões comuns
-    subpastas = []
-    
-    # Verificar se existe um padrão específico (ex: "Módulo X")
-    if padrao_nome:
-        padrao = re.compile(padrao_nome, re.IGNORECASE)
+    if arvore.hierarquica:
+        candidatas = arvore.subpastas(pasta_principal_id)
     else:
-        # Padrão default para módulos numerados
-        padrao = re.compile(r'módulo\s+\d+', re.IGNORECASE)
+        # Listagem sem pasta pai: recorre aos nomes dos módulos numerados
+        print("⚠️ A listagem de pastas não informa a pasta pai; identificando subpastas pelo nome")
+        candidatas = list(arvore.pastas.values())
+        padrao_nome = padrao_nome or r'módulo\s+\d+'
+    padrao = re.compile(padrao_nome, re.IGNORECASE) if padrao_nome else None
     
-    for pasta in todas_pastas:
+    subpastas = []
+    for pasta in candidatas:
         nome_pasta = pasta.get('name', '')
+        if padrao and not padrao.search(nome_pasta):
+            continue
         
-        # Se o nome da pasta contém o padrão, considere como possível subpasta
-        if padrao.search(nome_pasta):
-            # Extrair número do módulo para ordenação
-            match = re.search(r'(\d+)', nome_pasta)
-            numero_modulo = int(match.group(1)) if match else 0
-            
-            subpastas.append({
-                'id': pasta.get('id'),
-                'name': nome_pasta,
-                'numero': numero_modulo
-            })
+        # Extrair número do módulo para ordenação
+        match = re.search(r'(\d+)', nome_pasta)
+        numero_modulo = int(match.group(1)) if match else 0
+        subpastas.append(((match is None, numero_modulo), {
+            'id': pasta.get('id'),
+            'name': nome_pasta,
+            'numero': numero_modulo,
+            'caminho': arvore.caminho(pasta.get('id')),
+            'profundidade': arvore.profundidade(pasta.get('id')),
+        }))
     
-    # Ordenar subpastas pelo número do módulo
-    subpastas_ordenadas = sorted(subpastas, key=lambda x: x['numero'])
+    subpastas_ordenadas = [subpasta for _, subpasta in sorted(subpastas, key=lambda par: par[0])]
     
     if subpastas_ordenadas:
         print(f"\n=== Subpastas encontradas para {nome_pasta_principal} ===")
@@ -588,13 +788,10 @@ def obter_info_pasta(pasta_id: str) -> Dict[str, Any]:
     """
     endpoint = f'{BASE_URL}/folders/{pasta_id}'
     try:
-        response = requests.get(endpoint, headers=headers)
-        if response.status_code == 200:
-            data = response.json()
-            return data
-        else:
-            print(f"Erro ao obter informações da pasta: {response.status_code}")
-            return {}
+        return cache_listagens.obter_json(endpoint, headers)
+    except requests.exceptions.HTTPError as e:
+        print(f"Erro ao obter informações da pasta: {e.response.status_code}")
+        return {}
     except requests.exceptions.RequestException as e:
         print(f"Erro ao obter informações da pasta: {e}")
         return {}
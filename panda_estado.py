@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Banco local (SQLite) com o estado dos downloads, indexado pelo ID do vídeo.
+
+Substitui a verificação por nome de arquivo (`os.path.exists` por título):
+cada download concluído é registrado com caminho, tamanho, checksum, método
+de origem, datas e status. Os comandos consultam o banco com uma única
+consulta indexada por lote de vídeos; do disco, basta conferir o tamanho de
+cada arquivo registrado.
+
+O banco fica em `.panda_estado.db` no diretório atual (ou em PANDA_ESTADO_DB).
+Para forçar um novo download, basta apagar o arquivo do vídeo.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+CAMINHO_BANCO = os.getenv('PANDA_ESTADO_DB', '.panda_estado.db')
+# Quantidade máxima de parâmetros por consulta IN (...)
+TAMANHO_LOTE_CONSULTA = 900
+
+STATUS_CONCLUIDO = 'concluido'
+STATUS_FALHA = 'falha'
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    video_id      TEXT NOT NULL,
+    pasta         TEXT NOT NULL,
+    titulo        TEXT,
+    caminho       TEXT,
+    tamanho       INTEGER,
+    checksum      TEXT,
+    metodo        TEXT,
+    status        TEXT NOT NULL,
+    criado_em     REAL NOT NULL,
+    atualizado_em REAL NOT NULL,
+    PRIMARY KEY (video_id, pasta)
+);
+CREATE INDEX IF NOT EXISTS idx_downloads_pasta_status ON downloads (pasta, status);
+"""
+
+_conexao: Optional[sqlite3.Connection] = None
+_trava = threading.Lock()
+
+
+def _obter_conexao() -> sqlite3.Connection:
+    global _conexao
+    if _conexao is None:
+        _conexao = sqlite3.connect(CAMINHO_BANCO, check_same_thread=False)
+        _conexao.row_factory = sqlite3.Row
+        _conexao.execute('PRAGMA journal_mode=WAL')
+        _conexao.executescript(_ESQUEMA)
+    return _conexao
+
+
+def _normalizar_pasta(pasta_destino: str) -> str:
+    return os.path.abspath(pasta_destino)
+
+
+def _arquivo_confere(caminho: Optional[str], tamanho: Optional[int]) -> bool:
+    try:
+        return caminho is not None and os.path.getsize(caminho) == tamanho
+    except OSError:
+        return False
+
+
+def registrar_download(video_id: str, pasta_destino: str, caminho: str, tamanho: int,
+                       metodo: str, titulo: Optional[str] = None, checksum: Optional[str] = None) -> None:
+    """Registra um download concluído."""
+    agora = time.time()
+    with _trava:
+        conexao = _obter_conexao()
+        conexao.execute(
+            """
+            INSERT INTO downloads (video_id, pasta, titulo, caminho, tamanho, checksum, metodo,
+                                   status, criado_em, atualizado_em)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (video_id, pasta) DO UPDATE SET
+                titulo = excluded.titulo, caminho = excluded.caminho, tamanho = excluded.tamanho,
+                checksum = COALESCE(excluded.checksum, downloads.checksum), metodo = excluded.metodo,
+                status = excluded.status, atualizado_em = excluded.atualizado_em
+            """,
+            (str(video_id), _normalizar_pasta(pasta_destino), titulo, os.path.abspath(caminho),
+             tamanho, checksum, metodo, STATUS_CONCLUIDO, agora, agora),
+        )
+        conexao.commit()
+
+
+def registrar_falha(video_id: str, pasta_destino: str, titulo: Optional[str] = None) -> None:
+    """Registra que o download de um vídeo falhou (sem apagar um registro concluído)."""
+    agora = time.time()
+    with _trava:
+        conexao = _obter_conexao()
+        conexao.execute(
+            """
+            INSERT INTO downloads (video_id, pasta, titulo, status, criado_em, atualizado_em)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (video_id, pasta) DO UPDATE SET
+                status = excluded.status, atualizado_em = excluded.atualizado_em
+            WHERE downloads.status != ?
+            """,
+            (str(video_id), _normalizar_pasta(pasta_destino), titulo, STATUS_FALHA, agora, agora,
+             STATUS_CONCLUIDO),
+        )
+        conexao.commit()
+
+
+def obter_concluidos(video_ids: Iterable[str], pasta_destino: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Consulta quais vídeos já foram baixados em `pasta_destino`.
+
+    Registros cujo arquivo foi apagado ou mudou de tamanho (por exemplo, removido
+    pela limpeza de incompletos) não contam como concluídos.
+
+    Returns:
+        Dicionário {video_id: registro} apenas com os downloads concluídos
+    """
+    ids = [str(video_id) for video_id in video_ids]
+    pasta = _normalizar_pasta(pasta_destino)
+    concluidos: Dict[str, Dict[str, Any]] = {}
+    with _trava:
+        conexao = _obter_conexao()
+        for inicio in range(0, len(ids), TAMANHO_LOTE_CONSULTA):
+            lote = ids[inicio:inicio + TAMANHO_LOTE_CONSULTA]
+            marcadores = ', '.join('?' * len(lote))
+            cursor = conexao.execute(
+                f"SELECT * FROM downloads WHERE pasta = ? AND status = ? AND video_id IN ({marcadores})",
+                [pasta, STATUS_CONCLUIDO, *lote],
+            )
+            for linha in cursor:
+                if _arquivo_confere(linha['caminho'], linha['tamanho']):
+                    concluidos[linha['video_id']] = dict(linha)
+    return concluidos
+
+
+def obter_download(video_id: str, pasta_destino: str) -> Optional[Dict[str, Any]]:
+    """Retorna o registro concluído de um vídeo em `pasta_destino`, se houver."""
+    return obter_concluidos([video_id], pasta_destino).get(str(video_id))
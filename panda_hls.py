@@ -0,0 +1,923 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Download dos segmentos de vídeos HLS (m3u8) usados pelo método alternativo.
+
+Os segmentos são baixados em paralelo por um grupo de PANDA_SEGMENTOS
+trabalhadores (padrão 8), reaproveitando as conexões da sessão compartilhada.
+Um segmento que falha é tentado novamente sozinho (com backoff), sem descartar
+o resto do vídeo.
+
+Por padrão (PANDA_HLS_MODO=stream) os segmentos são entregues, na ordem da
+playlist, no stdin de um único ffmpeg (`-i pipe:0 -c copy`), que gera o MP4
+enquanto os downloads continuam. Uma janela limitada (PANDA_JANELA_SEGMENTOS)
+absorve a chegada fora de ordem dos downloads paralelos.
+
+Memória: nenhum segmento é guardado inteiro na memória. Os corpos das
+respostas são lidos com `readinto` em buffers reutilizáveis de um pool do
+processo (PoolBuffers). O segmento da vez vai direto do buffer para o stdin do
+ffmpeg; só os que chegam fora de ordem (ou ficam para a retomada) são gravados
+no diretório de trabalho. O total dos buffers, somando todos os trabalhadores
+e jobs, não passa de PANDA_HLS_MEMORIA bytes (padrão 32 MiB), qualquer que
+seja a resolução ou o paralelismo. Com PANDA_HLS_MODO=disco todos os segmentos
+são gravados em arquivos antes e só então entregues ao ffmpeg.
+
+Cada job usa um diretório de trabalho próprio (DiretorioTrabalho), derivado do
+arquivo de saída, dentro de PANDA_HLS_SCRATCH (por exemplo /dev/shm, para usar
+tmpfs) ou do diretório temporário do sistema. O diretório é travado enquanto o
+job roda, removido em caso de sucesso e mantido em caso de falha, com o log do
+ffmpeg, para inspeção e retomada.
+
+Playlists de mídia podem referenciar arquivos inteiros (TS clássico), trechos
+de um mesmo arquivo (`#EXT-X-BYTERANGE`) e um segmento de inicialização
+fMP4/CMAF (`#EXT-X-MAP`). Tudo vira uma lista de Segmento (URL e intervalo
+opcional) cuja concatenação, na ordem, é o vídeo; intervalos contíguos do
+mesmo arquivo são unidos em requisições maiores (até
+PANDA_HLS_INTERVALO_MAXIMO bytes, padrão 8 MiB) antes do download.
+
+Segmentos cifrados com `#EXT-X-KEY:METHOD=AES-128` são decifrados durante o
+download, nas threads dos trabalhadores, antes de chegar ao ffmpeg ou ao
+disco. Cada chave é buscada uma única vez por job, antes dos segmentos
+(ChavesHLS). A decifragem usa o pacote opcional `cryptography`, importado
+apenas quando a playlist é cifrada.
+
+Retomada (padrão nos dois modos): cada segmento concluído é anotado em
+`segmentos.jsonl` (índice, URL, tamanho e checksum). Uma nova tentativa do
+mesmo vídeo confere os segmentos anotados e baixa apenas os que faltam. Como
+o remux recomeça do início a cada tentativa, o custo é manter o vídeo inteiro
+no diretório de trabalho até o fim do job. Com PANDA_HLS_RETOMAVEL=0, no modo
+stream, cada arquivo é apagado assim que entregue ao ffmpeg e o diretório de
+trabalho guarda no máximo a janela, mas uma falha recomeça o vídeo do zero.
+
+A variante da playlist mestre é escolhida sem interação, pela política de
+qualidade (`--qualidade` no panda_cli.py ou PANDA_QUALIDADE): `best` (padrão),
+`worst`, `<=720p` (maior resolução até 720 linhas) ou `max-bitrate=2.5M`
+(maior BANDWIDTH até o limite, em bits/s).
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+import requests
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Any, BinaryIO, Callable, Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple, TypeVar
+from urllib.parse import urljoin, urlsplit
+from tqdm import tqdm
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+from panda_agendador import espera_backoff
+from panda_http import obter_sessao
+from panda_manifesto import ALGORITMO_CHECKSUM, calcular_checksum_arquivo
+from panda_transferencia import SUFIXO_PARCIAL, ler_com_limite, ler_para_buffer
+
+# Segmentos baixados ao mesmo tempo por vídeo
+SEGMENTOS_SIMULTANEOS = int(os.getenv('PANDA_SEGMENTOS', '8'))
+# Tentativas por segmento antes de desistir do vídeo
+TENTATIVAS_SEGMENTO = 4
+# Como os segmentos viram MP4: 'stream' (direto no stdin do ffmpeg) ou 'disco' (todos em arquivos antes)
+MODO_REMUX = os.getenv('PANDA_HLS_MODO', 'stream')
+# Segmentos baixados à frente do próximo a ser entregue ao ffmpeg (buffer de reordenação)
+JANELA_REORDENACAO = int(os.getenv('PANDA_JANELA_SEGMENTOS', str(2 * SEGMENTOS_SIMULTANEOS)))
+# Onde ficam os diretórios de trabalho dos jobs (ex.: /dev/shm para usar tmpfs)
+PASTA_TRABALHO = os.getenv('PANDA_HLS_SCRATCH') or os.path.join(tempfile.gettempdir(), 'panda_hls')
+# Mantém o registro dos segmentos concluídos, para retomar após falhas. Exige manter
+# o vídeo inteiro no diretório de trabalho; com 0, o modo stream guarda só a janela
+RETOMAVEL = os.getenv('PANDA_HLS_RETOMAVEL', '1') != '0'
+NOME_REGISTRO = 'segmentos.jsonl'
+# Tamanho máximo de uma requisição formada pela união de intervalos contíguos (bytes)
+INTERVALO_MAXIMO = int(os.getenv('PANDA_HLS_INTERVALO_MAXIMO', str(8 * 1024 * 1024)))
+# Limite de memória dos buffers de segmentos, somando todas as threads do processo (bytes)
+MEMORIA_SEGMENTOS = int(os.getenv('PANDA_HLS_MEMORIA', str(32 * 1024 * 1024)))
+TAMANHO_BUFFER = 1024 * 1024  # 1 MiB
+# Buffer de cada job para repassar ao ffmpeg os segmentos que chegaram fora de ordem
+TAMANHO_REPASSE = 64 * 1024  # 64 KiB
+
+TIMEOUT = (10, 60)
+_SUFIXOS_BITRATE = {'': 1, 'K': 1000, 'M': 1000 ** 2, 'G': 1000 ** 3}
+# Atributos de uma tag HLS: CHAVE=valor ou CHAVE="valor, com vírgulas"
+_ATRIBUTO = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+T = TypeVar('T')
+
+
+class FalhaSegmento(IOError):
+    """Um segmento não pôde ser baixado depois de todas as tentativas."""
+
+
+class FalhaRemux(IOError):
+    """O ffmpeg não conseguiu gerar o MP4 a partir dos segmentos."""
+
+
+class _EntradaFechada(Exception):
+    """O ffmpeg fechou o stdin; não é um IOError para que o segmento não seja repetido."""
+
+
+class JobEmAndamento(IOError):
+    """Outro processo já está baixando o mesmo vídeo."""
+
+
+def interpretar_qualidade(texto: str) -> str:
+    """Valida e normaliza uma política de qualidade ('best', 'worst', '<=720p', 'max-bitrate=2.5M')."""
+    _politica(texto)
+    return str(texto).strip().lower()
+
+
+def _politica(texto: str) -> Tuple[str, Optional[float]]:
+    """Converte a política em (tipo, limite): ('best'|'worst', None), ('altura', 720) ou ('banda', 2.5e6)."""
+    texto = str(texto).strip().lower()
+    if texto in ('best', 'worst'):
+        return texto, None
+    match = re.match(r'^(?:<=)?(\d+)p$', texto)
+    if match:
+        return 'altura', int(match.group(1))
+    match = re.match(r'^max-bitrate=(\d+(?:\.\d+)?)([kmg]?)(?:bps)?$', texto)
+    if match:
+        return 'banda', float(match.group(1)) * _SUFIXOS_BITRATE[match.group(2).upper()]
+    raise ValueError(f"Qualidade inválida: {texto} (use best, worst, <=720p ou max-bitrate=2.5M)")
+
+
+# Política de qualidade das playlists mestre (alterada por definir_qualidade)
+QUALIDADE = interpretar_qualidade(os.getenv('PANDA_QUALIDADE', 'best'))
+
+
+def definir_qualidade(texto: str) -> None:
+    """Altera a política de qualidade usada por escolher_variante."""
+    global QUALIDADE
+    QUALIDADE = interpretar_qualidade(texto)
+
+
+class Variante(NamedTuple):
+    """Uma entrada #EXT-X-STREAM-INF da playlist mestre."""
+    url: str
+    banda: int
+    largura: int
+    altura: int
+    codecs: str
+
+    def descricao(self) -> str:
+        resolucao = f"{self.largura}x{self.altura}" if self.altura else "resolução não informada"
+        return f"{resolucao}, {self.banda / 1000:.0f} kbps" + (f", {self.codecs}" if self.codecs else "")
+
+
+def _atributos(linha: str) -> Dict[str, str]:
+    return {chave: valor.strip('"') for chave, valor in _ATRIBUTO.findall(linha.split(':', 1)[1])}
+
+
+def eh_playlist_mestre(texto: str) -> bool:
+    return '#EXT-X-STREAM-INF' in texto
+
+
+def analisar_playlist_mestre(texto: str, url_base: str) -> List[Variante]:
+    """Lê as variantes (BANDWIDTH, RESOLUTION, CODECS e URI) de uma playlist mestre."""
+    variantes = []
+    atributos = None
+    for linha in texto.splitlines():
+        linha = linha.strip()
+        if linha.startswith('#EXT-X-STREAM-INF:'):
+            atributos = _atributos(linha)
+        elif linha and not linha.startswith('#') and atributos is not None:
+            largura, _, altura = atributos.get('RESOLUTION', '').partition('x')
+            variantes.append(Variante(
+                url=urljoin(url_base, linha),
+                banda=int(atributos.get('BANDWIDTH') or 0),
+                largura=int(largura) if largura.isdigit() else 0,
+                altura=int(altura) if altura.isdigit() else 0,
+                codecs=atributos.get('CODECS', ''),
+            ))
+            atributos = None
+    return variantes
+
+
+class Segmento(NamedTuple):
+    """
+    Um pedaço do vídeo: um arquivo inteiro ou `tamanho` bytes a partir de `inicio`.
+
+    Se `chave` (URI da chave AES-128) estiver definida, o conteúdo é cifrado
+    em AES-128-CBC com o vetor `iv`.
+    """
+    url: str
+    inicio: Optional[int] = None
+    tamanho: Optional[int] = None
+    chave: Optional[str] = None
+    iv: Optional[bytes] = None
+
+    def cabecalho_range(self) -> Optional[str]:
+        if self.inicio is None:
+            return None
+        return f"bytes={self.inicio}-{self.inicio + self.tamanho - 1}"
+
+    def identidade(self) -> str:
+        """URL sem a query string (que pode trazer tokens assinados que mudam a cada tentativa) e intervalo."""
+        partes = urlsplit(self.url)
+        identidade = partes.netloc + partes.path
+        return identidade if self.inicio is None else f"{identidade}#{self.inicio}+{self.tamanho}"
+
+
+def _interpretar_byterange(valor: str, inicio_padrao: int) -> Tuple[int, int]:
+    """Converte `tamanho[@inicio]` em (inicio, tamanho)."""
+    tamanho, _, inicio = valor.strip('"').partition('@')
+    return (int(inicio) if inicio else inicio_padrao), int(tamanho)
+
+
+def _iv_sequencia(sequencia: int) -> bytes:
+    """IV padrão do AES-128 no HLS: o número de sequência do segmento em 16 bytes big-endian."""
+    return sequencia.to_bytes(16, 'big')
+
+
+def analisar_playlist_midia(texto: str, url_base: str) -> List[Segmento]:
+    """
+    Segmentos de uma playlist de mídia, na ordem, com URLs absolutas.
+
+    Um `#EXT-X-MAP` (inicialização fMP4) entra na lista antes dos segmentos
+    que o usam, uma vez a cada troca. `#EXT-X-BYTERANGE` sem `@inicio`
+    continua do fim do intervalo anterior do mesmo arquivo. `#EXT-X-KEY` com
+    METHOD=AES-128 vale para os segmentos seguintes, até a próxima `#EXT-X-KEY`.
+
+    Raises:
+        ValueError: A playlist usa um método de criptografia não suportado
+    """
+    segmentos: List[Segmento] = []
+    mapa_atual: Optional[Segmento] = None
+    byterange: Optional[str] = None
+    fim_anterior: Dict[str, int] = {}
+    sequencia = 0
+    chave: Optional[str] = None
+    iv: Optional[bytes] = None
+    for linha in texto.splitlines():
+        linha = linha.strip()
+        if linha.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+            sequencia = int(linha.split(':', 1)[1])
+        elif linha.startswith('#EXT-X-KEY:'):
+            atributos = _atributos(linha)
+            metodo = atributos.get('METHOD', 'NONE')
+            if metodo == 'NONE':
+                chave, iv = None, None
+            elif metodo == 'AES-128':
+                chave = urljoin(url_base, atributos['URI'])
+                iv = bytes.fromhex(atributos['IV'][2:].rjust(32, '0')) if 'IV' in atributos else None
+            else:
+                raise ValueError(f"Criptografia HLS não suportada: {metodo}")
+        elif linha.startswith('#EXT-X-MAP:'):
+            atributos = _atributos(linha)
+            mapa = Segmento(urljoin(url_base, atributos['URI']), chave=chave,
+                            iv=(iv or _iv_sequencia(sequencia)) if chave else None)
+            if 'BYTERANGE' in atributos:
+                mapa = mapa._replace(**dict(zip(('inicio', 'tamanho'),
+                                                _interpretar_byterange(atributos['BYTERANGE'], 0))))
+            if mapa != mapa_atual:
+                segmentos.append(mapa)
+                mapa_atual = mapa
+        elif linha.startswith('#EXT-X-BYTERANGE:'):
+            byterange = linha.split(':', 1)[1]
+        elif linha and not linha.startswith('#'):
+            url = urljoin(url_base, linha)
+            segmento = Segmento(url, chave=chave, iv=(iv or _iv_sequencia(sequencia)) if chave else None)
+            if byterange:
+                inicio, tamanho = _interpretar_byterange(byterange, fim_anterior.get(url, 0))
+                fim_anterior[url] = inicio + tamanho
+                segmento = segmento._replace(inicio=inicio, tamanho=tamanho)
+            segmentos.append(segmento)
+            byterange = None
+            sequencia += 1
+    return segmentos
+
+
+def coalescer_intervalos(segmentos: List[Segmento], maximo: int = INTERVALO_MAXIMO) -> List[Segmento]:
+    """
+    Une intervalos contíguos do mesmo arquivo em segmentos de até `maximo` bytes.
+
+    Segmentos cifrados não são unidos: cada um tem seu próprio IV e padding.
+    """
+    unidos: List[Segmento] = []
+    for segmento in segmentos:
+        anterior = unidos[-1] if unidos else None
+        if (anterior is not None and segmento.inicio is not None and anterior.inicio is not None
+                and segmento.chave is None and anterior.chave is None
+                and segmento.url == anterior.url
+                and segmento.inicio == anterior.inicio + anterior.tamanho
+                and anterior.tamanho + segmento.tamanho <= maximo):
+            unidos[-1] = anterior._replace(tamanho=anterior.tamanho + segmento.tamanho)
+        else:
+            unidos.append(segmento)
+    return unidos
+
+
+def escolher_variante(variantes: List[Variante], qualidade: Optional[str] = None) -> Variante:
+    """
+    Escolhe a variante conforme a política (padrão: QUALIDADE).
+
+    Com `<=720p` ou `max-bitrate=...`, fica com a melhor variante dentro do
+    limite; se nenhuma couber, com a menor disponível.
+    """
+    tipo, limite = _politica(qualidade or QUALIDADE)
+    ordenadas = sorted(variantes, key=lambda v: (v.banda, v.altura))
+    if tipo == 'worst':
+        return ordenadas[0]
+    if tipo == 'altura':
+        candidatas = [v for v in ordenadas if v.altura and v.altura <= limite]
+    elif tipo == 'banda':
+        candidatas = [v for v in ordenadas if v.banda <= limite]
+    else:
+        candidatas = ordenadas
+    return candidatas[-1] if candidatas else ordenadas[0]
+
+
+class PoolBuffers:
+    """
+    Buffers de tamanho fixo reaproveitados entre segmentos, com limite rígido.
+
+    São criados sob demanda até `quantidade`; depois disso, quem pede um
+    buffer espera até outro ser devolvido. Cada usuário segura um único
+    buffer por vez e o devolve sem depender dos demais, então não há impasse.
+    """
+
+    def __init__(self, quantidade: int, tamanho: int = TAMANHO_BUFFER):
+        self.tamanho = tamanho
+        self.quantidade = max(1, quantidade)
+        self._livres: List[bytearray] = []
+        self._criados = 0
+        self._condicao = threading.Condition()
+
+    @contextmanager
+    def emprestar(self) -> Iterator[memoryview]:
+        with self._condicao:
+            while not self._livres and self._criados >= self.quantidade:
+                self._condicao.wait()
+            if self._livres:
+                buffer = self._livres.pop()
+            else:
+                buffer = bytearray(self.tamanho)
+                self._criados += 1
+        try:
+            with memoryview(buffer) as visao:
+                yield visao
+        finally:
+            with self._condicao:
+                self._livres.append(buffer)
+                self._condicao.notify()
+
+
+# Pool compartilhado por todos os downloads HLS do processo
+pool_buffers = PoolBuffers(MEMORIA_SEGMENTOS // TAMANHO_BUFFER)
+
+
+class DiretorioTrabalho:
+    """
+    Diretório exclusivo de um job HLS. Use com `with`.
+
+    O nome é derivado do arquivo de saída, de modo que uma nova tentativa do
+    mesmo vídeo encontra o diretório deixado por uma falha anterior, enquanto
+    vídeos diferentes nunca compartilham arquivos. Uma trava impede que dois
+    processos usem o mesmo diretório ao mesmo tempo.
+    """
+
+    def __init__(self, caminho_saida: str, base: str = PASTA_TRABALHO):
+        chave = hashlib.sha1(os.path.abspath(caminho_saida).encode()).hexdigest()[:16]
+        nome = re.sub(r'[^\w.-]', '_', os.path.splitext(os.path.basename(caminho_saida))[0])[:40]
+        self.caminho = os.path.join(base, f"{nome}-{chave}")
+        self._trava: Optional[BinaryIO] = None
+
+    def __enter__(self) -> 'DiretorioTrabalho':
+        os.makedirs(self.caminho, exist_ok=True)
+        self._trava = open(os.path.join(self.caminho, '.trava'), 'wb')
+        if fcntl:
+            try:
+                fcntl.flock(self._trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._trava.close()
+                raise JobEmAndamento(f"outro processo já está usando {self.caminho}")
+        return self
+
+    def __exit__(self, tipo, valor, rastreamento) -> None:
+        self._trava.close()
+        if tipo is None:
+            shutil.rmtree(self.caminho, ignore_errors=True)
+        else:
+            print(f"⚠️ Diretório de trabalho mantido para inspeção e retomada: {self.caminho}")
+
+    def arquivo(self, nome: str) -> str:
+        return os.path.join(self.caminho, nome)
+
+
+class RegistroSegmentos:
+    """
+    Segmentos já gravados no diretório de trabalho de um job.
+
+    Cada segmento concluído vira uma linha JSON em `segmentos.jsonl`, gravada
+    logo depois do arquivo. Ao abrir o registro, só valem as linhas cuja URL
+    (e intervalo) ainda corresponde ao mesmo índice da playlist e cujo arquivo confere em
+    tamanho e checksum; as demais são descartadas e o segmento é baixado de novo.
+    """
+
+    def __init__(self, trabalho: DiretorioTrabalho, segmentos: List[Segmento], persistente: bool = True):
+        self.trabalho = trabalho
+        self.persistente = persistente
+        self.concluidos: Dict[int, Dict[str, Any]] = {}
+        self._trava = threading.Lock()
+        self._caminho = trabalho.arquivo(NOME_REGISTRO)
+        if persistente:
+            self._carregar(segmentos)
+
+    def caminho_segmento(self, indice: int) -> str:
+        return self.trabalho.arquivo(f"segmento_{indice:05d}.ts")
+
+    def _confere(self, entrada: Dict[str, Any]) -> bool:
+        caminho = self.caminho_segmento(entrada['indice'])
+        try:
+            if os.path.getsize(caminho) != entrada['tamanho']:
+                return False
+            algoritmo = entrada['checksum'].split(':', 1)[0]
+            return calcular_checksum_arquivo(caminho, algoritmo) == entrada['checksum']
+        except (OSError, ValueError):
+            return False
+
+    def _carregar(self, segmentos: List[Segmento]) -> None:
+        try:
+            with open(self._caminho, 'r', encoding='utf-8') as f:
+                linhas = f.readlines()
+        except OSError:
+            linhas = []
+        for linha in linhas:
+            try:
+                entrada = json.loads(linha)
+            except ValueError:
+                continue  # última linha cortada por uma interrupção
+            indice = entrada.get('indice', -1)
+            if (0 <= indice < len(segmentos) and entrada.get('url') == segmentos[indice].identidade()
+                    and self._confere(entrada)):
+                self.concluidos[indice] = entrada
+        # Reescreve só com as entradas válidas
+        temporario = self._caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            for indice in sorted(self.concluidos):
+                f.write(json.dumps(self.concluidos[indice]) + '\n')
+        os.replace(temporario, self._caminho)
+
+    def registrar(self, indice: int, segmento: Segmento, tamanho: int, checksum: str) -> None:
+        """Anota um segmento cujo arquivo já foi gravado por completo."""
+        entrada = {'indice': indice, 'url': segmento.identidade(), 'tamanho': tamanho, 'checksum': checksum}
+        with self._trava:
+            if self.persistente:
+                with open(self._caminho, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entrada) + '\n')
+            self.concluidos[indice] = entrada
+
+
+def _modulos_aes() -> Tuple[Any, Any, Any, Any]:
+    try:
+        from cryptography.hazmat.primitives import padding
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    except ImportError:
+        raise ImportError("Vídeos HLS cifrados (AES-128) exigem o pacote cryptography: "
+                          "pip install cryptography") from None
+    return Cipher, algorithms, modes, padding
+
+
+class DecifradorAES128:
+    """Decifra um segmento AES-128-CBC (com padding PKCS#7) bloco a bloco, à medida que chega."""
+
+    def __init__(self, chave: bytes, iv: bytes):
+        Cipher, algorithms, modes, padding = _modulos_aes()
+        self._decifrador = Cipher(algorithms.AES(chave), modes.CBC(iv)).decryptor()
+        self._padding = padding.PKCS7(128).unpadder()
+
+    def atualizar(self, dados: bytes) -> bytes:
+        return self._padding.update(self._decifrador.update(dados))
+
+    def finalizar(self) -> bytes:
+        try:
+            return self._padding.update(self._decifrador.finalize()) + self._padding.finalize()
+        except ValueError as e:
+            raise IOError(f"falha ao decifrar o segmento (chave ou IV incorretos?): {e}") from e
+
+
+class ChavesHLS:
+    """
+    Chaves AES-128 de um job. Cada URI é buscada uma única vez, em `carregar`,
+    antes de os segmentos começarem; os trabalhadores só leem as chaves já obtidas.
+    """
+
+    def __init__(self, headers: Optional[Dict[str, str]] = None):
+        self.headers = headers or {}
+        self._chaves: Dict[str, bytes] = {}
+
+    def _buscar(self, uri: str) -> bytes:
+        response = obter_sessao().get(uri, headers=self.headers, timeout=TIMEOUT)
+        response.raise_for_status()
+        if len(response.content) != 16:
+            raise IOError(f"chave AES-128 com {len(response.content)} bytes")
+        return response.content
+
+    def carregar(self, segmentos: List[Segmento]) -> None:
+        """
+        Busca as chaves distintas de `segmentos` ainda não obtidas.
+
+        Raises:
+            FalhaSegmento: Alguma chave falhou em todas as tentativas
+        """
+        for uri in dict.fromkeys(segmento.chave for segmento in segmentos if segmento.chave):
+            if uri not in self._chaves:
+                self._chaves[uri] = _com_tentativas(Segmento(uri), lambda: self._buscar(uri))
+
+    def decifrador(self, segmento: Segmento) -> Optional[DecifradorAES128]:
+        """Decifrador novo para uma tentativa de download de `segmento`, ou None se ele não for cifrado."""
+        if segmento.chave is None:
+            return None
+        return DecifradorAES128(self._chaves[segmento.chave], segmento.iv)
+
+
+def _ler_blocos(response, buffer: memoryview) -> Iterator[bytes]:
+    """
+    Blocos do corpo de um segmento, lidos direto no buffer do pool.
+
+    Corpos com Content-Encoding são lidos em blocos já descomprimidos (sem o
+    buffer), porque o readinto conta os bytes descomprimidos.
+    """
+    if response.headers.get('content-encoding', 'identity').lower() not in ('', 'identity'):
+        yield from ler_com_limite(response)
+        return
+    while True:
+        lidos = ler_para_buffer(response, buffer)
+        if not lidos:
+            return
+        yield buffer[:lidos]
+
+
+def _transferir_segmento(segmento: Segmento, headers: Dict[str, str], saida: BinaryIO,
+                         chaves: Optional[ChavesHLS] = None) -> Tuple[int, str]:
+    """
+    Uma tentativa de download de um segmento, gravando o corpo (já decifrado) em
+    `saida`; retorna (tamanho, checksum) do que foi gravado.
+    """
+    hash_segmento = hashlib.new(ALGORITMO_CHECKSUM)
+    decifrador = chaves.decifrador(segmento) if chaves else None
+    gravados = 0
+    intervalo = segmento.cabecalho_range()
+    if intervalo:
+        headers = dict(headers, Range=intervalo)
+    with obter_sessao().get(segmento.url, headers=headers, stream=True, timeout=TIMEOUT) as response, \
+            pool_buffers.emprestar() as buffer:
+        response.raise_for_status()
+        if intervalo and response.status_code != 206:
+            raise IOError(f"o servidor ignorou o cabeçalho Range ({intervalo})")
+        esperado = segmento.tamanho or int(response.headers.get('content-length', 0))
+        for bloco in _ler_blocos(response, buffer):
+            dados = decifrador.atualizar(bloco) if decifrador else bloco
+            saida.write(dados)
+            hash_segmento.update(dados)
+            gravados += len(dados)
+        # Bytes recebidos pela rede (antes de descomprimir), comparáveis ao Content-Length
+        recebidos = response.raw.tell()
+    if esperado and recebidos != esperado:
+        raise IOError(f"segmento incompleto: {recebidos} de {esperado} bytes")
+    if decifrador:
+        final = decifrador.finalizar()
+        saida.write(final)
+        hash_segmento.update(final)
+        gravados += len(final)
+    return gravados, f"{ALGORITMO_CHECKSUM}:{hash_segmento.hexdigest()}"
+
+
+def _com_tentativas(segmento: Segmento, tentativa_unica: Callable[[], T]) -> T:
+    """Executa o download de um segmento, repetindo apenas ele em caso de falha."""
+    descricao = segmento.url if segmento.inicio is None else f"{segmento.url} [{segmento.cabecalho_range()}]"
+    for tentativa in range(TENTATIVAS_SEGMENTO):
+        try:
+            return tentativa_unica()
+        except (requests.exceptions.RequestException, IOError) as e:
+            if tentativa == TENTATIVAS_SEGMENTO - 1:
+                raise FalhaSegmento(f"{descricao}: {e}") from e
+            time.sleep(espera_backoff(tentativa))
+    raise FalhaSegmento(descricao)
+
+
+def _baixar_segmento(indice: int, segmento: Segmento, registro: RegistroSegmentos,
+                     headers: Dict[str, str], chaves: Optional[ChavesHLS] = None,
+                     abrir_saida: Optional[Callable[[], BinaryIO]] = None) -> None:
+    """
+    Baixa um segmento e o anota no registro. Cada tentativa grava em
+    `abrir_saida()` ou, por padrão, no arquivo do segmento no diretório de trabalho.
+    """
+    def tentativa_unica() -> Tuple[int, str]:
+        with (abrir_saida() if abrir_saida else open(registro.caminho_segmento(indice), 'wb')) as f:
+            return _transferir_segmento(segmento, headers, f, chaves)
+    registro.registrar(indice, segmento, *_com_tentativas(segmento, tentativa_unica))
+
+
+def _enviar_arquivo(caminho: str, saida: BinaryIO) -> None:
+    """Copia um segmento gravado para `saida` (o stdin do ffmpeg) com um buffer do pool."""
+    with open(caminho, 'rb', buffering=0) as f, pool_buffers.emprestar() as buffer:
+        while True:
+            lidos = f.readinto(buffer)
+            if not lidos:
+                return
+            saida.write(buffer[:lidos])
+
+
+def _avisar_retomada(registro: RegistroSegmentos, total: int) -> None:
+    if registro.concluidos:
+        print(f"↻ Retomando: {len(registro.concluidos)} de {total} segmentos já baixados")
+
+
+def baixar_segmentos(segmentos: List[Segmento], registro: RegistroSegmentos,
+                     headers: Optional[Dict[str, str]] = None,
+                     simultaneos: int = SEGMENTOS_SIMULTANEOS, chaves: Optional[ChavesHLS] = None) -> List[str]:
+    """
+    Baixa em paralelo os segmentos que ainda não constam no registro.
+
+    Cada segmento é gravado no arquivo do seu índice, de modo que a ordem
+    final não depende da ordem de chegada.
+
+    Args:
+        segmentos: Segmentos, na ordem da playlist
+        registro: Registro do diretório de trabalho onde os segmentos são gravados
+        headers: Cabeçalhos das requisições
+        simultaneos: Número de segmentos baixados ao mesmo tempo
+        chaves: Chaves AES-128 do job, se a playlist for cifrada
+
+    Returns:
+        Caminhos dos segmentos, na ordem da playlist
+
+    Raises:
+        FalhaSegmento: Algum segmento falhou em todas as tentativas
+    """
+    headers = headers or {}
+    _avisar_retomada(registro, len(segmentos))
+    faltantes = [(i, segmento) for i, segmento in enumerate(segmentos) if i not in registro.concluidos]
+    with ThreadPoolExecutor(max_workers=max(1, simultaneos)) as executor, \
+            tqdm(total=len(segmentos), initial=len(segmentos) - len(faltantes),
+                 desc="Segmentos", unit="seg") as barra:
+        futuros = [executor.submit(_baixar_segmento, indice, segmento, registro, headers, chaves)
+                   for indice, segmento in faltantes]
+        try:
+            for futuro in as_completed(futuros):
+                futuro.result()
+                barra.update(1)
+        except FalhaSegmento:
+            for futuro in futuros:
+                futuro.cancel()
+            raise
+    return [registro.caminho_segmento(i) for i in range(len(segmentos))]
+
+
+class _EntregaOrdenada:
+    """
+    Entrega em ordem no stdin do ffmpeg, compartilhada pelos trabalhadores de um job.
+
+    Só escreve no stdin quem cuida do segmento da vez (`proximo`): o
+    trabalhador que o está baixando, ou a thread principal, quando o segmento
+    já estava no disco. Por isso o buffer de repasse é um só por job.
+    """
+
+    def __init__(self, entrada: BinaryIO):
+        self.entrada = entrada
+        self.proximo = 0
+        # Bytes do segmento da vez já escritos no stdin (por qualquer tentativa)
+        self.enviados = 0
+        self._repasse = bytearray(TAMANHO_REPASSE)
+
+    def eh_a_vez(self, indice: int) -> bool:
+        return indice == self.proximo
+
+    def avancar(self) -> None:
+        self.enviados = 0
+        self.proximo += 1
+
+    def enviar(self, dados: bytes) -> None:
+        try:
+            self.entrada.write(dados)
+        except BrokenPipeError as e:
+            raise _EntradaFechada(str(e)) from e
+        self.enviados += len(dados)
+
+    def repassar(self, caminho: str, inicio: int = 0, fim: Optional[int] = None) -> None:
+        """Envia o trecho [inicio, fim) de um segmento gravado em `caminho`."""
+        with open(caminho, 'rb', buffering=0) as f, memoryview(self._repasse) as buffer:
+            f.seek(inicio)
+            restante = float('inf') if fim is None else fim - inicio
+            while restante > 0:
+                lidos = f.readinto(buffer[:int(min(len(buffer), restante))])
+                if not lidos:
+                    return
+                self.enviar(buffer[:lidos])
+                restante -= lidos
+
+
+class _SaidaEmOrdem:
+    """
+    Saída de uma tentativa de download de um segmento no modo stream.
+
+    Enquanto não é a vez do segmento, os dados vão para o arquivo dele no
+    diretório de trabalho. Quando chega a vez, o que já estava no arquivo é
+    repassado e o restante segue direto do buffer do pool para o stdin,
+    pulando os bytes que uma tentativa anterior já enviou. Com registro
+    persistente o arquivo recebe tudo, para a retomada.
+    """
+
+    def __init__(self, entrega: _EntregaOrdenada, indice: int, registro: RegistroSegmentos):
+        self.entrega = entrega
+        self.indice = indice
+        self.persistente = registro.persistente
+        self.caminho = registro.caminho_segmento(indice)
+        self.direto = entrega.eh_a_vez(indice)
+        self.posicao = 0
+        self._arquivo = open(self.caminho, 'wb') if self.persistente or not self.direto else None
+
+    def __enter__(self) -> '_SaidaEmOrdem':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._arquivo:
+            self._arquivo.close()
+
+    def write(self, dados: bytes) -> None:
+        if not self.direto and self.entrega.eh_a_vez(self.indice):
+            self._assumir_a_vez()
+        if self._arquivo:
+            self._arquivo.write(dados)
+        if self.direto:
+            pular = self.entrega.enviados - self.posicao
+            if pular < len(dados):
+                self.entrega.enviar(dados[max(0, pular):])
+        self.posicao += len(dados)
+
+    def _assumir_a_vez(self) -> None:
+        self._arquivo.flush()
+        self.entrega.repassar(self.caminho, self.entrega.enviados, self.posicao)
+        if not self.persistente:
+            self._arquivo.close()
+            self._arquivo = None
+            os.remove(self.caminho)
+        self.direto = True
+
+
+def _executar_ffmpeg(argumentos_entrada: List[str], caminho: str, trabalho: DiretorioTrabalho,
+                     alimentar: Optional[Callable[[BinaryIO], None]] = None) -> None:
+    """
+    Roda o ffmpeg gravando em `<caminho>.part` e renomeia ao concluir.
+
+    Se `alimentar` for informado, a entrada é o stdin do processo e a função
+    recebe o pipe para escrever os dados. O stderr fica em `ffmpeg.log` no
+    diretório de trabalho.
+    """
+    caminho_parcial = caminho + SUFIXO_PARCIAL
+    comando = ['ffmpeg', '-y', '-loglevel', 'error', *argumentos_entrada,
+               '-c', 'copy', '-f', 'mp4', caminho_parcial]
+    with open(trabalho.arquivo('ffmpeg.log'), 'w+b') as erros:
+        processo = subprocess.Popen(comando, stdin=subprocess.PIPE if alimentar else subprocess.DEVNULL,
+                                    stdout=subprocess.DEVNULL, stderr=erros)
+        try:
+            if alimentar:
+                try:
+                    alimentar(processo.stdin)
+                    processo.stdin.close()
+                except BrokenPipeError:
+                    # O ffmpeg encerrou antes do fim da entrada; o erro vem no stderr
+                    pass
+            codigo = processo.wait()
+        except BaseException:
+            processo.kill()
+            processo.wait()
+            if os.path.exists(caminho_parcial):
+                os.remove(caminho_parcial)
+            raise
+        if codigo != 0:
+            if os.path.exists(caminho_parcial):
+                os.remove(caminho_parcial)
+            erros.seek(0)
+            raise FalhaRemux(erros.read().decode(errors='replace').strip() or f"ffmpeg saiu com código {codigo}")
+    os.replace(caminho_parcial, caminho)
+
+
+def transmitir_segmentos(segmentos: List[Segmento], caminho: str, trabalho: DiretorioTrabalho,
+                         headers: Optional[Dict[str, str]] = None, simultaneos: int = SEGMENTOS_SIMULTANEOS,
+                         janela: int = JANELA_REORDENACAO, chaves: Optional[ChavesHLS] = None) -> None:
+    """
+    Baixa os segmentos em paralelo e os entrega em ordem no stdin do ffmpeg.
+
+    O segmento da vez segue direto do buffer de leitura para o ffmpeg; só os
+    que chegam fora de ordem passam pelo diretório de trabalho e são
+    repassados quando chegar a vez deles. No máximo `janela` segmentos ficam
+    em andamento ou aguardando à frente do próximo a ser enviado. Os já
+    registrados não são baixados de novo; com PANDA_HLS_RETOMAVEL=0 nenhum
+    arquivo fica no disco depois de entregue.
+
+    Raises:
+        FalhaSegmento: Algum segmento falhou em todas as tentativas
+        FalhaRemux: O ffmpeg não gerou o MP4
+    """
+    headers = headers or {}
+    janela = max(janela, simultaneos, 1)
+    registro = RegistroSegmentos(trabalho, segmentos, persistente=RETOMAVEL)
+    _avisar_retomada(registro, len(segmentos))
+
+    def alimentar(entrada: BinaryIO) -> None:
+        entrega = _EntregaOrdenada(entrada)
+
+        def obter(indice: int, segmento: Segmento) -> bool:
+            """Garante o segmento; retorna True se ele já foi entregue direto ao ffmpeg."""
+            if indice in registro.concluidos:
+                return False
+            saidas: List[_SaidaEmOrdem] = []
+
+            def abrir_saida() -> _SaidaEmOrdem:
+                saidas.append(_SaidaEmOrdem(entrega, indice, registro))
+                return saidas[-1]
+
+            _baixar_segmento(indice, segmento, registro, headers, chaves, abrir_saida)
+            return saidas[-1].direto
+
+        proximas = iter(enumerate(segmentos))
+        pendentes: Deque[Future] = deque()
+        with ThreadPoolExecutor(max_workers=max(1, simultaneos)) as executor, \
+                tqdm(total=len(segmentos), desc="Segmentos", unit="seg") as barra:
+            def abastecer() -> None:
+                while len(pendentes) < janela:
+                    proxima = next(proximas, None)
+                    if proxima is None:
+                        return
+                    pendentes.append(executor.submit(obter, *proxima))
+
+            abastecer()
+            try:
+                while pendentes:
+                    if not pendentes.popleft().result():
+                        caminho_segmento = registro.caminho_segmento(entrega.proximo)
+                        entrega.repassar(caminho_segmento)
+                        if not registro.persistente:
+                            os.remove(caminho_segmento)
+                    entrega.avancar()
+                    barra.update(1)
+                    abastecer()
+            except BaseException as e:
+                for futuro in pendentes:
+                    futuro.cancel()
+                if isinstance(e, _EntradaFechada):
+                    raise BrokenPipeError(str(e)) from e
+                raise
+
+    _executar_ffmpeg(['-i', 'pipe:0'], caminho, trabalho, alimentar)
+
+
+def concatenar_segmentos(segmentos: List[Segmento], caminho: str, trabalho: DiretorioTrabalho,
+                         headers: Optional[Dict[str, str]] = None,
+                         simultaneos: int = SEGMENTOS_SIMULTANEOS, chaves: Optional[ChavesHLS] = None) -> None:
+    """
+    Baixa os segmentos para o diretório de trabalho e depois os entrega em ordem ao ffmpeg.
+
+    Os arquivos são lidos em sequência para o stdin do ffmpeg, e não pelo
+    demuxer concat, porque fragmentos fMP4 só fazem sentido após o segmento
+    de inicialização.
+
+    Raises:
+        FalhaSegmento: Algum segmento falhou em todas as tentativas
+        FalhaRemux: O ffmpeg não gerou o MP4
+    """
+    registro = RegistroSegmentos(trabalho, segmentos, persistente=RETOMAVEL)
+    caminhos = baixar_segmentos(segmentos, registro, headers, simultaneos, chaves)
+
+    def alimentar(entrada: BinaryIO) -> None:
+        for caminho_segmento in caminhos:
+            _enviar_arquivo(caminho_segmento, entrada)
+
+    print("\nUnindo segmentos com ffmpeg...")
+    _executar_ffmpeg(['-i', 'pipe:0'], caminho, trabalho, alimentar)
+
+
+def baixar_hls(segmentos: List[Segmento], caminho: str, headers: Optional[Dict[str, str]] = None) -> None:
+    """
+    Baixa os segmentos de uma playlist e gera o MP4 em `caminho`, conforme PANDA_HLS_MODO.
+
+    Intervalos contíguos do mesmo arquivo são unidos antes do download e
+    segmentos cifrados são decifrados durante o download.
+
+    Raises:
+        ImportError: A playlist é cifrada e o pacote cryptography não está instalado
+        JobEmAndamento: Outro processo já está baixando o mesmo vídeo
+        FalhaSegmento: Algum segmento falhou em todas as tentativas
+        FalhaRemux: O ffmpeg não gerou o MP4
+    """
+    segmentos = coalescer_intervalos(segmentos)
+    chaves = None
+    if any(segmento.chave for segmento in segmentos):
+        _modulos_aes()  # falha antes de baixar qualquer coisa se o cryptography faltar
+        chaves = ChavesHLS(headers)
+        chaves.carregar(segmentos)
+    with DiretorioTrabalho(caminho) as trabalho:
+        if MODO_REMUX == 'disco':
+            concatenar_segmentos(segmentos, caminho, trabalho, headers, chaves=chaves)
+        else:
+            transmitir_segmentos(segmentos, caminho, trabalho, headers, chaves=chaves)
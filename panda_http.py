@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Sessão HTTP compartilhada por todas as chamadas à API e aos downloads do Panda Videos.
+
+Uma única `requests.Session` mantém as conexões abertas (keep-alive) com
+api-v2.pandavideo.com.br e com o servidor de download, evitando um novo
+handshake TCP+TLS a cada requisição. O pool é dimensionado pela concorrência
+configurada (vídeos simultâneos x conexões por vídeo).
+
+Cada resposta e cada falha de rede (timeout, conexão recusada ou resetada)
+é repassada aos observadores registrados, como o controlador de concorrência.
+As requisições seguem o ritmo definido por `panda_agendador` a partir dos
+cabeçalhos de limite da API.
+"""
+
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Callable, List, Optional
+from panda_agendador import MAX_TENTATIVAS_LIMITE, agendador
+
+# Conexões mantidas por host no pool
+MAX_CONEXOES = int(os.getenv('PANDA_MAX_CONEXOES', '16'))
+# Quantidade de hosts distintos com pool próprio (API, download, CDN, ...)
+MAX_HOSTS = 8
+
+# Funções chamadas a cada resposta HTTP e a cada falha de rede
+observadores_resposta: List[Callable[[requests.Response], None]] = []
+observadores_falha: List[Callable[[str], None]] = []
+
+_sessao: Optional[requests.Session] = None
+_trava = threading.Lock()
+
+
+def notificar_falha(motivo: str) -> None:
+    """Repassa uma falha de rede aos observadores."""
+    for observador in list(observadores_falha):
+        observador(motivo)
+
+
+def _notificar_resposta(response: requests.Response, *args, **kwargs) -> None:
+    for observador in list(observadores_resposta):
+        observador(response)
+
+
+class SessaoPanda(requests.Session):
+    """
+    `requests.Session` que passa cada requisição pelo agendador (ritmo e novas
+    tentativas em respostas de limite) e avisa os observadores sobre timeouts
+    e erros de conexão.
+    """
+
+    def request(self, method: str, url: str, *args, **kwargs) -> requests.Response:
+        tentativa = 0
+        while True:
+            agendador.aguardar(url)
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except requests.exceptions.Timeout:
+                notificar_falha("timeout")
+                raise
+            except requests.exceptions.ConnectionError:
+                notificar_falha("erro de conexão")
+                raise
+            espera = agendador.registrar_resposta(url, response.status_code, response.headers, tentativa)
+            if espera is None or tentativa >= MAX_TENTATIVAS_LIMITE:
+                return response
+            print(f"⏳ Limite da API atingido ({response.status_code}). Nova tentativa em {espera:.1f}s...")
+            response.close()
+            tentativa += 1
+
+
+def _criar_sessao(max_conexoes: int) -> requests.Session:
+    sessao = SessaoPanda()
+    sessao.hooks['response'].append(_notificar_resposta)
+    adaptador = HTTPAdapter(pool_connections=MAX_HOSTS, pool_maxsize=max(1, max_conexoes))
+    sessao.mount('https://', adaptador)
+    sessao.mount('http://', adaptador)
+    return sessao
+
+
+def configurar_sessao(max_conexoes: int = MAX_CONEXOES) -> requests.Session:
+    """
+    Recria a sessão compartilhada com um pool de `max_conexoes` conexões por host.
+
+    Deve ser chamada antes de iniciar os downloads, com a concorrência desejada.
+    """
+    global _sessao
+    with _trava:
+        if _sessao is not None:
+            _sessao.close()
+        _sessao = _criar_sessao(max_conexoes)
+        return _sessao
+
+
+def obter_sessao() -> requests.Session:
+    """Retorna a sessão compartilhada, criando-a na primeira chamada."""
+    global _sessao
+    if _sessao is None:
+        with _trava:
+            if _sessao is None:
+                _sessao = _criar_sessao(MAX_CONEXOES)
+    return _sessao
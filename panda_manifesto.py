@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Checksums calculados durante o download e manifesto de verificação por pasta.
+
+Cada download concluído é registrado em `<pasta>/.panda_manifesto.json` com
+tamanho e checksum (SHA-256 por padrão, ou BLAKE2b com PANDA_CHECKSUM=blake2b).
+Com isso, uma nova execução ou a limpeza dos scripts bash confia nos arquivos
+terminados comparando apenas o tamanho, sem reler o conteúdo do disco.
+
+Uso pela linha de comando (não precisa da chave da API):
+  python3 panda_manifesto.py incompletos PASTA   # lista arquivos que não são confiáveis
+  python3 panda_manifesto.py verificar PASTA     # relê os arquivos e confere os checksums
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+ALGORITMO_CHECKSUM = os.getenv('PANDA_CHECKSUM', 'sha256')
+NOME_MANIFESTO = '.panda_manifesto.json'
+# Arquivos fora do manifesto abaixo deste tamanho são considerados incompletos
+TAMANHO_MINIMO_SEM_MANIFESTO = 10 * 1024 * 1024  # 10 MiB
+TAMANHO_LEITURA = 1024 * 1024  # 1 MiB
+
+_trava_manifesto = threading.Lock()
+
+
+class HashIncremental:
+    """
+    Calcula o checksum de um arquivo enquanto ele é baixado.
+
+    Blocos que chegam exatamente na posição seguinte à já processada são usados
+    direto da memória. Blocos gravados mais adiante (outros intervalos de um
+    download segmentado) são lidos do arquivo parcial depois, com `alcancar`,
+    quando a região anterior estiver completa.
+    """
+
+    def __init__(self, caminho_parcial: str, algoritmo: str = ALGORITMO_CHECKSUM):
+        self.caminho_parcial = caminho_parcial
+        self.algoritmo = algoritmo
+        self.posicao = 0
+        self._hash = hashlib.new(algoritmo)
+        self._trava = threading.Lock()
+
+    def alimentar(self, posicao: int, dados: bytes) -> None:
+        """
+        Recebe um bloco gravado em `posicao`; só é usado se for o próximo da sequência.
+
+        Nunca espera: se `alcancar` estiver lendo o arquivo em outra thread, o
+        bloco é ignorado e será lido do disco na próxima chamada de `alcancar`.
+        """
+        if not self._trava.acquire(blocking=False):
+            return
+        try:
+            if posicao == self.posicao:
+                self._hash.update(dados)
+                self.posicao += len(dados)
+        finally:
+            self._trava.release()
+
+    def alcancar(self, fronteira: int) -> None:
+        """Processa o que já está gravado no arquivo parcial até `fronteira`."""
+        with self._trava:
+            if self.posicao >= fronteira:
+                return
+            with open(self.caminho_parcial, 'rb') as f:
+                f.seek(self.posicao)
+                while self.posicao < fronteira:
+                    dados = f.read(min(TAMANHO_LEITURA, fronteira - self.posicao))
+                    if not dados:
+                        break
+                    self._hash.update(dados)
+                    self.posicao += len(dados)
+
+    def checksum(self) -> str:
+        """Checksum no formato `algoritmo:hex`."""
+        return f"{self.algoritmo}:{self._hash.hexdigest()}"
+
+
+def calcular_checksum_arquivo(caminho: str, algoritmo: str = ALGORITMO_CHECKSUM) -> str:
+    """Calcula o checksum de um arquivo já gravado, no formato `algoritmo:hex`."""
+    hash_arquivo = hashlib.new(algoritmo)
+    with open(caminho, 'rb') as f:
+        for dados in iter(lambda: f.read(TAMANHO_LEITURA), b''):
+            hash_arquivo.update(dados)
+    return f"{algoritmo}:{hash_arquivo.hexdigest()}"
+
+
+def _caminho_manifesto(pasta: str) -> str:
+    return os.path.join(pasta, NOME_MANIFESTO)
+
+
+def carregar_manifesto(pasta: str) -> Dict[str, Dict[str, Any]]:
+    """Retorna {nome_arquivo: {tamanho, checksum, concluido_em}} da pasta."""
+    try:
+        with open(_caminho_manifesto(pasta), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def registrar_no_manifesto(caminho: str, tamanho: int, checksum: str) -> None:
+    """Adiciona (ou atualiza) um arquivo concluído no manifesto da sua pasta."""
+    pasta, nome = os.path.split(os.path.abspath(caminho))
+    with _trava_manifesto:
+        manifesto = carregar_manifesto(pasta)
+        manifesto[nome] = {'tamanho': tamanho, 'checksum': checksum, 'concluido_em': time.time()}
+        temporario = _caminho_manifesto(pasta) + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(manifesto, f, ensure_ascii=False, indent=1)
+        os.replace(temporario, _caminho_manifesto(pasta))
+
+
+def obter_checksum(caminho: str) -> Optional[str]:
+    """Checksum registrado no manifesto para `caminho`, se houver."""
+    pasta, nome = os.path.split(os.path.abspath(caminho))
+    return carregar_manifesto(pasta).get(nome, {}).get('checksum')
+
+
+def tamanho_confere(caminho: str) -> bool:
+    """False se o arquivo consta no manifesto com outro tamanho (truncado ou sobrescrito)."""
+    pasta, nome = os.path.split(os.path.abspath(caminho))
+    registro = carregar_manifesto(pasta).get(nome)
+    return registro is None or registro['tamanho'] == os.path.getsize(caminho)
+
+
+def listar_incompletos(pasta: str) -> List[str]:
+    """
+    Lista os vídeos da pasta que não podem ser considerados completos.
+
+    Arquivos no manifesto são confiáveis se o tamanho bater (sem reler o
+    conteúdo). Arquivos fora dele, baixados antes do manifesto existir, seguem
+    a regra antiga: abaixo de 10 MB são tratados como incompletos.
+    """
+    manifesto = carregar_manifesto(pasta)
+    incompletos = []
+    for nome in sorted(os.listdir(pasta)):
+        if '.mp4' not in nome or '.part' in nome:
+            continue
+        caminho = os.path.join(pasta, nome)
+        tamanho = os.path.getsize(caminho)
+        registro = manifesto.get(nome)
+        if registro is not None:
+            if registro['tamanho'] != tamanho:
+                incompletos.append(caminho)
+        elif tamanho < TAMANHO_MINIMO_SEM_MANIFESTO:
+            incompletos.append(caminho)
+    return incompletos
+
+
+def verificar_pasta(pasta: str) -> List[str]:
+    """Relê os arquivos do manifesto e retorna os que não conferem com o checksum registrado."""
+    divergentes = []
+    for nome, registro in sorted(carregar_manifesto(pasta).items()):
+        caminho = os.path.join(pasta, nome)
+        if not os.path.exists(caminho):
+            continue
+        algoritmo = registro['checksum'].split(':', 1)[0]
+        if calcular_checksum_arquivo(caminho, algoritmo) != registro['checksum']:
+            divergentes.append(caminho)
+    return divergentes
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in ('incompletos', 'verificar'):
+        print("Uso: python3 panda_manifesto.py {incompletos|verificar} PASTA", file=sys.stderr)
+        sys.exit(2)
+    comando, pasta_alvo = sys.argv[1], sys.argv[2]
+    if not os.path.isdir(pasta_alvo):
+        sys.exit(0)
+    resultado = listar_incompletos(pasta_alvo) if comando == 'incompletos' else verificar_pasta(pasta_alvo)
+    for caminho_arquivo in resultado:
+        print(caminho_arquivo)
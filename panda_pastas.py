@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Hierarquia de pastas reconstruída a partir da listagem plana de GET /folders.
+
+Cada pasta da listagem traz o id da pasta pai (`parent_folder_id` ou
+`parent_id`). `ArvorePastas` percorre a listagem uma única vez e monta os
+índices de filhos, caminho e profundidade; daí em diante, as subpastas de
+uma pasta saem do mapa de filhos, sem nova consulta à API nem varredura de
+todas as pastas.
+"""
+
+from typing import Any, Dict, List, Optional
+
+
+def id_pasta_pai(pasta: Dict[str, Any]) -> Optional[str]:
+    """Id da pasta pai, ou None para pastas na raiz da conta."""
+    pai = pasta.get('parent_folder_id') or pasta.get('parent_id')
+    return str(pai) if pai else None
+
+
+class ArvorePastas:
+    """Índice em memória da hierarquia de pastas da conta."""
+
+    def __init__(self, pastas: List[Dict[str, Any]]):
+        # Listagem de origem, para saber se o índice ainda corresponde a ela
+        self.origem = pastas
+        self.pastas: Dict[str, Dict[str, Any]] = {}
+        # id -> ids das subpastas diretas, na ordem da listagem (None = raiz)
+        self.filhos: Dict[Optional[str], List[str]] = {}
+        self.pais: Dict[str, Optional[str]] = {}
+        for pasta in pastas:
+            if pasta.get('id'):
+                pasta_id = str(pasta['id'])
+                self.pastas[pasta_id] = pasta
+                self.pais[pasta_id] = id_pasta_pai(pasta)
+        for pasta_id, pai in self.pais.items():
+            # Pai fora da listagem: a pasta é tratada como raiz
+            self.filhos.setdefault(pai if pai in self.pastas else None, []).append(pasta_id)
+
+        # Caminho e profundidade em largura a partir das raízes; pastas em ciclo ficam de fora
+        self.caminhos: Dict[str, str] = {}
+        self.profundidades: Dict[str, int] = {}
+        fila = [(pasta_id, '', 0) for pasta_id in self.filhos.get(None, [])]
+        for pasta_id, prefixo, profundidade in fila:
+            caminho = f"{prefixo}/{self.pastas[pasta_id].get('name', pasta_id)}"
+            self.caminhos[pasta_id] = caminho
+            self.profundidades[pasta_id] = profundidade
+            fila.extend((filho, caminho, profundidade + 1) for filho in self.filhos.get(pasta_id, []))
+
+    @property
+    def hierarquica(self) -> bool:
+        """Se a listagem informa pastas pai (há ao menos uma pasta fora da raiz)."""
+        return any(pai in self.pastas for pai in self.pais.values())
+
+    def obter(self, pasta_id: str) -> Optional[Dict[str, Any]]:
+        return self.pastas.get(str(pasta_id))
+
+    def subpastas(self, pasta_id: str) -> List[Dict[str, Any]]:
+        """Subpastas diretas de `pasta_id`, na ordem da listagem."""
+        return [self.pastas[filho] for filho in self.filhos.get(str(pasta_id), [])]
+
+    def caminho(self, pasta_id: str) -> Optional[str]:
+        """Caminho da pasta a partir da raiz, ex.: '/Curso/Módulo 1'."""
+        return self.caminhos.get(str(pasta_id))
+
+    def profundidade(self, pasta_id: str) -> Optional[int]:
+        """Profundidade da pasta (0 para pastas na raiz)."""
+        return self.profundidades.get(str(pasta_id))
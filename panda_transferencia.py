@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Motor de transferência HTTP usado pelos downloaders do Panda Videos.
+
+Quando o servidor informa o tamanho do arquivo e aceita requisições com
+`Range`, o arquivo é dividido em intervalos de bytes baixados em conexões
+paralelas, cada um gravado na sua posição do arquivo de saída. Caso
+contrário, o download é feito em um único stream.
+
+O download é feito em `<arquivo>.part`, acompanhado de um registro de estado
+`<arquivo>.part.json` (URL, tamanho, ETag e bytes concluídos por intervalo).
+Se a transferência for interrompida, a próxima execução continua de onde
+parou; o arquivo só recebe o nome final quando está completo.
+
+Todas as leituras de corpo passam por `limitador_banda`, um token bucket
+global que limita a taxa agregada do processo (`--max-rate` / PANDA_MAX_RATE).
+
+O checksum do arquivo é calculado enquanto os bytes chegam (ver
+`panda_manifesto.HashIncremental`). Ao concluir, o tamanho é conferido com o
+Content-Length e o arquivo é registrado no manifesto da pasta.
+"""
+
+import os
+import re
+import json
+import time
+import threading
+import requests
+import urllib3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from panda_http import obter_sessao, notificar_falha
+from panda_manifesto import HashIncremental, registrar_no_manifesto
+
+# Número de conexões paralelas por arquivo
+CONEXOES_POR_DOWNLOAD = int(os.getenv('PANDA_CONEXOES', '4'))
+# Tamanho dos blocos lidos do socket
+TAMANHO_CHUNK = 1024 * 1024  # 1 MiB
+# Menor bloco lido quando há limite de banda
+TAMANHO_CHUNK_MINIMO = 16 * 1024  # 16 KiB
+# Arquivos menores que isso não compensam a divisão em intervalos
+TAMANHO_MINIMO_SEGMENTO = 8 * 1024 * 1024  # 8 MiB
+# Intervalo mínimo entre gravações do registro de estado
+INTERVALO_SALVAR_ESTADO = 1.0  # segundos
+
+SUFIXO_PARCIAL = '.part'
+SUFIXO_ESTADO = '.part.json'
+
+TIMEOUT = (10, 60)
+
+
+class RangeNaoSuportado(Exception):
+    """O servidor ignorou o cabeçalho Range e devolveu o arquivo inteiro."""
+
+
+def interpretar_taxa(texto: str) -> float:
+    """Converte taxas como '40M', '512K', '1.5GB/s' ou '0' (sem limite) em bytes/s."""
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([KMG]?)(?:I?B)?(?:/S)?\s*$', str(texto).upper())
+    if not match:
+        raise ValueError(f"Taxa inválida: {texto}")
+    multiplicador = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}[match.group(2)]
+    return float(match.group(1)) * multiplicador
+
+
+class LimitadorBanda:
+    """
+    Token bucket compartilhado por todas as transferências do processo.
+
+    `taxa` é o limite em bytes/s (0 = sem limite) e `rajada` o volume que pode
+    ser lido de uma vez depois de um período ocioso. Cada leitor reserva o
+    bloco antes de ler do socket; se o balde não tiver bytes suficientes, ele
+    fica devendo e espera o tempo proporcional à dívida. Assim os dados ficam
+    no servidor (janela TCP) em vez de acumular nos buffers locais.
+    """
+
+    def __init__(self, taxa: float = 0.0, rajada: Optional[float] = None):
+        self._trava = threading.Lock()
+        self.ajustar(taxa, rajada)
+
+    def ajustar(self, taxa: float, rajada: Optional[float] = None) -> None:
+        """Altera o limite (pode ser chamado durante os downloads)."""
+        with self._trava:
+            self.taxa = max(0.0, float(taxa))
+            self.rajada = float(rajada) if rajada else max(self.taxa, TAMANHO_CHUNK_MINIMO)
+            self._tokens = self.rajada
+            self._atualizado = time.monotonic()
+
+    def tamanho_bloco(self) -> int:
+        """Tamanho de leitura adequado ao limite atual (~1/20 s de dados)."""
+        if not self.taxa:
+            return TAMANHO_CHUNK
+        return int(min(TAMANHO_CHUNK, max(TAMANHO_CHUNK_MINIMO, self.taxa / 20)))
+
+    def reservar(self, n: int) -> float:
+        """Reserva `n` bytes e retorna quantos segundos é preciso esperar antes de lê-los."""
+        with self._trava:
+            if self.taxa <= 0:
+                return 0.0
+            agora = time.monotonic()
+            self._tokens = min(self.rajada, self._tokens + (agora - self._atualizado) * self.taxa)
+            self._atualizado = agora
+            self._tokens -= n
+            return -self._tokens / self.taxa if self._tokens < 0 else 0.0
+
+    def devolver(self, n: int) -> None:
+        """Devolve bytes reservados e não lidos (fim do corpo)."""
+        with self._trava:
+            if self.taxa > 0:
+                self._tokens = min(self.rajada, self._tokens + n)
+
+    def consumir(self, n: int) -> None:
+        """Reserva `n` bytes e bloqueia a thread até que possam ser lidos."""
+        espera = self.reservar(n)
+        if espera > 0:
+            time.sleep(espera)
+
+
+# Limite global de banda do processo
+limitador_banda = LimitadorBanda(interpretar_taxa(os.getenv('PANDA_MAX_RATE', '0')))
+
+# Funções notificadas com o número de bytes de cada bloco recebido
+observadores_bytes: List[Callable[[int], None]] = []
+
+
+def ler_com_limite(response, limitador: Optional[LimitadorBanda] = None) -> Iterator[bytes]:
+    """Itera sobre o corpo de uma resposta `stream=True`, respeitando o limite de banda."""
+    limitador = limitador or limitador_banda
+    bloco = limitador.tamanho_bloco()
+    blocos = response.iter_content(chunk_size=bloco)
+    while True:
+        limitador.consumir(bloco)
+        try:
+            chunk = next(blocos, None)
+        except requests.exceptions.RequestException:
+            notificar_falha("falha na leitura")
+            raise
+        if chunk is None:
+            limitador.devolver(bloco)
+            return
+        if len(chunk) < bloco:
+            limitador.devolver(bloco - len(chunk))
+        if chunk:
+            for observador in observadores_bytes:
+                observador(len(chunk))
+            yield chunk
+
+
+def ler_para_buffer(response, buffer: memoryview, limitador: Optional[LimitadorBanda] = None) -> int:
+    """
+    Lê o próximo trecho do corpo de uma resposta `stream=True` direto em `buffer`
+    (readinto, sem criar objetos bytes), respeitando o limite de banda.
+
+    O corpo é lido como veio do servidor, sem descomprimir, para que a contagem
+    corresponda ao Content-Length; corpos com Content-Encoding devem ser lidos
+    com `ler_com_limite`.
+
+    Returns:
+        Bytes lidos; 0 no fim do corpo
+    """
+    limitador = limitador or limitador_banda
+    bloco = min(len(buffer), limitador.tamanho_bloco())
+    limitador.consumir(bloco)
+    response.raw.decode_content = False
+    try:
+        lidos = response.raw.readinto(buffer[:bloco])
+    except urllib3.exceptions.HTTPError as e:
+        notificar_falha("falha na leitura")
+        raise requests.exceptions.ConnectionError(e) from e
+    if lidos < bloco:
+        limitador.devolver(bloco - lidos)
+    if lidos:
+        for observador in observadores_bytes:
+            observador(lidos)
+    return lidos
+
+
+def obter_info_remota(url: str) -> Tuple[str, int, bool, str]:
+    """
+    Consulta o arquivo remoto via HEAD.
+
+    Returns:
+        Tupla (url final após redirecionamentos, tamanho em bytes, aceita ranges, ETag)
+    """
+    response = obter_sessao().head(url, allow_redirects=True, timeout=TIMEOUT)
+    total = int(response.headers.get('content-length', 0))
+    aceita_ranges = response.headers.get('accept-ranges', '').lower() == 'bytes'
+    etag = response.headers.get('etag', '')
+    return response.url or url, total, aceita_ranges, etag
+
+
+def dividir_intervalos(total: int, conexoes: int) -> List[Tuple[int, int]]:
+    """Divide `total` bytes em até `conexoes` intervalos inclusivos (inicio, fim)."""
+    conexoes = max(1, min(conexoes, total // TAMANHO_MINIMO_SEGMENTO or 1))
+    tamanho = -(-total // conexoes)
+    return [(inicio, min(inicio + tamanho, total) - 1) for inicio in range(0, total, tamanho)]
+
+
+class EstadoParcial:
+    """Registro persistido de um download em andamento (`<arquivo>.part.json`)."""
+
+    def __init__(self, caminho: str, dados: Dict[str, Any]):
+        self.caminho_estado = caminho + SUFIXO_ESTADO
+        self.dados = dados
+        self._trava = threading.Lock()
+        self._ultimo_salvamento = 0.0
+
+    @classmethod
+    def carregar(cls, caminho: str, total: int, etag: str) -> Optional['EstadoParcial']:
+        """Carrega o estado salvo se ele ainda corresponder ao arquivo remoto."""
+        caminho_estado = caminho + SUFIXO_ESTADO
+        if not (os.path.exists(caminho_estado) and os.path.exists(caminho + SUFIXO_PARCIAL)):
+            return None
+        try:
+            with open(caminho_estado, 'r', encoding='utf-8') as f:
+                dados = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if dados.get('total') != total or (etag and dados.get('etag') and dados['etag'] != etag):
+            return None
+        if os.path.getsize(caminho + SUFIXO_PARCIAL) != total:
+            return None
+        return cls(caminho, dados)
+
+    @property
+    def baixados(self) -> int:
+        return sum(concluido for _, _, concluido in self.dados['intervalos'])
+
+    def fronteira_contigua(self) -> int:
+        """Posição até a qual o arquivo parcial está completo, sem lacunas."""
+        with self._trava:
+            for inicio, fim, concluido in self.dados['intervalos']:
+                if inicio + concluido <= fim:
+                    return inicio + concluido
+            return self.dados['total']
+
+    def avancar(self, indice: int, n: int) -> None:
+        """Registra `n` bytes gravados no intervalo `indice` e salva periodicamente."""
+        with self._trava:
+            self.dados['intervalos'][indice][2] += n
+            if time.time() - self._ultimo_salvamento >= INTERVALO_SALVAR_ESTADO:
+                self._salvar()
+
+    def salvar(self) -> None:
+        with self._trava:
+            self._salvar()
+
+    def _salvar(self) -> None:
+        temporario = self.caminho_estado + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(self.dados, f)
+        os.replace(temporario, self.caminho_estado)
+        self._ultimo_salvamento = time.time()
+
+    def remover(self) -> None:
+        if os.path.exists(self.caminho_estado):
+            os.remove(self.caminho_estado)
+
+
+def _baixar_intervalo(url: str, caminho_parcial: str, estado: EstadoParcial, indice: int,
+                      progresso: Callable[[int], None], hash_incremental: HashIncremental) -> None:
+    """Baixa o que falta do intervalo `indice` e grava no deslocamento correspondente."""
+    inicio, fim, concluido = estado.dados['intervalos'][indice]
+    posicao = inicio + concluido
+    if posicao > fim:
+        return
+    headers_range = {'Range': f'bytes={posicao}-{fim}'}
+    with obter_sessao().get(url, headers=headers_range, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise RangeNaoSuportado(f"status {response.status_code} para bytes={posicao}-{fim}")
+        # Sem buffer: o estado só avança depois que os bytes chegaram ao sistema operacional
+        with open(caminho_parcial, 'r+b', buffering=0) as f:
+            f.seek(posicao)
+            for chunk in ler_com_limite(response):
+                if chunk:
+                    f.write(chunk)
+                    estado.avancar(indice, len(chunk))
+                    hash_incremental.alimentar(posicao, chunk)
+                    posicao += len(chunk)
+                    progresso(len(chunk))
+    concluido = estado.dados['intervalos'][indice][2]
+    if inicio + concluido != fim + 1:
+        raise IOError(f"Intervalo {inicio}-{fim} incompleto: {concluido} de {fim - inicio + 1} bytes")
+    # Os intervalos seguintes já gravados passam a ser contíguos: o checksum avança sobre eles
+    hash_incremental.alcancar(estado.fronteira_contigua())
+
+
+def _baixar_stream_unico(url: str, caminho_parcial: str, progresso: Callable[[int], None],
+                         hash_incremental: HashIncremental) -> int:
+    """Baixa o arquivo inteiro em uma única conexão."""
+    recebidos = 0
+    with obter_sessao().get(url, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+        with open(caminho_parcial, 'wb') as f:
+            for chunk in ler_com_limite(response):
+                if chunk:
+                    f.write(chunk)
+                    hash_incremental.alimentar(recebidos, chunk)
+                    recebidos += len(chunk)
+                    progresso(len(chunk))
+    return recebidos
+
+
+def concluir_download(caminho: str, total: int, hash_incremental: HashIncremental) -> int:
+    """
+    Confere o tamanho do arquivo parcial, move-o para o nome final de forma
+    atômica e registra tamanho e checksum no manifesto da pasta.
+
+    Returns:
+        Número de bytes do arquivo final
+    """
+    caminho_parcial = caminho + SUFIXO_PARCIAL
+    tamanho = os.path.getsize(caminho_parcial)
+    if total and tamanho != total:
+        raise IOError(f"Download incompleto: {tamanho} de {total} bytes")
+    hash_incremental.alcancar(tamanho)
+    os.replace(caminho_parcial, caminho)
+    registrar_no_manifesto(caminho, tamanho, hash_incremental.checksum())
+    return tamanho
+
+
+def baixar_arquivo(url: str, caminho: str, total: int = 0, aceita_ranges: bool = False,
+                   etag: str = '', progresso: Optional[Callable[[int], None]] = None,
+                   conexoes: int = CONEXOES_POR_DOWNLOAD) -> int:
+    """
+    Baixa `url` para `caminho`, em intervalos paralelos e retomáveis quando possível.
+
+    Args:
+        url: URL do arquivo
+        caminho: Caminho final do arquivo de saída
+        total: Tamanho informado pelo HEAD (0 se desconhecido)
+        aceita_ranges: Se o servidor anunciou `Accept-Ranges: bytes`
+        etag: ETag informado pelo HEAD, usado para validar a retomada
+        progresso: Função chamada com o número de bytes recebidos a cada bloco
+            (com um valor negativo quando bytes já informados são descartados)
+        conexoes: Número máximo de conexões paralelas
+
+    Returns:
+        Número de bytes do arquivo final (o checksum fica no manifesto da pasta)
+    """
+    progresso = progresso or (lambda n: None)
+    caminho_parcial = caminho + SUFIXO_PARCIAL
+    hash_incremental = HashIncremental(caminho_parcial)
+
+    if not (total > 0 and aceita_ranges):
+        # Sem tamanho ou sem suporte a Range não há como retomar
+        _baixar_stream_unico(url, caminho_parcial, progresso, hash_incremental)
+        return concluir_download(caminho, total, hash_incremental)
+
+    estado = EstadoParcial.carregar(caminho, total, etag)
+    if estado:
+        print(f"⏯️ Retomando download parcial ({estado.baixados} de {total} bytes já baixados)")
+        progresso(estado.baixados)
+    else:
+        estado = EstadoParcial(caminho, {
+            'url': url,
+            'total': total,
+            'etag': etag,
+            'intervalos': [[inicio, fim, 0] for inicio, fim in dividir_intervalos(total, conexoes)],
+        })
+        # Pré-aloca o arquivo para que cada intervalo grave na sua posição
+        with open(caminho_parcial, 'wb') as f:
+            f.truncate(total)
+    estado.dados['url'] = url
+    estado.salvar()
+
+    trava = threading.Lock()
+
+    def progresso_seguro(n: int) -> None:
+        with trava:
+            progresso(n)
+
+    pendentes = [i for i, (inicio, fim, concluido) in enumerate(estado.dados['intervalos'])
+                 if inicio + concluido <= fim]
+    if len(pendentes) > 1:
+        print(f"🔀 Download segmentado em {len(pendentes)} conexões")
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, len(pendentes))) as executor:
+            futuros = [
+                executor.submit(_baixar_intervalo, url, caminho_parcial, estado, indice, progresso_seguro,
+                                hash_incremental)
+                for indice in pendentes
+            ]
+            for futuro in futuros:
+                futuro.result()
+    except RangeNaoSuportado as e:
+        print(f"⚠️ Servidor não respeitou o Range ({e}). Usando conexão única...")
+        # O executor já esperou todos os intervalos: descarta o que eles informaram
+        progresso(-estado.baixados)
+        estado.remover()
+        hash_incremental = HashIncremental(caminho_parcial)
+        _baixar_stream_unico(url, caminho_parcial, progresso, hash_incremental)
+        return concluir_download(caminho, total, hash_incremental)
+    finally:
+        if os.path.exists(estado.caminho_estado):
+            estado.salvar()
+
+    tamanho = concluir_download(caminho, total, hash_incremental)
+    estado.remover()
+    return tamanho
@@ -10,14 +10,20 @@ from panda_downloader import (
     baixar_video, 
     baixar_todos_videos,
     baixar_video_oficial,
+    obter_info_video,
     identificar_subpastas,
+    sincronizar_catalogo,
     headers,
     BASE_URL,
     API_KEY,
     formatar_tamanho
 )
 from dotenv import load_dotenv
-import requests
+from panda_http import obter_sessao
+from panda_estado import registrar_download, obter_concluidos, obter_download
+from panda_manifesto import obter_checksum, tamanho_confere
+from panda_cache import cache_listagens
+from panda_catalogo import catalogo_sincronizado
 
 # Configurações da página
 st.set_page_config(
@@ -65,9 +71,9 @@ def verificar_autenticacao_st():
             st.error("🔑 API KEY não está definida! Configure o arquivo .env com sua PANDA_API_KEY")
             return False
         
-        endpoint = f'{BASE_URL}/videos'
+        endpoint = f'{BASE_URL}/videos?limit=1'
         try:
-            response = requests.get(endpoint, headers=headers)
+            response = obter_sessao().get(endpoint, headers=headers)
             if response.status_code == 200:
                 st.success("✅ Autenticação realizada com sucesso!")
                 return True
@@ -84,15 +90,9 @@ def baixar_video_st(video_id, pasta_destino="downloads", status_container=None):
     if status_container is None:
         status_container = st.empty()
     
-    # Obter informações do vídeo
-    endpoint = f'{BASE_URL}/videos/{video_id}'
+    # Obter informações do vídeo (do cache compartilhado com os métodos de download)
     try:
-        response = requests.get(endpoint, headers=headers)
-        if response.status_code != 200:
-            status_container.error(f"❌ Erro ao obter informações do vídeo: {response.status_code}")
-            return False
-        
-        video_info = response.json()
+        video_info = obter_info_video(video_id)
         titulo = video_info.get('title', f'video_{video_id}')
         
         # Criar diretório se não existir
@@ -105,11 +105,10 @@ def baixar_video_st(video_id, pasta_destino="downloads", status_container=None):
         resultado = baixar_video(video_id, pasta_destino)
         
         if resultado:
-            nome_arquivo = f"{titulo.replace(' ', '_')}.mp4"
-            caminho_completo = os.path.join(pasta_destino, nome_arquivo)
-            if os.path.exists(caminho_completo):
-                tamanho = os.path.getsize(caminho_completo)
-                status_container.success(f"✅ Download concluído: {nome_arquivo} ({formatar_tamanho(tamanho)})")
+            registro = obter_download(video_id, pasta_destino)
+            if registro:
+                nome_arquivo = os.path.basename(registro['caminho'])
+                status_container.success(f"✅ Download concluído: {nome_arquivo} ({formatar_tamanho(registro['tamanho'] or 0)})")
             else:
                 status_container.success(f"✅ Download concluído, mas não foi possível encontrar o arquivo localmente.")
             return True
@@ -134,14 +133,22 @@ def baixar_todos_videos_st(videos, pasta_destino="downloads"):
     
     # Verificar vídeos já baixados
     st.info(f"🔍 Verificando {len(videos)} vídeos...")
+    concluidos = obter_concluidos([video['id'] for video in videos], pasta_destino)
     videos_para_baixar = []
     for video in videos:
         titulo = video.get('title', f"video_{video['id']}")
+        registro = concluidos.get(str(video['id']))
+        if registro:
+            st.info(f"⚠️ Vídeo '{titulo}' já baixado ({formatar_tamanho(registro['tamanho'] or 0)})")
+            continue
+        
         nome_arquivo = f"{titulo.replace(' ', '_')}.mp4"
         caminho_completo = os.path.join(pasta_destino, nome_arquivo)
         
-        if os.path.exists(caminho_completo):
+        if os.path.exists(caminho_completo) and tamanho_confere(caminho_completo):
             tamanho = os.path.getsize(caminho_completo)
+            registrar_download(video['id'], pasta_destino, caminho_completo, tamanho, 'existente', titulo,
+                               obter_checksum(caminho_completo))
             st.info(f"⚠️ Vídeo '{titulo}' já existe ({formatar_tamanho(tamanho)})")
         else:
             videos_para_baixar.append(video)
@@ -257,6 +264,9 @@ def pagina_inicio():
 def pagina_listar_pastas():
     st.markdown("# 📁 Pastas Disponíveis")
     st.button("← Voltar", on_click=lambda: st.session_state.update({"pagina": "inicio"}))
+    # As listagens vêm do catálogo local ou do cache; este botão força uma nova consulta à API
+    st.button("🔄 Atualizar listagens",
+              on_click=sincronizar_catalogo if catalogo_sincronizado() else cache_listagens.invalidar)
     
     # Listar pastas
     with st.spinner("Carregando pastas..."):
@@ -10,6 +10,8 @@ import os
 import time
 import requests
 from dotenv import load_dotenv
+from panda_http import obter_sessao
+from panda_agendador import espera_backoff
 
 # Carrega variáveis de ambiente do arquivo .env
 load_dotenv()
@@ -18,7 +20,6 @@ load_dotenv()
 FOLDER_ID = "9efa86d7-ea1c-40cd-b445-094c53677846"
 API_KEY = os.getenv('PANDA_API_KEY')
 MAX_TENTATIVAS = 3
-TEMPO_ESPERA = 3  # segundos
 
 print(f"Testando API com a chave: {API_KEY[:10]}...")
 
@@ -32,13 +33,16 @@ headers = {
 def fazer_requisicao(url, metodo="GET", dados=None, tentativas=MAX_TENTATIVAS):
     """
     Faz uma requisição à API com suporte a múltiplas tentativas
+
+    Respostas de limite (429) são repetidas pela sessão, no ritmo pedido pela
+    API; falhas de rede e erros 5xx aguardam um backoff exponencial com jitter.
     """
     for tentativa in range(1, tentativas + 1):
         try:
             if metodo.upper() == "GET":
-                response = requests.get(url, headers=headers, timeout=30)
+                response = obter_sessao().get(url, headers=headers, timeout=30)
             elif metodo.upper() == "POST":
-                response = requests.post(
+                response = obter_sessao().post(
                     url, headers=headers, json=dados, timeout=30
                 )
             else:
@@ -51,12 +55,16 @@ def fazer_requisicao(url, metodo="GET", dados=None, tentativas=MAX_TENTATIVAS):
             erro = f"Tentativa {tentativa}/{tentativas}: {e}"
             print(f"⚠️ {erro}")
             
+            resposta = getattr(e, "response", None)
+            if resposta is not None and resposta.status_code < 500:
+                # Erro do cliente (401, 404...): repetir não adianta
+                break
             if tentativa < tentativas:
-                tempo = TEMPO_ESPERA * tentativa
-                print(f"Aguardando {tempo} segundos para tentar novamente...")
+                tempo = espera_backoff(tentativa)
+                print(f"Aguardando {tempo:.1f} segundos para tentar novamente...")
                 time.sleep(tempo)
             
-    return None, f"Falha após {tentativas} tentativas"
+    return None, f"Falha após {tentativa} tentativas"
 
 
 def testar_listar_pastas():
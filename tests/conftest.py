@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+"""
+Configuração comum dos testes.
+
+Os módulos leem a configuração (PANDA_*) ao serem importados; por isso os
+bancos e diretórios de trabalho apontam para uma pasta temporária antes de
+qualquer import, para que os testes não toquem nos arquivos do usuário.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+_PASTA_TESTES = tempfile.mkdtemp(prefix='panda_testes-')
+os.environ.update({
+    'PANDA_API_KEY': 'teste',
+    'PANDA_ESTADO_DB': os.path.join(_PASTA_TESTES, 'estado.db'),
+    'PANDA_CACHE_HTTP': os.path.join(_PASTA_TESTES, 'cache.db'),
+    'PANDA_CATALOGO_DB': os.path.join(_PASTA_TESTES, 'catalogo.db'),
+    'PANDA_HLS_SCRATCH': os.path.join(_PASTA_TESTES, 'hls'),
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def servidor():
+    """Servidor simulado do benchmark (API, MP4 com Range e HLS), sem falhas."""
+    from panda_benchmark import ServidorSimulado
+    with ServidorSimulado(videos=2, tamanho_video=3 * 1024 * 1024, segmentos=4,
+                          tamanho_segmento=64 * 1024) as simulado:
+        yield simulado
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+import time
+from email.utils import formatdate
+
+from panda_agendador import AgendadorRequisicoes, interpretar_retry_after
+
+URL = 'https://api.exemplo/videos'
+
+
+def test_interpretar_retry_after():
+    assert interpretar_retry_after('2') == 2.0
+    assert interpretar_retry_after('-1') == 0.0
+    assert interpretar_retry_after(None) is None
+    assert interpretar_retry_after('depois') is None
+    assert 8 < interpretar_retry_after(formatdate(time.time() + 10, usegmt=True)) <= 10
+
+
+def test_429_adia_as_proximas_requisicoes_do_host():
+    agendador = AgendadorRequisicoes()
+    assert agendador.registrar_resposta(URL, 200, {}) is None
+    assert agendador.reservar(URL) == 0
+    assert agendador.registrar_resposta(URL, 429, {'Retry-After': '5'}) == 5.0
+    assert 4 < agendador.reservar(URL) <= 5
+    assert agendador.reservar('https://cdn.exemplo/arquivo.mp4') == 0
+
+
+def test_cabecalhos_de_limite_espacam_as_requisicoes():
+    agendador = AgendadorRequisicoes()
+    assert agendador.registrar_resposta(URL, 200, {'X-RateLimit-Remaining': '4',
+                                                   'X-RateLimit-Reset': '2'}) is None
+    agendador.reservar(URL)
+    # Saldo de 4 requisições em 2 s: uma a cada 0,5 s
+    assert 0.4 < agendador.reservar(URL) <= 0.5
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+import aiohttp
+
+import panda_async
+import panda_transferencia
+from panda_benchmark import TAMANHO_BLOCO, _conteudo
+from panda_estado import obter_download
+from panda_manifesto import calcular_checksum_arquivo, obter_checksum
+from panda_transferencia import SUFIXO_ESTADO
+
+
+def _esperado(semente: int, total: int) -> bytes:
+    return b''.join(bytes(_conteudo(semente, inicio, min(TAMANHO_BLOCO, total - inicio)))
+                    for inicio in range(0, total, TAMANHO_BLOCO))
+
+
+def test_baixar_arquivo_em_intervalos(servidor, monkeypatch, tmp_path):
+    monkeypatch.setattr(panda_transferencia, 'TAMANHO_MINIMO_SEGMENTO', 1024 * 1024)
+    caminho = str(tmp_path / 'video.mp4')
+
+    async def baixar() -> int:
+        async with aiohttp.ClientSession() as sessao:
+            return await panda_async.baixar_arquivo(sessao, f'{servidor.url}/arquivos/bench-001.mp4', caminho,
+                                                    conexoes=3)
+
+    assert asyncio.run(baixar()) == servidor.tamanho_video
+    with open(caminho, 'rb') as f:
+        assert f.read() == _esperado(1, servidor.tamanho_video)
+    assert obter_checksum(caminho) == calcular_checksum_arquivo(caminho)
+    assert not os.path.exists(caminho + SUFIXO_ESTADO)
+
+
+@pytest.mark.parametrize('modo_download', ['redirect', 'json'])
+def test_baixar_todos_videos(servidor, monkeypatch, tmp_path, modo_download):
+    servidor.modo_download = modo_download
+    monkeypatch.setattr(panda_async, 'BASE_URL', servidor.url)
+    monkeypatch.setattr(panda_async, 'DOWNLOAD_URL', servidor.url)
+    videos = [{'id': video_id, 'title': video['title']} for video_id, video in servidor.videos.items()]
+    pasta = str(tmp_path / modo_download)
+
+    panda_async.baixar_todos_videos(videos, pasta, jobs=2)
+    for video in videos:
+        registro = obter_download(video['id'], pasta)
+        assert registro is not None
+        assert os.path.getsize(registro['caminho']) == servidor.tamanho_video
+    # Uma segunda rodada não baixa nada de novo
+    requisicoes = servidor.contagem['requisicoes']
+    panda_async.baixar_todos_videos(videos, pasta, jobs=2)
+    assert servidor.contagem['requisicoes'] == requisicoes
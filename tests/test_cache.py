@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+from panda_cache import CacheHTTP, CacheMetadados
+
+
+def test_cache_metadados_com_prazo_e_semeadura():
+    cache = CacheMetadados(ttl=60)
+    cache.semear([{'id': 'v1', 'title': 'Aula'}])
+    assert cache.obter('v1') == {'id': 'v1', 'title': 'Aula'}
+    # A listagem não traz os metadados completos
+    assert cache.obter('v1', completo=True) is None
+    cache.guardar('v1', {'id': 'v1', 'title': 'Aula', 'video_player': 'x'})
+    assert cache.obter('v1', completo=True)['video_player'] == 'x'
+    cache.invalidar('v1')
+    assert cache.obter('v1') is None
+
+    expirado = CacheMetadados(ttl=0)
+    expirado.guardar('v1', {'id': 'v1'})
+    assert expirado.obter('v1') is None
+
+
+def test_cache_http_dentro_do_prazo_e_revalidacao(servidor, tmp_path):
+    caminho = str(tmp_path / 'cache.db')
+    url = f'{servidor.url}/folders'
+    cache = CacheHTTP(ttl=60, caminho=caminho)
+
+    primeira = cache.obter_json(url, {'Authorization': 'a'})
+    assert primeira['folders'][0]['id'] == servidor.pasta['id']
+    assert cache.obter_json(url, {'Authorization': 'a'}) is primeira
+    assert servidor.contagem['requisicoes'] == 1
+
+    # Outra conta não reaproveita a resposta; revalidar sempre consulta
+    cache.obter_json(url, {'Authorization': 'b'})
+    cache.obter_json(url, {'Authorization': 'a'}, revalidar=True)
+    assert servidor.contagem['requisicoes'] == 3
+
+    # Persistido em disco para o próximo processo
+    assert CacheHTTP(ttl=60, caminho=caminho).obter_json(url, {'Authorization': 'a'}) == primeira
+    assert servidor.contagem['requisicoes'] == 3
+
+    cache.invalidar()
+    cache.obter_json(url, {'Authorization': 'a'})
+    assert servidor.contagem['requisicoes'] == 4
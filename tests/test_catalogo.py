@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+import panda_catalogo
+from panda_catalogo import (atualizar_catalogo, catalogo_sincronizado, listar_pastas_catalogo,
+                            listar_videos_catalogo, obter_pasta_catalogo)
+
+PASTAS = [{'id': 'curso', 'name': 'Curso'}, {'id': 'm1', 'name': 'Módulo 1', 'parent_folder_id': 'curso'}]
+
+
+def _videos(n: int):
+    return [{'id': f'v{i}', 'title': f'Aula {i}', 'folder_id': 'm1' if i % 2 else 'curso'} for i in range(n)]
+
+
+@pytest.fixture(autouse=True)
+def catalogo(monkeypatch, tmp_path):
+    monkeypatch.setattr(panda_catalogo, 'CAMINHO_CATALOGO', str(tmp_path / 'catalogo.db'))
+    monkeypatch.setattr(panda_catalogo, '_conexao', None)
+    monkeypatch.setattr(panda_catalogo, '_pastas_lidas', None)
+
+
+def test_sincronizacao_incremental():
+    assert catalogo_sincronizado() is None
+    videos = _videos(6)
+    resultado = atualizar_catalogo(PASTAS, [videos[:4], videos[4:]], total_videos=6)
+    assert resultado['pastas']['novas'] == 2
+    assert resultado['videos'] == {'novas': 6, 'alteradas': 0, 'removidas': 0, 'incompleta': 0}
+    assert catalogo_sincronizado() is not None
+    assert [v['id'] for v in listar_videos_catalogo('m1')] == ['v1', 'v3', 'v5']
+    assert obter_pasta_catalogo('m1')['name'] == 'Módulo 1'
+    assert listar_pastas_catalogo() == PASTAS
+
+    videos = _videos(5)
+    videos[0] = dict(videos[0], title='Aula editada')
+    resultado = atualizar_catalogo(PASTAS, [videos], total_videos=5)
+    assert resultado['videos'] == {'novas': 0, 'alteradas': 1, 'removidas': 1, 'incompleta': 0}
+    assert listar_videos_catalogo('curso')[0]['title'] == 'Aula editada'
+
+
+def test_listagem_incompleta_nao_remove_videos():
+    atualizar_catalogo(PASTAS, [_videos(6)])
+    resultado = atualizar_catalogo(PASTAS, [_videos(6)[:2]], total_videos=6)
+    assert resultado['videos']['incompleta'] == 1
+    assert resultado['videos']['removidas'] == 0
+    assert len(listar_videos_catalogo('m1')) == 3
+
+
+def test_catalogo_expirado_ou_desligado(monkeypatch):
+    atualizar_catalogo(PASTAS, [_videos(2)])
+    monkeypatch.setattr(panda_catalogo, 'TTL_CATALOGO', 60)
+    assert catalogo_sincronizado() is not None
+    monkeypatch.setattr(time, 'time', lambda: 10 ** 12)
+    assert catalogo_sincronizado() is None
+    monkeypatch.setattr(panda_catalogo, 'TTL_CATALOGO', 0)
+    assert catalogo_sincronizado() is not None
+    monkeypatch.setattr(panda_catalogo, 'USAR_CATALOGO', False)
+    assert catalogo_sincronizado() is None
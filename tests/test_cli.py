@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _cli(*argumentos: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, os.path.join(RAIZ, 'panda_cli.py'), *argumentos],
+                          capture_output=True, text=True, timeout=60)
+
+
+def test_adaptativo_e_recusado_com_o_motor_async():
+    resultado = _cli('todos-id', 'pasta', '--engine', 'async', '--adaptativo')
+    assert resultado.returncode == 2
+    assert 'só funciona com o motor sync' in resultado.stderr
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import panda_concorrencia
+import panda_http
+import panda_transferencia
+from panda_concorrencia import ControladorConcorrencia
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(panda_concorrencia.time, 'monotonic', lambda: agora[0])
+    return agora
+
+
+def _janela(controlador, relogio, n_bytes):
+    relogio[0] += controlador.janela
+    controlador.registrar_bytes(n_bytes)
+
+
+def test_aumento_aditivo_so_com_todas_as_vagas_ocupadas(relogio):
+    controlador = ControladorConcorrencia(maximo=4, inicial=2, janela=1.0)
+    # Com uma vaga livre a vazão subindo não abre outra
+    controlador.ativos = 1
+    _janela(controlador, relogio, 1000)
+    assert controlador.limite == 2
+
+    controlador.ativos = 2
+    _janela(controlador, relogio, 2000)
+    assert controlador.limite == 3
+    controlador.ativos = 3
+    _janela(controlador, relogio, 3000)
+    _janela(controlador, relogio, 4000)
+    # Nunca passa do máximo
+    controlador.ativos = 4
+    _janela(controlador, relogio, 5000)
+    assert controlador.limite == 4
+    assert controlador.metricas()['vazao_bytes_por_segundo'] == 5000
+
+
+def test_vazao_estavel_mantem_o_limite(relogio):
+    controlador = ControladorConcorrencia(maximo=8, inicial=2, janela=1.0)
+    controlador.ativos = 2
+    _janela(controlador, relogio, 1000)
+    _janela(controlador, relogio, 1020)
+    assert controlador.limite == 3
+    controlador.ativos = 3
+    _janela(controlador, relogio, 1030)
+    assert controlador.limite == 3
+
+
+def test_reducao_multiplicativa_uma_vez_por_janela(relogio):
+    controlador = ControladorConcorrencia(minimo=1, maximo=16, inicial=8, janela=1.0)
+    controlador.registrar_resposta(SimpleNamespace(status_code=429))
+    assert controlador.limite == 4
+    # Outras falhas na mesma janela não reduzem de novo
+    controlador.registrar_resposta(SimpleNamespace(status_code=503))
+    controlador.registrar_falha("timeout")
+    assert controlador.limite == 4
+    controlador.registrar_resposta(SimpleNamespace(status_code=200))
+
+    relogio[0] += 1.0
+    controlador.registrar_falha("timeout")
+    assert controlador.limite == 2
+    for _ in range(3):
+        relogio[0] += 1.0
+        controlador.registrar_falha("timeout")
+    # Nunca abaixo do mínimo
+    assert controlador.limite == 1
+
+
+def test_queda_da_vazao_por_conexao_reduz(relogio):
+    controlador = ControladorConcorrencia(maximo=8, inicial=4, janela=1.0)
+    controlador.ativos = 2
+    _janela(controlador, relogio, 4000)
+    controlador.ativos = 4
+    _janela(controlador, relogio, 1000)
+    assert controlador.limite == 2
+
+
+def test_adquirir_respeita_o_limite():
+    controlador = ControladorConcorrencia(maximo=4, inicial=1)
+    entrou = threading.Event()
+
+    def segundo():
+        with controlador:
+            entrou.set()
+
+    with controlador:
+        thread = threading.Thread(target=segundo)
+        thread.start()
+        assert not entrou.wait(0.2)
+    assert entrou.wait(5)
+    thread.join()
+    assert controlador.ativos == 0
+
+
+def test_reducao_libera_quem_espera_so_quando_ha_vaga():
+    controlador = ControladorConcorrencia(maximo=4, inicial=2, janela=60.0)
+    controlador.adquirir()
+    controlador.adquirir()
+    controlador.registrar_falha("HTTP 429")
+    assert controlador.limite == 1
+    entrou = threading.Event()
+    thread = threading.Thread(target=lambda: (controlador.adquirir(), entrou.set()))
+    thread.start()
+    controlador.liberar()
+    # Ainda há um download ativo e o limite agora é 1
+    assert not entrou.wait(0.2)
+    controlador.liberar()
+    assert entrou.wait(5)
+    thread.join()
+    controlador.liberar()
+
+
+def test_conectar_e_desconectar_os_observadores():
+    controlador = ControladorConcorrencia()
+    controlador.conectar()
+    try:
+        assert controlador.registrar_resposta in panda_http.observadores_resposta
+        assert controlador.registrar_falha in panda_http.observadores_falha
+        assert controlador.registrar_bytes in panda_transferencia.observadores_bytes
+    finally:
+        controlador.desconectar()
+    assert controlador.registrar_bytes not in panda_transferencia.observadores_bytes
+    assert controlador.registrar_falha not in panda_http.observadores_falha
+
+
+def test_importar_o_script_nao_conecta_o_controlador(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    antes = list(panda_transferencia.observadores_bytes)
+    import download_panda_videos
+    assert panda_transferencia.observadores_bytes == antes
+    assert download_panda_videos.controlador.registrar_bytes not in panda_transferencia.observadores_bytes
+
+
+def test_exportar_metricas(tmp_path):
+    controlador = ControladorConcorrencia(inicial=3)
+    caminho = tmp_path / 'panda.prom'
+    controlador.exportar_metricas(str(caminho))
+    assert 'panda_downloads_limite 3' in caminho.read_text()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def script(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    import download_panda_videos
+    return download_panda_videos
+
+
+def _arvore_falsa(monkeypatch, script, filhos, atraso=0.0):
+    """Troca a API por `filhos` ({id: [ids das subpastas]}) e mede as listagens simultâneas."""
+    medicao = {'ativas': 0, 'maximo': 0, 'listadas': []}
+    trava = threading.Lock()
+
+    def listar_subpastas(pasta_id):
+        with trava:
+            medicao['ativas'] += 1
+            medicao['maximo'] = max(medicao['maximo'], medicao['ativas'])
+            medicao['listadas'].append(pasta_id)
+        time.sleep(atraso)
+        with trava:
+            medicao['ativas'] -= 1
+        return [{'id': filho, 'name': filho.upper()} for filho in filhos.get(pasta_id, [])]
+
+    monkeypatch.setattr(script, 'listar_subpastas', listar_subpastas)
+    monkeypatch.setattr(script, 'listar_videos_na_pasta', lambda pasta_id: [{'id': f'{pasta_id}-v'}])
+    return medicao
+
+
+def test_descobre_em_largura_com_caminhos(monkeypatch, script):
+    _arvore_falsa(monkeypatch, script, {'r': ['a', 'b'], 'a': ['a1'], 'b': ['b1', 'b2']})
+
+    pastas = list(script.descobrir_arvore('r', 'base'))
+    posicao = {pasta['id']: i for i, pasta in enumerate(pastas)}
+    assert sorted(posicao) == ['a', 'a1', 'b', 'b1', 'b2', 'r']
+    # Cada pasta aparece depois da sua mãe
+    for mae, filhas in (('r', ['a', 'b']), ('a', ['a1']), ('b', ['b1', 'b2'])):
+        assert all(posicao[mae] < posicao[filha] for filha in filhas)
+    por_id = {pasta['id']: pasta for pasta in pastas}
+    assert por_id['r']['caminho'] == 'base/raiz'
+    assert por_id['b2']['caminho'] == 'base/raiz/B/B2'
+    assert [por_id[i]['nivel'] for i in ('r', 'a', 'a1')] == [0, 1, 2]
+    assert por_id['a1']['videos'] == [{'id': 'a1-v'}]
+
+
+def test_ciclos_e_nivel_maximo(monkeypatch, script):
+    # r -> a -> b -> a (ciclo), e uma cadeia mais funda que o limite
+    cadeia = {f'n{i}': [f'n{i + 1}'] for i in range(10)}
+    medicao = _arvore_falsa(monkeypatch, script, {'r': ['a', 'n0'], 'a': ['b', 'r'], 'b': ['a'], **cadeia})
+    monkeypatch.setattr(script, 'MAX_NIVEL_RECURSAO', 4)
+
+    ids = [pasta['id'] for pasta in script.descobrir_arvore('r')]
+    assert sorted(medicao['listadas']) == sorted(ids)
+    assert len(ids) == len(set(ids))
+    assert {'r', 'a', 'b'} <= set(ids)
+    assert 'n3' in ids and 'n4' not in ids
+
+
+def test_listagens_em_paralelo_ate_o_limite(monkeypatch, script):
+    medicao = _arvore_falsa(monkeypatch, script, {'r': [f'f{i}' for i in range(12)]}, atraso=0.05)
+    monkeypatch.setattr(script, 'MAX_LISTAGENS_SIMULTANEAS', 4)
+
+    assert len(list(script.descobrir_arvore('r'))) == 13
+    assert medicao['maximo'] == 4
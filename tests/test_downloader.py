@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import requests
+
+import panda_downloader
+from panda_benchmark import ID_PASTA, ServidorSimulado
+from panda_cache import cache_metadados
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Servidor simulado com 5 vídeos, servindo como a API do Panda."""
+    with ServidorSimulado(videos=5, tamanho_video=1024, segmentos=1, tamanho_segmento=1024) as simulado:
+        monkeypatch.setattr(panda_downloader, 'BASE_URL', simulado.url)
+        yield simulado
+
+
+def test_iterar_videos_segue_as_paginas_informadas(api):
+    informado = {}
+    paginas = list(panda_downloader.iterar_videos(tamanho_pagina=2, informado=informado))
+
+    assert [len(pagina) for pagina in paginas] == [2, 2, 1]
+    assert [video['id'] for pagina in paginas for video in pagina] == sorted(api.videos)
+    assert informado == {'total': 5, 'pages': 3}
+    assert cache_metadados.obter('bench-005')['title'] == 'Video 005'
+
+
+def test_listagem_alternativa_descarta_paginacao_interrompida(api, monkeypatch):
+    iterar = panda_downloader.iterar_videos_pasta
+    obter_json = panda_downloader.cache_listagens.obter_json
+
+    def obter_json_falhando(url, *args, **kwargs):
+        if 'page=2' in url:
+            raise requests.exceptions.ConnectionError("conexão perdida")
+        return obter_json(url, *args, **kwargs)
+
+    monkeypatch.setattr(panda_downloader, 'iterar_videos_pasta', lambda pasta_id: iterar(pasta_id, tamanho_pagina=2))
+    assert len(panda_downloader.obter_videos_da_pasta_alternativo(ID_PASTA, 'Benchmark')) == 5
+
+    monkeypatch.setattr(panda_downloader.cache_listagens, 'obter_json', obter_json_falhando)
+    assert panda_downloader.obter_videos_da_pasta_alternativo(ID_PASTA, 'Benchmark') == []
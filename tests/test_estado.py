@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import panda_estado
+
+
+@pytest.fixture(autouse=True)
+def banco(monkeypatch, tmp_path):
+    monkeypatch.setattr(panda_estado, 'CAMINHO_BANCO', str(tmp_path / 'estado.db'))
+    monkeypatch.setattr(panda_estado, '_conexao', None)
+
+
+def test_concluidos_conferem_o_arquivo(tmp_path):
+    caminho = tmp_path / 'aula.mp4'
+    caminho.write_bytes(b'x' * 10)
+    panda_estado.registrar_download('v1', str(tmp_path), str(caminho), 10, 'api', 'Aula', 'sha256:abc')
+    panda_estado.registrar_download('v2', str(tmp_path), str(tmp_path / 'apagado.mp4'), 5, 'api')
+
+    concluidos = panda_estado.obter_concluidos(['v1', 'v2', 'v3'], str(tmp_path))
+    assert list(concluidos) == ['v1']
+    assert concluidos['v1']['checksum'] == 'sha256:abc'
+    assert panda_estado.obter_concluidos(['v1'], str(tmp_path / 'outra')) == {}
+
+    caminho.write_bytes(b'x' * 11)
+    assert panda_estado.obter_download('v1', str(tmp_path)) is None
+
+
+def test_falha_nao_apaga_download_concluido(tmp_path):
+    caminho = tmp_path / 'aula.mp4'
+    caminho.write_bytes(b'x')
+    panda_estado.registrar_download('v1', str(tmp_path), str(caminho), 1, 'm3u8')
+    panda_estado.registrar_falha('v1', str(tmp_path))
+    assert panda_estado.obter_download('v1', str(tmp_path))['status'] == panda_estado.STATUS_CONCLUIDO
+
+
+def test_consulta_em_lotes(monkeypatch, tmp_path):
+    monkeypatch.setattr(panda_estado, 'TAMANHO_LOTE_CONSULTA', 2)
+    for i in range(5):
+        caminho = tmp_path / f'{i}.mp4'
+        caminho.write_bytes(b'x')
+        panda_estado.registrar_download(f'v{i}', str(tmp_path), str(caminho), 1, 'api')
+    assert len(panda_estado.obter_concluidos([f'v{i}' for i in range(5)], str(tmp_path))) == 5
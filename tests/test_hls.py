@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import io
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import panda_hls
+from panda_benchmark import Falhas
+from panda_hls import (ChavesHLS, DecifradorAES128, DiretorioTrabalho, FalhaRemux, FalhaSegmento, JobEmAndamento,
+                       PoolBuffers, RegistroSegmentos, Segmento, Variante, _EntregaOrdenada, _iv_sequencia,
+                       _SaidaEmOrdem, _transferir_segmento, analisar_playlist_midia, baixar_hls, baixar_segmentos,
+                       coalescer_intervalos, escolher_variante, transmitir_segmentos)
+
+BASE = 'https://cdn.exemplo/video/'
+# Segmento bem compressível, maior que o buffer do pool
+GZIP_ORIGINAL = b'\x47' + bytes(187) + bytes(range(256)) * 8192
+
+
+def _variante(altura: int, banda: int) -> Variante:
+    return Variante(f'{BASE}{altura}.m3u8', banda, altura * 16 // 9, altura, '')
+
+
+@pytest.fixture
+def sem_espera(monkeypatch):
+    monkeypatch.setattr(panda_hls, 'espera_backoff', lambda tentativa: 0)
+
+
+@pytest.fixture
+def ffmpeg_falso(monkeypatch):
+    """Troca o ffmpeg por uma função que guarda o que chega no stdin e grava como saída."""
+    recebido = io.BytesIO()
+
+    def executar(argumentos_entrada, caminho, trabalho, alimentar=None):
+        alimentar(recebido)
+        with open(caminho, 'wb') as f:
+            f.write(recebido.getvalue())
+
+    monkeypatch.setattr(panda_hls, '_executar_ffmpeg', executar)
+    return recebido
+
+
+@pytest.fixture
+def servidor_local():
+    """
+    Servidor HTTP mínimo: chaves AES-128 em /chave-*.bin e segmentos com
+    `Content-Encoding: gzip` em /gzip/*.ts (corpo original em `GZIP_ORIGINAL`);
+    qualquer outro caminho dá 404.
+    """
+    pedidos = []
+
+    class Manipulador(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            pedidos.append(self.path)
+            cabecalhos = {}
+            if self.path.startswith('/chave-'):
+                corpo = self.path.encode().ljust(16, b'.')[:16]
+            elif self.path.startswith('/gzip/'):
+                corpo, cabecalhos = gzip.compress(GZIP_ORIGINAL), {'Content-Encoding': 'gzip'}
+            else:
+                corpo = b''
+            self.send_response(200 if corpo else 404)
+            for nome, valor in cabecalhos.items():
+                self.send_header(nome, valor)
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), Manipulador)
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    servidor.url = f'http://127.0.0.1:{servidor.server_address[1]}'
+    servidor.pedidos = pedidos
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def _playlist(servidor):
+    base = f'{servidor.url}/hls/bench-001/'
+    segmentos = analisar_playlist_midia(requests.get(f'{base}360.m3u8').text, base)
+    esperados = [requests.get(segmento.url).content for segmento in segmentos]
+    return segmentos, esperados
+
+
+def test_baixar_segmentos_repete_so_o_segmento_que_falhou(servidor, sem_espera, monkeypatch, tmp_path):
+    segmentos, esperados = _playlist(servidor)
+    transferir = panda_hls._transferir_segmento
+    tentativas = []
+
+    def transferir_falhando(segmento, *args, **kwargs):
+        tentativas.append(segmento.url)
+        if segmento.url == segmentos[2].url and tentativas.count(segmento.url) == 1:
+            raise IOError("conexão perdida")
+        return transferir(segmento, *args, **kwargs)
+
+    monkeypatch.setattr(panda_hls, '_transferir_segmento', transferir_falhando)
+    with DiretorioTrabalho(str(tmp_path / 'video.mp4'), base=str(tmp_path / 'trabalho')) as trabalho:
+        registro = RegistroSegmentos(trabalho, segmentos)
+        caminhos = baixar_segmentos(segmentos, registro, simultaneos=2)
+        assert [open(caminho, 'rb').read() for caminho in caminhos] == esperados
+    assert sorted(tentativas) == sorted([segmento.url for segmento in segmentos] + [segmentos[2].url])
+    assert sorted(registro.concluidos) == list(range(len(segmentos)))
+
+
+def test_baixar_segmentos_desiste_apos_as_tentativas(servidor, sem_espera, tmp_path):
+    segmentos, _ = _playlist(servidor)
+    servidor.falhas = Falhas(taxa_truncado=1.0)
+    with pytest.raises(FalhaSegmento):
+        with DiretorioTrabalho(str(tmp_path / 'video.mp4'), base=str(tmp_path / 'trabalho')) as trabalho:
+            baixar_segmentos(segmentos[:1], RegistroSegmentos(trabalho, segmentos[:1]))
+    assert servidor.contagem['truncado'] == panda_hls.TENTATIVAS_SEGMENTO
+
+
+def test_transmitir_entrega_em_ordem_dentro_da_janela(servidor, ffmpeg_falso, monkeypatch, tmp_path):
+    servidor.segmentos = 12
+    segmentos, esperados = _playlist(servidor)
+    indices = {segmento.url: i for i, segmento in enumerate(segmentos)}
+    transferir = panda_hls._transferir_segmento
+    adiantamentos = []
+
+    def transferir_medindo(segmento, *args, **kwargs):
+        # Quantos segmentos à frente do último entregue por inteiro ao ffmpeg
+        adiantamentos.append(indices[segmento.url] - ffmpeg_falso.tell() // servidor.tamanho_segmento)
+        if indices[segmento.url] == 0:
+            time.sleep(0.2)  # o primeiro chega por último
+        return transferir(segmento, *args, **kwargs)
+
+    monkeypatch.setattr(panda_hls, '_transferir_segmento', transferir_medindo)
+    caminho = tmp_path / 'video.mp4'
+    with DiretorioTrabalho(str(caminho), base=str(tmp_path / 'trabalho')) as trabalho:
+        transmitir_segmentos(segmentos, str(caminho), trabalho, simultaneos=3, janela=4)
+
+    assert caminho.read_bytes() == b''.join(esperados)
+    assert max(adiantamentos) <= 4
+
+
+def test_diretorio_de_trabalho_por_arquivo_de_saida(tmp_path):
+    base = str(tmp_path / 'trabalho')
+    caminho = str(tmp_path / 'Aula 1: introdução.mp4')
+    assert DiretorioTrabalho(caminho, base).caminho == DiretorioTrabalho(caminho, base).caminho
+    homonimo = str(tmp_path / 'outra' / 'Aula 1: introdução.mp4')
+    assert DiretorioTrabalho(caminho, base).caminho != DiretorioTrabalho(homonimo, base).caminho
+
+    with DiretorioTrabalho(caminho, base) as trabalho:
+        with pytest.raises(JobEmAndamento):
+            with DiretorioTrabalho(caminho, base):
+                pass
+        with open(trabalho.arquivo('segmento_00000.ts'), 'wb') as f:
+            f.write(b'x')
+    assert not os.path.exists(trabalho.caminho)
+
+    with pytest.raises(RuntimeError):
+        with DiretorioTrabalho(caminho, base) as trabalho:
+            with open(trabalho.arquivo('segmento_00000.ts'), 'wb') as f:
+                f.write(b'x')
+            raise RuntimeError("falha no meio do job")
+    # Mantido para a próxima tentativa
+    assert os.path.exists(trabalho.arquivo('segmento_00000.ts'))
+
+
+def test_escolher_variante_por_altura_com_fallback_para_a_menor():
+    variantes = [_variante(1080, 5_000_000), _variante(360, 800_000), _variante(720, 2_500_000)]
+    assert escolher_variante(variantes, '<=720p').altura == 720
+    assert escolher_variante(variantes, 'best').altura == 1080
+    assert escolher_variante(variantes, 'worst').altura == 360
+    assert escolher_variante(variantes, 'max-bitrate=1M').altura == 360
+    # Nenhuma variante cabe no limite: fica com a menor
+    assert escolher_variante([_variante(1080, 5_000_000), _variante(2160, 15_000_000)], '<=720p').altura == 1080
+
+
+def test_stream_retoma_sem_baixar_de_novo_os_segmentos_registrados(servidor, monkeypatch, tmp_path):
+    segmentos, esperados = _playlist(servidor)
+    caminho = tmp_path / 'video.mp4'
+    base = str(tmp_path / 'trabalho')
+
+    def ffmpeg_quebrado(argumentos_entrada, caminho, trabalho, alimentar=None):
+        alimentar(io.BytesIO())
+        raise FalhaRemux("ffmpeg interrompido")
+
+    monkeypatch.setattr(panda_hls, '_executar_ffmpeg', ffmpeg_quebrado)
+    with pytest.raises(FalhaRemux):
+        with DiretorioTrabalho(str(caminho), base) as trabalho:
+            transmitir_segmentos(segmentos, str(caminho), trabalho)
+
+    # Um segmento corrompido no disco deixa de valer e é o único baixado de novo
+    with open(DiretorioTrabalho(str(caminho), base).arquivo('segmento_00001.ts'), 'r+b') as f:
+        f.write(b'corrompido')
+    recebido = io.BytesIO()
+
+    def ffmpeg_falso(argumentos_entrada, caminho, trabalho, alimentar=None):
+        alimentar(recebido)
+        with open(caminho, 'wb') as f:
+            f.write(recebido.getvalue())
+
+    monkeypatch.setattr(panda_hls, '_executar_ffmpeg', ffmpeg_falso)
+    requisicoes = servidor.contagem['requisicoes']
+    with DiretorioTrabalho(str(caminho), base) as trabalho:
+        transmitir_segmentos(segmentos, str(caminho), trabalho)
+    assert servidor.contagem['requisicoes'] == requisicoes + 1
+    assert caminho.read_bytes() == b''.join(esperados)
+    assert not os.path.exists(trabalho.caminho)
+
+
+def test_byterange_sem_inicio_continua_do_fim_do_intervalo_anterior():
+    segmentos = analisar_playlist_midia('\n'.join([
+        '#EXTM3U',
+        '#EXT-X-BYTERANGE:100@0', 'a.ts',
+        '#EXT-X-BYTERANGE:50', 'a.ts',
+        '#EXT-X-BYTERANGE:30', 'b.ts',
+        '#EXT-X-BYTERANGE:20', 'a.ts',
+    ]), BASE)
+    assert [(s.url[len(BASE):], s.inicio, s.tamanho) for s in segmentos] == [
+        ('a.ts', 0, 100), ('a.ts', 100, 50), ('b.ts', 0, 30), ('a.ts', 150, 20)]
+    assert segmentos[1].cabecalho_range() == 'bytes=100-149'
+
+
+def test_ext_x_map_repetido_entra_uma_vez_por_troca():
+    segmentos = analisar_playlist_midia('\n'.join([
+        '#EXTM3U',
+        '#EXT-X-MAP:URI="init.mp4"', '#EXTINF:4,', '1.m4s',
+        '#EXT-X-MAP:URI="init.mp4"', '#EXTINF:4,', '2.m4s',
+        '#EXT-X-MAP:URI="init2.mp4"', '#EXTINF:4,', '3.m4s',
+    ]), BASE)
+    assert [s.url[len(BASE):] for s in segmentos] == ['init.mp4', '1.m4s', '2.m4s', 'init2.mp4', '3.m4s']
+
+
+def test_coalescer_une_intervalos_contiguos_mas_nao_cifrados():
+    texto = '\n'.join(['#EXTM3U'] + ['#EXT-X-BYTERANGE:100', 'a.ts'] * 3)
+    assert [(s.inicio, s.tamanho) for s in coalescer_intervalos(analisar_playlist_midia(texto, BASE))] == [(0, 300)]
+    assert [(s.inicio, s.tamanho) for s in coalescer_intervalos(analisar_playlist_midia(texto, BASE), 200)] == [
+        (0, 200), (200, 100)]
+
+    cifrada = analisar_playlist_midia('#EXT-X-KEY:METHOD=AES-128,URI="k"\n' + texto, BASE)
+    assert coalescer_intervalos(cifrada) == cifrada
+
+
+def test_iv_padrao_vem_do_numero_de_sequencia():
+    segmentos = analisar_playlist_midia('\n'.join([
+        '#EXTM3U',
+        '#EXT-X-MEDIA-SEQUENCE:7',
+        '#EXT-X-KEY:METHOD=AES-128,URI="chave.bin"', '#EXTINF:4,', '7.ts', '#EXTINF:4,', '8.ts',
+        '#EXT-X-KEY:METHOD=AES-128,URI="chave.bin",IV=0x1F', '#EXTINF:4,', '9.ts',
+        '#EXT-X-KEY:METHOD=NONE', '#EXTINF:4,', '10.ts',
+    ]), BASE)
+    assert segmentos[0].chave == f'{BASE}chave.bin'
+    assert [s.iv for s in segmentos] == [_iv_sequencia(7), _iv_sequencia(8), bytes(15) + b'\x1f', None]
+    assert segmentos[3].chave is None
+
+
+def test_metodo_de_criptografia_nao_suportado():
+    with pytest.raises(ValueError):
+        analisar_playlist_midia('#EXTM3U\n#EXT-X-KEY:METHOD=SAMPLE-AES,URI="k"\nx.ts', BASE)
+
+
+def test_iv_sequencia():
+    assert _iv_sequencia(0) == bytes(16)
+    assert _iv_sequencia(258) == bytes(14) + b'\x01\x02'
+
+
+def test_decifrador_aes128_em_blocos_quebrados():
+    pytest.importorskip('cryptography')
+    from cryptography.hazmat.primitives import padding
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+    chave, iv = bytes(range(16)), _iv_sequencia(3)
+    claro = bytes(range(256)) * 10 + b'fim'
+    preenchedor = padding.PKCS7(128).padder()
+    cifrador = Cipher(algorithms.AES(chave), modes.CBC(iv)).encryptor()
+    cifrado = cifrador.update(preenchedor.update(claro) + preenchedor.finalize()) + cifrador.finalize()
+
+    decifrador = DecifradorAES128(chave, iv)
+    partes = [decifrador.atualizar(cifrado[i:i + 1000]) for i in range(0, len(cifrado), 1000)]
+    assert b''.join(partes) + decifrador.finalizar() == claro
+
+    # Segmento truncado no meio de um bloco
+    truncado = DecifradorAES128(chave, iv)
+    truncado.atualizar(cifrado[:-5])
+    with pytest.raises(IOError):
+        truncado.finalizar()
+
+
+def test_cada_chave_e_buscada_uma_vez_antes_dos_segmentos(servidor_local):
+    a, b = f'{servidor_local.url}/chave-a.bin', f'{servidor_local.url}/chave-b.bin'
+    segmentos = [Segmento(f'{BASE}{i}.ts', chave=a if i < 3 else b, iv=_iv_sequencia(i)) for i in range(5)]
+    segmentos.append(Segmento(f'{BASE}5.ts'))
+
+    chaves = ChavesHLS()
+    chaves.carregar(segmentos)
+    chaves.carregar(segmentos)
+    assert servidor_local.pedidos == ['/chave-a.bin', '/chave-b.bin']
+    assert chaves.decifrador(segmentos[5]) is None
+
+
+def test_chave_com_falha_tem_uma_unica_camada_de_tentativas(servidor_local, sem_espera, tmp_path):
+    pytest.importorskip('cryptography')
+    segmentos = [Segmento(f'{BASE}{i}.ts', chave=f'{servidor_local.url}/sumiu.bin', iv=_iv_sequencia(i))
+                 for i in range(3)]
+    caminho = str(tmp_path / 'video.mp4')
+
+    with pytest.raises(FalhaSegmento):
+        baixar_hls(segmentos, caminho)
+    assert servidor_local.pedidos == ['/sumiu.bin'] * panda_hls.TENTATIVAS_SEGMENTO
+    # Nenhum segmento chegou a ser agendado
+    assert not os.path.exists(DiretorioTrabalho(caminho).caminho)
+
+
+def test_pool_de_buffers_respeita_o_limite():
+    pool = PoolBuffers(2, tamanho=16)
+    emprestou = threading.Event()
+
+    def terceiro():
+        with pool.emprestar():
+            emprestou.set()
+
+    with pool.emprestar(), pool.emprestar():
+        thread = threading.Thread(target=terceiro)
+        thread.start()
+        assert not emprestou.wait(0.2)
+    assert emprestou.wait(5)
+    thread.join()
+    assert pool._criados == 2
+
+
+def test_segmento_da_vez_vai_direto_para_o_ffmpeg(servidor, ffmpeg_falso, monkeypatch, tmp_path):
+    segmentos, esperados = _playlist(servidor)
+    repasses = []
+    monkeypatch.setattr(panda_hls, 'RETOMAVEL', False)
+    monkeypatch.setattr(_EntregaOrdenada, 'repassar', lambda self, *args: repasses.append(args))
+    caminho = tmp_path / 'video.mp4'
+
+    with DiretorioTrabalho(str(caminho), base=str(tmp_path / 'trabalho')) as trabalho:
+        transmitir_segmentos(segmentos, str(caminho), trabalho, simultaneos=1, janela=1)
+        # Nenhum segmento passou pelo disco
+        assert not [nome for nome in os.listdir(trabalho.caminho) if nome.endswith('.ts')]
+    assert repasses == []
+    assert caminho.read_bytes() == b''.join(esperados)
+
+
+def test_segmentos_fora_de_ordem_sao_repassados_do_disco(servidor, ffmpeg_falso, monkeypatch, tmp_path):
+    servidor.segmentos = 8
+    segmentos, esperados = _playlist(servidor)
+    transferir = panda_hls._transferir_segmento
+    monkeypatch.setattr(panda_hls, 'RETOMAVEL', False)
+
+    def primeiro_por_ultimo(segmento, *args, **kwargs):
+        if segmento.url == segmentos[0].url:
+            time.sleep(0.2)
+        return transferir(segmento, *args, **kwargs)
+
+    monkeypatch.setattr(panda_hls, '_transferir_segmento', primeiro_por_ultimo)
+    caminho = tmp_path / 'video.mp4'
+    with DiretorioTrabalho(str(caminho), base=str(tmp_path / 'trabalho')) as trabalho:
+        transmitir_segmentos(segmentos, str(caminho), trabalho, simultaneos=4, janela=8)
+        assert not [nome for nome in os.listdir(trabalho.caminho) if nome.endswith('.ts')]
+    assert caminho.read_bytes() == b''.join(esperados)
+
+
+def test_saida_assume_a_vez_e_nova_tentativa_pula_o_que_foi_enviado(tmp_path):
+    entrada = io.BytesIO()
+    entrega = _EntregaOrdenada(entrada)
+    with DiretorioTrabalho(str(tmp_path / 'video.mp4'), base=str(tmp_path / 'trabalho')) as trabalho:
+        registro = RegistroSegmentos(trabalho, [], persistente=False)
+        with _SaidaEmOrdem(entrega, 1, registro) as saida:
+            saida.write(b'aaa')
+            assert not saida.direto and os.path.exists(registro.caminho_segmento(1))
+            entrega.enviar(b'000')
+            entrega.avancar()
+            saida.write(b'bbb')
+            assert saida.direto and not os.path.exists(registro.caminho_segmento(1))
+        # A tentativa falhou aqui; a próxima recomeça do início do segmento
+        with _SaidaEmOrdem(entrega, 1, registro) as saida:
+            assert saida.direto
+            saida.write(b'aa')
+            saida.write(b'abbbccc')
+    assert entrada.getvalue() == b'000aaabbbccc'
+
+
+def test_segmento_com_content_encoding(servidor_local):
+    segmento = Segmento(f'{servidor_local.url}/gzip/0.ts')
+    saida = io.BytesIO()
+    tamanho, _ = _transferir_segmento(segmento, {}, saida)
+    assert (tamanho, saida.getvalue()) == (len(GZIP_ORIGINAL), GZIP_ORIGINAL)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+from panda_manifesto import (HashIncremental, calcular_checksum_arquivo, listar_incompletos,
+                             obter_checksum, registrar_no_manifesto, tamanho_confere, verificar_pasta)
+
+
+def test_hash_incremental_com_blocos_fora_de_ordem(tmp_path):
+    caminho = tmp_path / 'video.mp4.part'
+    dados = os.urandom(3000)
+    caminho.write_bytes(dados)
+
+    hash_incremental = HashIncremental(str(caminho))
+    hash_incremental.alimentar(2000, dados[2000:])  # adiante: fica para alcancar
+    hash_incremental.alimentar(0, dados[:1000])
+    hash_incremental.alcancar(3000)
+    assert hash_incremental.checksum() == calcular_checksum_arquivo(str(caminho))
+
+
+def test_manifesto_e_verificacao(tmp_path):
+    bom, corrompido, antigo = tmp_path / 'a.mp4', tmp_path / 'b.mp4', tmp_path / 'c.mp4'
+    for caminho in (bom, corrompido):
+        caminho.write_bytes(b'conteudo')
+        registrar_no_manifesto(str(caminho), 8, calcular_checksum_arquivo(str(caminho)))
+    antigo.write_bytes(b'pequeno, sem manifesto')
+    (tmp_path / 'd.mp4.part').write_bytes(b'')
+
+    assert obter_checksum(str(bom)) == calcular_checksum_arquivo(str(bom))
+    corrompido.write_bytes(b'CONTEUDO')
+    assert tamanho_confere(str(corrompido))
+    assert verificar_pasta(str(tmp_path)) == [str(corrompido)]
+    assert listar_incompletos(str(tmp_path)) == [str(antigo)]
+
+    corrompido.write_bytes(b'curto')
+    assert not tamanho_confere(str(corrompido))
+    assert listar_incompletos(str(tmp_path)) == [str(corrompido), str(antigo)]
+
+
+def test_alimentar_nao_espera_o_alcancar(tmp_path):
+    caminho = tmp_path / 'video.mp4.part'
+    dados = os.urandom(2000)
+    caminho.write_bytes(dados)
+
+    hash_incremental = HashIncremental(str(caminho))
+    # Simula um alcancar em andamento em outra thread
+    with hash_incremental._trava:
+        hash_incremental.alimentar(0, dados[:1000])
+    assert hash_incremental.posicao == 0
+    hash_incremental.alimentar(1000, dados[1000:])
+    hash_incremental.alcancar(2000)
+    assert hash_incremental.checksum() == calcular_checksum_arquivo(str(caminho))
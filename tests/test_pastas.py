@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+from panda_pastas import ArvorePastas, id_pasta_pai
+
+PASTAS = [
+    {'id': 'curso', 'name': 'Curso'},
+    {'id': 'm2', 'name': 'Módulo 2', 'parent_folder_id': 'curso'},
+    {'id': 'm1', 'name': 'Módulo 1', 'parent_id': 'curso'},
+    {'id': 'aula', 'name': 'Aula 1', 'parent_folder_id': 'm1'},
+    {'id': 'orfa', 'name': 'Órfã', 'parent_folder_id': 'apagada'},
+]
+
+
+def test_id_pasta_pai():
+    assert id_pasta_pai({'parent_folder_id': 10}) == '10'
+    assert id_pasta_pai({'parent_id': 'x'}) == 'x'
+    assert id_pasta_pai({'parent_folder_id': None}) is None
+
+
+def test_arvore_pastas():
+    arvore = ArvorePastas(PASTAS)
+    assert arvore.hierarquica
+    assert [p['id'] for p in arvore.subpastas('curso')] == ['m2', 'm1']
+    assert arvore.subpastas('aula') == []
+    assert arvore.caminho('aula') == '/Curso/Módulo 1/Aula 1'
+    assert arvore.profundidade('aula') == 2
+    # Pai fora da listagem: tratada como raiz
+    assert arvore.caminho('orfa') == '/Órfã'
+    assert arvore.profundidade('orfa') == 0
+    assert arvore.obter('inexistente') is None
+
+
+def test_listagem_sem_pasta_pai():
+    assert not ArvorePastas([{'id': 'a', 'name': 'A'}, {'id': 'b', 'name': 'B'}]).hierarquica
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import time
+
+import pytest
+import requests
+
+import panda_transferencia
+from panda_benchmark import TAMANHO_BLOCO, Falhas, _conteudo
+from panda_manifesto import calcular_checksum_arquivo, obter_checksum
+from panda_transferencia import (SUFIXO_ESTADO, SUFIXO_PARCIAL, LimitadorBanda, baixar_arquivo,
+                                 dividir_intervalos, interpretar_taxa, ler_com_limite, obter_info_remota)
+
+
+def _esperado(semente: int, total: int) -> bytes:
+    return b''.join(bytes(_conteudo(semente, inicio, min(TAMANHO_BLOCO, total - inicio)))
+                    for inicio in range(0, total, TAMANHO_BLOCO))
+
+
+@pytest.fixture
+def intervalos_pequenos(monkeypatch):
+    monkeypatch.setattr(panda_transferencia, 'TAMANHO_MINIMO_SEGMENTO', 1024 * 1024)
+
+
+def test_dividir_intervalos():
+    assert dividir_intervalos(10, 4) == [(0, 9)]
+    assert dividir_intervalos(20 * 1024 * 1024, 4) == [(0, 10 * 1024 * 1024 - 1),
+                                                       (10 * 1024 * 1024, 20 * 1024 * 1024 - 1)]
+
+
+def test_download_em_intervalos(servidor, intervalos_pequenos, tmp_path):
+    url, total, aceita_ranges, etag = obter_info_remota(f'{servidor.url}/arquivos/bench-001.mp4')
+    assert (total, aceita_ranges) == (servidor.tamanho_video, True)
+    caminho = str(tmp_path / 'video.mp4')
+    recebidos = []
+
+    assert baixar_arquivo(url, caminho, total, aceita_ranges, etag, recebidos.append, conexoes=3) == total
+    with open(caminho, 'rb') as f:
+        assert f.read() == _esperado(1, total)
+    assert sum(recebidos) == total
+    assert obter_checksum(caminho) == calcular_checksum_arquivo(caminho)
+    assert not os.path.exists(caminho + SUFIXO_PARCIAL)
+    assert not os.path.exists(caminho + SUFIXO_ESTADO)
+
+
+
+def test_download_retomado_apos_corpo_truncado(servidor, tmp_path):
+    url, total, aceita_ranges, etag = obter_info_remota(f'{servidor.url}/arquivos/bench-002.mp4')
+    caminho = str(tmp_path / 'video.mp4')
+
+    # Um único intervalo: o corpo cortado ao meio ainda entrega blocos inteiros
+    servidor.falhas = Falhas(taxa_truncado=1.0)
+    with pytest.raises(IOError):
+        baixar_arquivo(url, caminho, total, aceita_ranges, etag, conexoes=1)
+    with open(caminho + SUFIXO_ESTADO, encoding='utf-8') as f:
+        baixados = sum(concluido for _, _, concluido in json.load(f)['intervalos'])
+    assert 0 < baixados < total
+
+    servidor.falhas = Falhas()
+    recebidos = []
+    assert baixar_arquivo(url, caminho, total, aceita_ranges, etag, recebidos.append) == total
+    assert recebidos[0] == baixados
+    assert sum(recebidos) == total
+    with open(caminho, 'rb') as f:
+        assert f.read() == _esperado(2, total)
+    assert not os.path.exists(caminho + SUFIXO_ESTADO)
+
+
+def test_estado_de_outro_arquivo_remoto_e_descartado(servidor, tmp_path):
+    url, total, aceita_ranges, etag = obter_info_remota(f'{servidor.url}/arquivos/bench-001.mp4')
+    caminho = str(tmp_path / 'video.mp4')
+    (tmp_path / ('video.mp4' + SUFIXO_PARCIAL)).write_bytes(b'\0' * total)
+    (tmp_path / ('video.mp4' + SUFIXO_ESTADO)).write_text(json.dumps(
+        {'url': url, 'total': total, 'etag': '"outro"', 'intervalos': [[0, total - 1, total // 2]]}))
+    recebidos = []
+    assert baixar_arquivo(url, caminho, total, aceita_ranges, etag, recebidos.append) == total
+    assert sum(recebidos) == total
+    with open(caminho, 'rb') as f:
+        assert f.read() == _esperado(1, total)
+
+def test_download_sem_range_em_conexao_unica(servidor, tmp_path):
+    caminho = str(tmp_path / 'video.mp4')
+    total = servidor.tamanho_video
+    assert baixar_arquivo(f'{servidor.url}/arquivos/bench-001.mp4', caminho) == total
+    with open(caminho, 'rb') as f:
+        assert f.read() == _esperado(1, total)
+
+
+def test_interpretar_taxa():
+    assert interpretar_taxa('0') == 0
+    assert interpretar_taxa('512K') == 512 * 1024
+    assert interpretar_taxa('40M') == 40 * 1024 ** 2
+    assert interpretar_taxa('1.5GB/s') == 1.5 * 1024 ** 3
+    with pytest.raises(ValueError):
+        interpretar_taxa('rápido')
+
+
+def test_limitador_sem_limite_nao_espera():
+    limitador = LimitadorBanda(0)
+    assert limitador.reservar(10 ** 12) == 0
+    assert limitador.tamanho_bloco() == panda_transferencia.TAMANHO_CHUNK
+
+
+def test_limitador_cobra_a_divida_e_aceita_devolucao(monkeypatch):
+    agora = [100.0]
+    monkeypatch.setattr(panda_transferencia.time, 'monotonic', lambda: agora[0])
+    limitador = LimitadorBanda(1000, rajada=1000)
+
+    assert limitador.reservar(1000) == 0
+    assert limitador.reservar(500) == pytest.approx(0.5)
+    limitador.devolver(500)
+    assert limitador.reservar(250) == pytest.approx(0.25)
+    # O balde reabastece com o tempo, mas nunca além da rajada
+    agora[0] += 10
+    assert limitador.reservar(1000) == 0
+    assert limitador.reservar(1) > 0
+
+
+def test_limitador_ajusta_o_bloco_a_taxa():
+    limitador = LimitadorBanda(interpretar_taxa('40M'))
+    assert limitador.tamanho_bloco() == panda_transferencia.TAMANHO_CHUNK
+    limitador.ajustar(interpretar_taxa('4M'))
+    assert limitador.tamanho_bloco() == 4 * 1024 * 1024 // 20
+    limitador.ajustar(interpretar_taxa('100K'))
+    assert limitador.tamanho_bloco() == panda_transferencia.TAMANHO_CHUNK_MINIMO
+
+
+def test_leitura_respeita_o_limite(servidor):
+    taxa = interpretar_taxa('512K')
+    limitador = LimitadorBanda(taxa, rajada=panda_transferencia.TAMANHO_CHUNK_MINIMO)
+    total = 256 * 1024
+    response = requests.get(f'{servidor.url}/arquivos/bench-001.mp4', headers={'Range': f'bytes=0-{total - 1}'},
+                            stream=True)
+    inicio = time.monotonic()
+    dados = b''.join(ler_com_limite(response, limitador))
+    decorrido = time.monotonic() - inicio
+
+    assert dados == _esperado(1, total)
+    # Só a rajada inicial passa sem espera
+    assert decorrido >= (total - limitador.rajada) / taxa * 0.9